@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Load test showing the effect of `--max-greenthreads` on concurrency.
+
+Starts `simpl server -s xeventlet` with different `--max-greenthreads`
+values, serving a route that waits 100ms (like a slow database query),
+then fires `clients` concurrent requests at it and reports the time taken
+and throughput. With a pool smaller than the number of clients, requests
+queue behind each other and throughput is capped at roughly
+max_greenthreads / 0.1s.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/eventlet_concurrency.py [clients] [sizes]
+
+ex. `PYTHONPATH=. python benchmarks/eventlet_concurrency.py 200 10,50,200`
+"""
+
+from __future__ import print_function
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+APP = '''
+import eventlet
+eventlet.monkey_patch()
+import bottle
+
+app = bottle.Bottle()
+
+
+@app.route('/wait')
+def wait():
+    eventlet.sleep(0.1)
+    return 'ok'
+'''
+
+
+def free_port():
+    """Return a free TCP port."""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def request(port, path, results):
+    """Make a (keep-alive-less) HTTP request and record success."""
+    try:
+        conn = socket.create_connection(('127.0.0.1', port), timeout=30)
+        conn.sendall(('GET %s HTTP/1.0\r\n\r\n' % path).encode())
+        data = b''
+        while True:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        conn.close()
+        results.append(data.startswith(b'HTTP/1.1 200') or
+                       data.startswith(b'HTTP/1.0 200'))
+    except socket.error:
+        results.append(False)
+
+
+def wait_until_up(port, timeout=10):
+    """Wait for the server to accept connections."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return
+        except socket.error:
+            time.sleep(0.05)
+    raise RuntimeError("Server did not start")
+
+
+def run(clients, max_greenthreads, workdir):
+    """Load a server with this pool size. Returns (seconds, successes)."""
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [workdir, os.environ.get('PYTHONPATH', '')]))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'simpl.cli', 'server', '--quiet',
+         '--server', 'xeventlet', '--no-reloader', '--port', str(port),
+         '--app', 'bench_app:app', '--backlog', str(clients),
+         '--max-greenthreads', str(max_greenthreads)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port)
+        results = []
+        threads = [threading.Thread(target=request,
+                                    args=(port, '/wait', results))
+                   for _ in range(clients)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.time() - start, sum(results)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(clients=200, sizes='10,50,200'):
+    """Run the load test for each pool size."""
+    import tempfile
+    workdir = tempfile.mkdtemp()
+    with open(os.path.join(workdir, 'bench_app.py'), 'w') as handle:
+        handle.write(APP)
+    clients = int(clients)
+    print('%d concurrent clients, 100ms per request' % clients)
+    print('%18s %10s %10s %8s' % ('max-greenthreads', 'seconds', 'req/s',
+                                  'ok'))
+    for size in [int(size) for size in sizes.split(',')]:
+        elapsed, successes = run(clients, size, workdir)
+        print('%18d %10.2f %10.1f %8d' % (size, elapsed, clients / elapsed,
+                                          successes))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:3])
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark git reads from one thread: blocking vs GitRepo.aio.
+
+Runs `calls` ls-remotes against a local repo reached through a file:// url,
+with `latency` seconds added to each to stand in for a network round trip.
+Requires Python 3.5+.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/git_async.py [calls] [latency]
+"""
+
+from __future__ import print_function
+
+import asyncio
+import sys
+import time
+
+from simpl import git
+
+
+def main():
+    """Run the reads one after the other, then concurrently."""
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    upstream = git.GitRepo.init(temp=True)
+    upstream.run_command(['git', 'config', 'user.name', 'bench'])
+    upstream.run_command(['git', 'config', 'user.email',
+                          'bench@example.com'])
+    upstream.commit(message='first', stage=False)
+    repo = git.GitRepo.clone('file://' + upstream.repo_dir, temp=True)
+    repo.run_command(['git', 'config', 'remote.origin.uploadpack',
+                      'sleep %s && git-upload-pack' % latency])
+
+    start = time.time()
+    for _ in range(calls):
+        repo.ls_remote()
+    blocking = time.time() - start
+
+    async def read_all():
+        """Run every ls-remote at once."""
+        return await asyncio.gather(*[repo.aio.ls_remote()
+                                      for _ in range(calls)])
+    loop = asyncio.new_event_loop()
+    start = time.time()
+    loop.run_until_complete(read_all())
+    concurrent = time.time() - start
+    loop.close()
+
+    print("%d ls-remotes, %.2fs latency" % (calls, latency))
+    print("GitRepo.ls_remote:     %.2fs" % blocking)
+    print("GitRepo.aio.ls_remote: %.2fs" % concurrent)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark reading every file of a repo.
+
+Compares one `git cat-file -p` per file with :meth:`GitRepo.read_blob`,
+which reads them all through one `git cat-file --batch` process.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/git_cat_file.py [files]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from simpl import git
+
+
+def make_repo(files):
+    """Return a temporary repo with `files` small files committed."""
+    repo = git.GitRepo.init(temp=True)
+    repo.run_command(['git', 'config', 'user.name', 'bench'])
+    repo.run_command(['git', 'config', 'user.email', 'bench@example.com'])
+    for number in range(files):
+        directory = os.path.join(repo.repo_dir, 'dir%d' % (number % 50))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, 'file%d.txt' % number), 'w') as fh:
+            fh.write('file %d\n' % number * 20)
+    repo.commit(message='files')
+    return repo
+
+
+def main():
+    """Read all files both ways and print the times."""
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repo = make_repo(files)
+    blobs = [entry['object'] for entry in repo.ls_tree()]
+
+    start = time.time()
+    for sha in blobs:
+        repo.run_command(['git', 'cat-file', '-p', sha])
+    forked = time.time() - start
+
+    start = time.time()
+    for sha in blobs:
+        repo.read_blob(sha)
+    batched = time.time() - start
+    repo.close()
+
+    print("%d files" % len(blobs))
+    print("git cat-file -p per file: %.2fs" % forked)
+    print("GitRepo.read_blob:        %.2fs" % batched)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark repeated clones of one repo, with and without a MirrorCache.
+
+By default the source is a local repo cloned through a file:// url, so
+git transfers a pack like it would from a server (without the network
+time a mirror also saves).
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/git_clone.py [clones] [files] [url]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from simpl import git
+
+
+def make_repo(files):
+    """Return a temporary repo with `files` small files committed."""
+    repo = git.GitRepo.init(temp=True)
+    repo.run_command(['git', 'config', 'user.name', 'bench'])
+    repo.run_command(['git', 'config', 'user.email', 'bench@example.com'])
+    for number in range(files):
+        directory = os.path.join(repo.repo_dir, 'dir%d' % (number % 50))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, 'file%d.txt' % number), 'w') as fh:
+            fh.write('file %d\n' % number * 50)
+    repo.commit(message='files')
+    return repo
+
+
+def main():
+    """Clone the repo `clones` times each way and print the times."""
+    clones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    if len(sys.argv) > 3:
+        location = sys.argv[3]
+    else:
+        location = 'file://' + make_repo(files).repo_dir
+    cache = git.MirrorCache(git.create_tempdir())
+    for name, mirror_cache in [('plain clone', None),
+                               ('mirror cache', cache)]:
+        start = time.time()
+        for _ in range(clones):
+            git.GitRepo.clone(location, temp=True, mirror_cache=mirror_cache)
+        print("%-13s %.3fs per clone" % (name,
+                                         (time.time() - start) / clones))
+
+
+if __name__ == '__main__':
+    main()
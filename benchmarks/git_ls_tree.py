@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark listing a large tree with GitRepo.ls_tree and iter_ls_tree.
+
+Prints the time to the first entry, the total time and (on python 3) the
+peak memory allocated while walking every entry, and the memory the whole
+listing holds as dicts and as :class:`simpl.git.TreeEntry` records.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/git_ls_tree.py [files]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+from simpl import git
+
+
+def make_repo(files):
+    """Return a temporary repo with `files` empty files committed."""
+    repo = git.GitRepo.init(temp=True)
+    repo.run_command(['git', 'config', 'user.name', 'bench'])
+    repo.run_command(['git', 'config', 'user.email', 'bench@example.com'])
+    for number in range(files):
+        directory = os.path.join(repo.repo_dir, 'dir%d' % (number % 100))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        open(os.path.join(directory, 'file%d.txt' % number), 'w').close()
+    repo.commit(message='files')
+    return repo
+
+
+def measure(listing):
+    """Return (first entry secs, total secs, peak bytes) of a listing."""
+    if tracemalloc:
+        tracemalloc.start()
+    start = time.time()
+    entries = iter(listing())
+    next(entries)
+    first = time.time() - start
+    for _ in entries:
+        pass
+    total = time.time() - start
+    peak = 0
+    if tracemalloc:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return first, total, peak
+
+
+def retained(listing):
+    """Return the bytes still allocated for a listing once it is built."""
+    if not tracemalloc:
+        return 0
+    tracemalloc.start()
+    result = listing()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    """List the tree both ways and print the results."""
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repo = make_repo(files)
+    print("%d files" % files)
+    print("%-14s %12s %10s %14s" % ('', 'first (ms)', 'total (s)',
+                                    'peak (KiB)'))
+    for name, listing in [('ls_tree', repo.ls_tree),
+                          ('iter_ls_tree', repo.iter_ls_tree)]:
+        first, total, peak = measure(listing)
+        print("%-14s %12.1f %10.2f %14d" % (name, first * 1000, total,
+                                            peak // 1024))
+    print()
+    print("listing held in memory (KiB)")
+    print("dicts:   %8d" % (retained(repo.ls_tree) // 1024))
+    print("records: %8d" % (retained(
+        lambda: repo.ls_tree(records=True)) // 1024))
+
+
+if __name__ == '__main__':
+    main()
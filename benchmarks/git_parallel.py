@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark fetching many repos one by one vs with run_parallel.
+
+Each repo is a clone of its own upstream (through a file:// url) that has
+a new commit to fetch. `latency` seconds are added to each fetch to stand
+in for the network round trips of a real remote.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/git_parallel.py [repos] [workers] \
+        [latency]
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+from simpl import git
+
+
+def make_pair(latency):
+    """Return (upstream, clone of it)."""
+    upstream = git.GitRepo.init(temp=True)
+    upstream.run_command(['git', 'config', 'user.name', 'bench'])
+    upstream.run_command(['git', 'config', 'user.email',
+                          'bench@example.com'])
+    upstream.commit(message='first', stage=False)
+    clone = git.GitRepo.clone('file://' + upstream.repo_dir, temp=True)
+    if latency:
+        clone.run_command(['git', 'config', 'remote.origin.uploadpack',
+                           'sleep %s && git-upload-pack' % latency])
+    return upstream, clone
+
+
+def main():
+    """Fetch every repo both ways and print the times."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+    pairs = [make_pair(latency) for _ in range(count)]
+    clones = [clone for _, clone in pairs]
+
+    for upstream, _ in pairs:
+        upstream.commit(message='serial', stage=False)
+    start = time.time()
+    for clone in clones:
+        clone.fetch(remote='origin')
+    serial = time.time() - start
+
+    for upstream, _ in pairs:
+        upstream.commit(message='parallel', stage=False)
+    start = time.time()
+    results = git.run_parallel(clones, 'fetch', workers=workers,
+                               remote='origin')
+    parallel = time.time() - start
+    assert all(result.ok for result in results)
+
+    print("%d repos, %.2fs latency" % (count, latency))
+    print("GitRepo.fetch one by one:      %.2fs" % serial)
+    print("run_parallel (%2d workers):     %.2fs" % (workers, parallel))
+
+
+if __name__ == '__main__':
+    main()
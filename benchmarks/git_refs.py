@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark ref queries: reading the ref files vs running git.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/git_refs.py [iterations]
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+
+from simpl import git
+
+
+def make_repo():
+    """Return a temporary repo with a few branches and tags."""
+    repo = git.GitRepo.init(temp=True)
+    repo.run_command(['git', 'config', 'user.name', 'bench'])
+    repo.run_command(['git', 'config', 'user.email', 'bench@example.com'])
+    repo.commit(message='first', stage=False)
+    for number in range(20):
+        repo.branch('branch%d' % number)
+        repo.tag('tag%d' % number, message='tag %d' % number)
+    repo.run_command(['git', 'pack-refs', '--all'])
+    return repo
+
+
+def main():
+    """Time each query both ways."""
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repo = make_repo()
+    queries = [
+        ('head', ['git', 'rev-parse', 'HEAD'], lambda: repo.head),
+        ('current_branch', ['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
+         lambda: repo.current_branch),
+        ('list_refs', ['git', 'show-ref', '--dereference', '--head'],
+         repo.list_refs),
+    ]
+    print("%-16s %12s %12s" % ('query', 'git (us)', 'files (us)'))
+    for name, command, query in queries:
+        forked = timeit.timeit(lambda: repo.run_command(command),
+                               number=iterations)
+        direct = timeit.timeit(query, number=iterations)
+        print("%-16s %12.1f %12.1f" % (name, forked / iterations * 1e6,
+                                       direct / iterations * 1e6))
+
+
+if __name__ == '__main__':
+    main()
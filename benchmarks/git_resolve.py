@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark resolving many remote refs one by one vs in one batch.
+
+The remote is a local repo reached through a file:// url. `latency`
+seconds are added to each ls-remote to stand in for a network round trip.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/git_resolve.py [refs] [latency]
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+from simpl import git
+
+
+def main():
+    """Resolve the refs both ways and print the times."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    upstream = git.GitRepo.init(temp=True)
+    upstream.run_command(['git', 'config', 'user.name', 'bench'])
+    upstream.run_command(['git', 'config', 'user.email',
+                          'bench@example.com'])
+    upstream.commit(message='first', stage=False)
+    refs = []
+    for number in range(count):
+        name = 'ref%d' % number
+        if number % 2:
+            upstream.tag(name, message=name)
+        else:
+            upstream.branch(name)
+        refs.append(name)
+    repo = git.GitRepo.clone('file://' + upstream.repo_dir, temp=True)
+    repo.run_command(['git', 'config', 'remote.origin.uploadpack',
+                      'sleep %s && git-upload-pack' % latency])
+
+    start = time.time()
+    one_by_one = {ref: repo.remote_resolve_reference(ref) for ref in refs}
+    serial = time.time() - start
+    start = time.time()
+    batched = repo.resolve_references(refs)
+    batch = time.time() - start
+    assert batched == one_by_one
+
+    print("%d refs, %.2fs latency" % (count, latency))
+    print("remote_resolve_reference per ref: %.2fs" % serial)
+    print("resolve_references:               %.2fs" % batch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark importing simpl modules.
+
+Imports each module in a fresh interpreter with `python -X importtime`
+(Python 3.7+) and reports the median cumulative import time. Exits with 1
+if a module goes over its budget.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/import_time.py [runs]
+"""
+
+from __future__ import print_function
+
+import subprocess
+import sys
+
+#: {module: budget in milliseconds}
+BUDGETS = {
+    'simpl.git': 50,
+    'simpl.cli': 50,
+    'simpl.config': 50,
+    'simpl.server': 250,
+    'simpl.db.mongodb': 250,
+}
+
+
+def import_time(module):
+    """Return the cumulative time (ms) of importing `module`, or None.
+
+    None means the module (or one of its dependencies) is not installed.
+    """
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-c',
+                             'import %s' % module],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    _, err = proc.communicate()
+    if proc.returncode:
+        return None
+    for line in err.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000.0
+    return None
+
+
+def median_import_time(module, runs=5):
+    """Return the median of `runs` import times (ms) of `module`."""
+    times = [import_time(module) for _ in range(runs)]
+    if None in times:
+        return None
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    """Print the import times and check them against the budgets."""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    over = []
+    print("%-20s %10s %10s" % ('module', 'ms', 'budget'))
+    for module in sorted(BUDGETS):
+        elapsed = median_import_time(module, runs=runs)
+        if elapsed is None:
+            print("%-20s %10s %10d" % (module, 'n/a', BUDGETS[module]))
+            continue
+        print("%-20s %10.1f %10d" % (module, elapsed, BUDGETS[module]))
+        if elapsed > BUDGETS[module]:
+            over.append(module)
+    if over:
+        print("Over budget: %s" % ', '.join(over))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark the paginated list path.
+
+Times :func:`simpl.rest.write_pagination_headers` on its own and a full
+`GET` through a `@rest.paginated` bottle route.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/pagination.py [iterations]
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+
+import bottle
+
+from simpl import rest
+
+QUERY = [('limit', '20'), ('offset', '40'), ('status', 'ACTIVE'),
+         ('sort', '-created')]
+DATA = {'collection-count': 1000, 'data': list(range(20))}
+
+
+def headers_only():
+    """Write headers for a middle page (all four links)."""
+    response = bottle.BaseResponse()
+    rest.write_pagination_headers(DATA, 40, 20, response, '/widgets',
+                                  'widget', query=QUERY)
+
+
+def build_app():
+    """Return a bottle app with one paginated route."""
+    app = bottle.Bottle()
+
+    @app.get('/widgets')
+    @rest.paginated('widget')
+    def widgets(offset=None, limit=None):  # pylint: disable=unused-variable
+        return {'collection-count': 1000, 'data': list(range(limit))}
+
+    return app
+
+
+def full_request(app):
+    """Return a callable that runs one GET through the app."""
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': '/widgets',
+        'QUERY_STRING': 'limit=20&offset=40&status=ACTIVE&sort=-created',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+    }
+
+    def start_response(status, headers, exc_info=None):
+        """Discard the response."""
+
+    def call():
+        """Run the request."""
+        b''.join(app(dict(environ), start_response))
+    return call
+
+
+def report(name, func, number):
+    """Print the best of three runs in microseconds per call."""
+    best = min(timeit.repeat(func, number=number, repeat=3))
+    print('%-28s %8.2f us/call' % (name, best / number * 1e6))
+
+
+def main(number=20000):
+    """Run the benchmarks."""
+    report('write_pagination_headers', headers_only, number)
+    report('GET paginated route', full_request(build_app()), number // 4)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark route matching: bottle's router vs :mod:`simpl.routing`.
+
+Builds an app with `resources` REST-style resources (six routes each, most
+of them dynamic) and times matching the last resource's routes, which
+bottle finds last.
+
+Usage:
+
+    PYTHONPATH=. python benchmarks/routing.py [resources] [iterations]
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+
+import bottle
+
+from simpl import routing
+
+
+def build_app(resources):
+    """Return a bottle app with six routes per resource."""
+    app = bottle.Bottle()
+    for number in range(resources):
+        base = '/v1/<tenant>/resource%d' % number
+        for method, rule in [('GET', base), ('POST', base),
+                             ('GET', base + '/<item_id>'),
+                             ('PUT', base + '/<item_id>'),
+                             ('DELETE', base + '/<item_id>'),
+                             ('GET', base + '/<item_id>/parts/<part:int>')]:
+            app.route(rule, method=method, callback=lambda **kwargs: None)
+    return app
+
+
+def main():
+    """Time matching with and without the dispatch table."""
+    resources = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    last = resources - 1
+    requests = [
+        {'REQUEST_METHOD': 'GET',
+         'PATH_INFO': '/v1/acme/resource%d/42' % last},
+        {'REQUEST_METHOD': 'GET',
+         'PATH_INFO': '/v1/acme/resource%d/42/parts/7' % last},
+        {'REQUEST_METHOD': 'PUT',
+         'PATH_INFO': '/v1/acme/resource%d/42' % last},
+        {'REQUEST_METHOD': 'GET',
+         'PATH_INFO': '/v1/acme/resource0/42'},
+    ]
+    app = build_app(resources)
+    print("%d routes, %d iterations of %d requests" % (
+        len(app.routes), iterations, len(requests)))
+
+    def match_all(match):
+        """Match every request once."""
+        for environ in requests:
+            match(environ)
+
+    bottle_time = timeit.timeit(lambda: match_all(app.router.match),
+                                number=iterations)
+    table = routing.accelerate(app)
+    fast_time = timeit.timeit(lambda: match_all(app.router.match),
+                              number=iterations)
+    count = iterations * len(requests)
+    print("bottle router:  %.2f us/match" % (bottle_time / count * 1e6))
+    print("dispatch table: %.2f us/match" % (fast_time / count * 1e6))
+    table.uninstall()
+
+
+if __name__ == '__main__':
+    main()
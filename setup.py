@@ -36,6 +36,9 @@ TESTS_REQUIRE = [
     'mock',
 ]
 
+# simpl.aioserver (the `xasyncio` server adapter), simpl.aiogit and
+# simpl.utils.aioshell require Python 3.5+. They are only imported when used,
+# and tox skips them on older Pythons.
 CLASSIFIERS = [
     'Intended Audience :: Developers',
     'License :: OSI Approved :: Apache Software License',
@@ -0,0 +1,159 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Asyncio versions of the :mod:`simpl.git` read operations.
+
+Requires Python 3.5+. Git runs in asyncio subprocesses, so a service can
+run many git commands concurrently without blocking its event loop or
+using threads. The commands and the parsing of their output are the ones
+of :mod:`simpl.git`.
+
+Example usage:
+
+    from simpl import git
+
+    repo = git.GitRepo('/path/to/repo')
+    refs = await repo.aio.list_refs()
+    branches, tags = await asyncio.gather(repo.aio.list_branches(),
+                                          repo.aio.list_tags())
+"""
+
+import asyncio
+
+from simpl import exceptions
+from simpl import git
+from simpl.utils import aioshell
+
+# pylint: disable=W0212
+
+
+async def execute_git_command(command, repo_dir=None, timeout=None,
+                              max_output=None):
+    """Execute a git command and return the output.
+
+    Like :func:`simpl.git.execute_git_command`. The command is killed if
+    the coroutine is cancelled, runs for longer than 'timeout' seconds
+    (raising SimplGitTimeout) or writes more than 'max_output' bytes.
+    """
+    await _check_version_once()
+    try:
+        return await aioshell.execute(command, cwd=repo_dir, timeout=timeout,
+                                      max_output=max_output)
+    except exceptions.SimplCalledProcessTimeout as err:
+        raise exceptions.SimplGitTimeout(err.returncode, err.cmd,
+                                         output=err.output)
+    except exceptions.SimplCalledProcessError as err:
+        raise exceptions.SimplGitCommandError(err.returncode, err.cmd,
+                                              output=err.output)
+    except OSError as err:
+        # OSError's errno *is not* the returncode
+        raise exceptions.SimplGitCommandError(
+            127, command, output=repr(err), oserror=err)
+
+
+async def _check_version_once():
+    """Run the first-command git version check off the event loop."""
+    if not git._VERSION_CHECK['done']:
+        await asyncio.get_event_loop().run_in_executor(
+            None, git._check_version_once)
+
+
+class AsyncGitRepo(object):
+
+    """Coroutine versions of the read methods of a :class:`GitRepo`.
+
+    Usually reached through :attr:`simpl.git.GitRepo.aio`. Results are not
+    cached (see the `cache` option of GitRepo).
+    """
+
+    def __init__(self, repo, timeout=None, max_output=None):
+        """Wrap `repo` (a :class:`simpl.git.GitRepo`).
+
+        :keyword timeout: seconds after which each git command is killed.
+        :keyword max_output: bytes of output after which each git command
+            is killed.
+        """
+        self.repo = repo
+        self.timeout = timeout
+        self.max_output = max_output
+
+    def __repr__(self):
+        """Show the wrapped repo."""
+        return '<%s of %r>' % (type(self).__name__, self.repo)
+
+    async def _run(self, command, parse):
+        """Run a `simpl.git` read command (if needed) and parse it."""
+        if command is None:
+            return parse(None)
+        output = await execute_git_command(
+            command, repo_dir=self.repo.repo_dir, timeout=self.timeout,
+            max_output=self.max_output)
+        return parse(output)
+
+    async def status(self):
+        """Return the working tree status."""
+        return await self._run(['git', 'status'], git._raw)
+
+    async def head(self):
+        """Return the current commit hash."""
+        return await self._run(*git._head_commit_call(self.repo.repo_dir))
+
+    async def current_branch(self):
+        """Return the current branch name ("HEAD" if detached)."""
+        return await self._run(
+            *git._current_branch_call(self.repo.repo_dir))
+
+    async def list_refs(self):
+        """Like :meth:`simpl.git.GitRepo.list_refs`."""
+        return await self._run(*git._list_refs_call(self.repo.repo_dir))
+
+    async def list_branches(self, records=False):
+        """Like :meth:`simpl.git.GitRepo.list_branches`."""
+        return await self._run(*git._list_branches_call(records))
+
+    async def list_tags(self, with_messages=False, records=False):
+        """Like :meth:`simpl.git.GitRepo.list_tags`."""
+        return await self._run(*git._list_tags_call(with_messages, records))
+
+    async def list_config(self):
+        """Like :meth:`simpl.git.GitRepo.list_config`."""
+        return await self._run(*git._list_config_call())
+
+    async def list_remotes(self, records=False):
+        """Like :meth:`simpl.git.GitRepo.list_remotes`."""
+        return await self._run(*git._list_remotes_call(records))
+
+    async def ls_tree(self, treeish='HEAD', records=False):
+        """Like :meth:`simpl.git.GitRepo.ls_tree`."""
+        return await self._run(*git._ls_tree_call(treeish, records))
+
+    async def ls(self):
+        """Like :meth:`simpl.git.GitRepo.ls`."""
+        tree = await self.ls_tree()
+        return [t.get('file') for t in tree if t.get('file')]
+
+    async def ls_remote(self, remote='origin', refs=None):
+        """Like :meth:`simpl.git.GitRepo.ls_remote`."""
+        return await self._run(*git._ls_remote_call(remote, refs))
+
+    async def remote_resolve_reference(self, ref, remote='origin'):
+        """Like :meth:`simpl.git.GitRepo.remote_resolve_reference`."""
+        ls_refs = await self.ls_remote(remote=remote, refs='%s*' % ref)
+        return git._resolve_reference(ls_refs, ref)
+
+    async def resolve_references(self, refs, remote='origin'):
+        """Like :meth:`simpl.git.GitRepo.resolve_references` (no ttl)."""
+        ls_refs = await self.ls_remote(remote=remote)
+        return git.git_resolve_references(self.repo.repo_dir, refs,
+                                          remote=remote, ls_refs=ls_refs)
@@ -0,0 +1,506 @@
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Asyncio HTTP/1.1 front end that runs WSGI apps in a thread pool.
+
+Used by the `xasyncio` server adapter (see :mod:`simpl.server`). Requires
+Python 3.5+.
+
+Connections (accepting, reading requests, keep-alive and writing responses)
+are all handled on an asyncio event loop, so idle and slow clients cost no
+threads. Only the WSGI call itself runs in a worker thread, which means a
+slow request (ex. a slow database query) only ties up one of `threads`
+workers instead of the whole server.
+
+Example usage:
+
+    from simpl import aioserver
+
+    aioserver.WSGIServer(app, threads=32).run('0.0.0.0', 8080)
+"""
+
+import asyncio
+import concurrent.futures
+import email.utils
+import functools
+import io
+import logging
+import sys
+
+from six.moves.urllib import parse
+
+LOG = logging.getLogger(__name__)
+
+#: Maximum number of request headers
+MAX_HEADERS = 100
+#: Maximum length of the request line and of each header line
+MAX_LINE = 65536
+#: Default maximum size of a request body (they are read into memory)
+MAX_BODY = 10 * 1024 * 1024
+
+STATUS_LINES = {
+    400: b'400 Bad Request',
+    408: b'408 Request Timeout',
+    413: b'413 Payload Too Large',
+    431: b'431 Request Header Fields Too Large',
+    500: b'500 Internal Server Error',
+    501: b'501 Not Implemented',
+    505: b'505 HTTP Version Not Supported',
+}
+
+
+class HTTPProtocolError(Exception):
+
+    """A request we cannot parse. Answered with `code` and closed."""
+
+    def __init__(self, code, message=None):
+        """Keep the HTTP status code to reply with."""
+        super(HTTPProtocolError, self).__init__(message or code)
+        self.code = code
+
+
+class WSGIServer(object):
+
+    """Serve a WSGI app from a thread pool behind an asyncio front end."""
+
+    def __init__(self, app, threads=10, backlog=1024, keepalive_timeout=5,
+                 request_timeout=30, url_scheme='http', access_log=True,
+                 max_body=MAX_BODY):
+        """Configure the server.
+
+        :param app: the WSGI application.
+        :keyword threads: number of worker threads running the app.
+        :keyword backlog: listen backlog (not used with an existing socket).
+        :keyword keepalive_timeout: seconds an idle keep-alive connection is
+            kept open waiting for the next request. 0 disables keep-alive.
+        :keyword request_timeout: seconds a client has to send the request
+            line, headers and body before getting a 408.
+        :keyword url_scheme: `wsgi.url_scheme` to report.
+        :keyword access_log: log a line for each request.
+        :keyword max_body: request bodies larger than this many bytes are
+            answered with a 413 (bodies are read into memory before the app
+            is called).
+        """
+        self.app = app
+        self.threads = threads
+        self.backlog = backlog
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.url_scheme = url_scheme
+        self.access_log = access_log
+        self.max_body = max_body
+        self.executor = None
+        self.loop = None
+        self.server = None
+        self.stopping = False
+        #: {writer: True if handling a request, False if idle}
+        self.connections = {}
+        self._idle = None
+        self._done = None
+
+    async def start(self, host=None, port=None, sock=None):
+        """Start listening (on `sock` if supplied)."""
+        self.loop = asyncio.get_event_loop()
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.threads)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        if sock is not None:
+            sock.setblocking(False)
+            self.server = await asyncio.start_server(
+                self.handle, sock=sock, limit=MAX_LINE)
+        else:
+            self.server = await asyncio.start_server(
+                self.handle, host, port, backlog=self.backlog,
+                reuse_address=True, limit=MAX_LINE)
+        for listener in self.server.sockets:
+            LOG.info("Serving on %s with %d threads",
+                     listener.getsockname(), self.threads)
+
+    def run(self, host=None, port=None, sock=None):
+        """Start and serve until :meth:`shutdown` is complete."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.start(host, port, sock=sock))
+            self._done = loop.create_future()
+            loop.run_until_complete(self._done)
+        finally:
+            if self.executor is not None:
+                loop.run_until_complete(self._stop_workers())
+            loop.close()
+
+    def stop(self, timeout=30):
+        """Shut down gracefully. Safe to call from any thread."""
+        def begin():
+            """Runs on the loop."""
+            task = self.loop.create_task(self.shutdown(timeout))
+            task.add_done_callback(self._finished)
+        self.loop.call_soon_threadsafe(begin)
+
+    def _finished(self, task):
+        """Let run() return once shut down."""
+        if self._done is not None and not self._done.done():
+            if task.exception():
+                self._done.set_exception(task.exception())
+            else:
+                self._done.set_result(None)
+
+    async def shutdown(self, timeout=30):
+        """Stop accepting, close idle connections and drain the rest."""
+        self.stopping = True
+        self.server.close()
+        for writer, busy in list(self.connections.items()):
+            if not busy:
+                writer.close()
+        busy = sum(1 for active in self.connections.values() if active)
+        if busy:
+            LOG.info("Waiting up to %ss for %d request(s)", timeout, busy)
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                LOG.warning("Graceful timeout expired with %d request(s) "
+                            "still in flight",
+                            sum(1 for a in self.connections.values() if a))
+        for writer in list(self.connections):
+            writer.close()
+        await self._stop_workers()
+
+    async def _stop_workers(self):
+        """Wait for the worker threads to finish.
+
+        The loop must keep running meanwhile, since workers write their
+        responses through it.
+        """
+        await self.loop.run_in_executor(
+            None, functools.partial(self.executor.shutdown, wait=True))
+
+    def _set_busy(self, writer, busy):
+        """Track whether a connection is in the middle of a request."""
+        self.connections[writer] = busy
+        if any(self.connections.values()):
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    async def handle(self, reader, writer):
+        """Serve requests on a connection until it is closed."""
+        self.connections[writer] = False
+        peer = writer.get_extra_info('peername') or ('', 0)
+        sockname = writer.get_extra_info('sockname') or ('', 0)
+        first = True
+        try:
+            while not self.stopping:
+                timeout = self.request_timeout if first else \
+                    self.keepalive_timeout
+                try:
+                    line = await asyncio.wait_for(reader.readline(), timeout)
+                except asyncio.TimeoutError:
+                    if first:
+                        await self._error(writer, 408)
+                    return
+                except ValueError:
+                    await self._error(writer, 431)
+                    return
+                if not line:
+                    return
+                first = False
+                self._set_busy(writer, True)
+                try:
+                    environ = await asyncio.wait_for(
+                        self._read_request(line, reader, writer, peer,
+                                           sockname),
+                        self.request_timeout)
+                except asyncio.TimeoutError:
+                    await self._error(writer, 408)
+                    return
+                except HTTPProtocolError as exc:
+                    await self._error(writer, exc.code)
+                    return
+                except ValueError:
+                    # StreamReader line limit exceeded
+                    await self._error(writer, 431)
+                    return
+                keep_alive = await self._respond(environ, writer)
+                self._set_busy(writer, False)
+                if not keep_alive or not self.keepalive_timeout:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            if not any(self.connections.values()):
+                self._idle.set()
+            writer.close()
+
+    async def _read_request(self, line, reader, writer, peer, sockname):
+        """Parse the request line, headers and body into a WSGI environ."""
+        if not line.endswith(b'\n'):
+            raise HTTPProtocolError(400 if len(line) < MAX_LINE else 431)
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPProtocolError(400, "Bad request line")
+        if not version.startswith('HTTP/1.'):
+            raise HTTPProtocolError(505)
+
+        path, _, query = target.partition('?')
+        if '://' in path:
+            path = '/' + path.split('://', 1)[1].partition('/')[2]
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': parse.unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': str(sockname[0]),
+            'SERVER_PORT': str(sockname[1]),
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': str(peer[0]),
+            'REMOTE_PORT': str(peer[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': self.url_scheme,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+        for _ in range(MAX_HEADERS + 1):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n'):
+                break
+            if not line.endswith(b'\n'):
+                raise HTTPProtocolError(431 if line else 400)
+            name, sep, value = line.decode('latin-1').partition(':')
+            if not sep:
+                raise HTTPProtocolError(400, "Bad header line")
+            key = name.strip().upper().replace('-', '_')
+            value = value.strip()
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            if key in environ:
+                value = environ[key] + ',' + value
+            environ[key] = value
+        else:
+            raise HTTPProtocolError(431)
+
+        environ['wsgi.input'] = io.BytesIO(await self._read_body(environ,
+                                                                 reader,
+                                                                 writer))
+        return environ
+
+    async def _read_body(self, environ, reader, writer):
+        """Read a Content-Length or chunked request body.
+
+        Bodies over `max_body` bytes are refused with a 413 (before the
+        client is told to continue, if it asked).
+        """
+        encoding = environ.get('HTTP_TRANSFER_ENCODING', '').lower()
+        if encoding:
+            if encoding != 'chunked':
+                raise HTTPProtocolError(501)
+            self._continue(environ, writer)
+            chunks = []
+            length = 0
+            while True:
+                size_line = await reader.readline()
+                try:
+                    size = int(size_line.split(b';', 1)[0], 16)
+                except ValueError:
+                    raise HTTPProtocolError(400, "Bad chunk size")
+                if not size:
+                    # skip trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n',
+                                                            b''):
+                        pass
+                    break
+                length += size
+                if length > self.max_body:
+                    raise HTTPProtocolError(413)
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b''.join(chunks)
+            environ['CONTENT_LENGTH'] = str(len(body))
+            del environ['HTTP_TRANSFER_ENCODING']
+            return body
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise HTTPProtocolError(400, "Bad Content-Length")
+        if length < 0:
+            raise HTTPProtocolError(400, "Bad Content-Length")
+        if length > self.max_body:
+            raise HTTPProtocolError(413)
+        self._continue(environ, writer)
+        return await reader.readexactly(length) if length else b''
+
+    @staticmethod
+    def _continue(environ, writer):
+        """Send `100 Continue` if the client waits for it."""
+        if environ.get('HTTP_EXPECT', '').lower() == '100-continue':
+            writer.write(environ['SERVER_PROTOCOL'].encode('latin-1') +
+                         b' 100 Continue\r\n\r\n')
+
+    async def _error(self, writer, code):
+        """Send a short error response (the connection is then closed)."""
+        body = STATUS_LINES[code]
+        writer.write(b'HTTP/1.1 ' + body + b'\r\nContent-Type: text/plain'
+                     b'\r\nContent-Length: ' + str(len(body)).encode() +
+                     b'\r\nConnection: close\r\n\r\n' + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def _wants_keep_alive(self, environ):
+        """Check the request allows reusing the connection."""
+        connection = environ.get('HTTP_CONNECTION', '').lower()
+        if environ['SERVER_PROTOCOL'] == 'HTTP/1.0':
+            return 'keep-alive' in connection
+        return 'close' not in connection
+
+    async def _respond(self, environ, writer):
+        """Run the app in the pool. Returns True to keep the connection."""
+        response = _Response(self, environ, writer)
+        try:
+            await self.loop.run_in_executor(self.executor, response.run)
+        except ConnectionError:
+            return False
+        except Exception:  # pylint: disable=broad-except
+            LOG.exception("Error running WSGI app")
+            if not response.headers_sent:
+                await self._error(writer, 500)
+            return False
+        await writer.drain()
+        if self.access_log:
+            LOG.info('%s - "%s %s %s" %s %s', environ['REMOTE_ADDR'],
+                     environ['REQUEST_METHOD'], environ['PATH_INFO'],
+                     environ['SERVER_PROTOCOL'], response.status[:3],
+                     response.sent)
+        return response.keep_alive and not self.stopping
+
+
+class _Response(object):
+
+    """Runs a WSGI call in a worker thread and writes the response."""
+
+    def __init__(self, server, environ, writer):
+        """Set up for one request."""
+        self.server = server
+        self.environ = environ
+        self.writer = writer
+        self.status = None
+        self.headers = None
+        self.headers_sent = False
+        self.chunked = False
+        self.keep_alive = server._wants_keep_alive(environ)
+        self.head = environ['REQUEST_METHOD'] == 'HEAD'
+        self.sent = 0
+
+    def start_response(self, status, headers, exc_info=None):
+        """WSGI start_response."""
+        if exc_info:
+            try:
+                if self.headers_sent:
+                    raise exc_info[1].with_traceback(exc_info[2])
+            finally:
+                exc_info = None
+        elif self.status is not None:
+            raise AssertionError("start_response called twice")
+        self.status = status
+        self.headers = headers
+        return self.write
+
+    def run(self):
+        """Call the app and send its response (in a worker thread)."""
+        result = self.server.app(self.environ, self.start_response)
+        try:
+            if isinstance(result, (list, tuple)) and not self.headers_sent:
+                self._set_length(sum(len(chunk) for chunk in result))
+            for chunk in result:
+                if chunk:
+                    self.write(chunk)
+            if not self.headers_sent:
+                self._set_length(0)
+                self._send(self._header_block())
+            elif self.chunked:
+                self._send(b'0\r\n\r\n')
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    def _set_length(self, length):
+        """Add a Content-Length unless the app set one (or it's a 304)."""
+        if self.status[:3] in ('204', '304') or self.status[0] == '1':
+            return
+        for name, _ in self.headers:
+            if name.lower() in ('content-length', 'transfer-encoding'):
+                return
+        self.headers.append(('Content-Length', str(length)))
+
+    def _header_block(self):
+        """Return the status line and headers, choosing the framing."""
+        has_length = False
+        has_date = False
+        for name, value in self.headers:
+            lname = name.lower()
+            if lname == 'content-length':
+                has_length = True
+            elif lname == 'date':
+                has_date = True
+            elif lname == 'connection' and value.lower() == 'close':
+                self.keep_alive = False
+        headers = list(self.headers)
+        if not has_date:
+            headers.append(('Date', email.utils.formatdate(usegmt=True)))
+        bodyless = self.head or self.status[:3] in ('204', '304')
+        if not has_length and not bodyless:
+            if self.environ['SERVER_PROTOCOL'] == 'HTTP/1.1':
+                self.chunked = True
+                headers.append(('Transfer-Encoding', 'chunked'))
+            else:
+                self.keep_alive = False
+        if self.server.stopping:
+            self.keep_alive = False
+        if not self.keep_alive:
+            headers.append(('Connection', 'close'))
+        elif self.environ['SERVER_PROTOCOL'] == 'HTTP/1.0':
+            headers.append(('Connection', 'keep-alive'))
+        lines = ['%s %s' % (self.environ['SERVER_PROTOCOL'], self.status)]
+        lines.extend('%s: %s' % header for header in headers)
+        self.headers_sent = True
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    def write(self, data):
+        """Send a body chunk (sending the headers first if needed)."""
+        if self.status is None:
+            raise AssertionError("write() before start_response()")
+        out = b'' if self.headers_sent else self._header_block()
+        if not self.head:
+            self.sent += len(data)
+            if self.chunked:
+                out += b'%x\r\n' % len(data) + data + b'\r\n'
+            else:
+                out += data
+        if out:
+            self._send(out)
+
+    def _send(self, data):
+        """Write on the loop and wait for the buffer to drain."""
+        asyncio.run_coroutine_threadsafe(
+            self._write(data), self.server.loop).result()
+
+    async def _write(self, data):
+        """Runs on the loop."""
+        self.writer.write(data)
+        await self.writer.drain()
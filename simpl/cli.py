@@ -17,7 +17,6 @@
 import functools
 import logging
 
-from simpl import server
 from simpl.utils import cli as cli_utils
 
 
@@ -47,6 +46,9 @@ def main(argv=None):
     # `simpl server`
     #
     logging.basicConfig(level=logging.INFO)
+    # imported here: bottle and the server adapters are only needed once
+    # the command line is actually parsed
+    from simpl import server
     server_func = functools.partial(server.main, argv=argv)
     server_parser = server.attach_parser(default_subparser())
     server_parser.set_defaults(_func=server_func)
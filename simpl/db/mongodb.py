@@ -65,15 +65,8 @@ from __future__ import print_function
 
 import copy
 import json
+import sys
 
-try:
-    import eventlet
-except ImportError:
-    pass
-try:
-    import mongo_proxy
-except ImportError:
-    mongo_proxy = None
 import pymongo
 from pymongo.son_manipulator import SONManipulator
 
@@ -167,6 +160,16 @@ def build_text_search(strings, name_field='name'):
     return {'$or': [text_search, name_search]}
 
 
+def _loaded_eventlet():
+    """Return eventlet if this process is using it, otherwise None.
+
+    Eventlet is not imported here: an eventlet server has imported (and
+    monkey patched) it already, and everyone else would pay for the import
+    without having a hub to cooperate with.
+    """
+    return sys.modules.get('eventlet')
+
+
 class SimplDB(object):
 
     """Database wrapper.
@@ -239,22 +242,24 @@ class SimplDB(object):
             ]
         self._client = None
         self._connection = None
+        eventlet = _loaded_eventlet()
         if eventlet:
             self.client_lock = eventlet.semaphore.Semaphore()
             eventlet.spawn_n(self.tune)
         else:
+            self.client_lock = None
             self.tune()
 
     def _set_client(self):
         """Set client property if not set."""
         if self._client is None:
-            if mongo_proxy:
-                self._client = mongo_proxy.MongoProxy(
-                    pymongo.MongoClient(self.connection_string),
-                    logger=LOG)
-            else:
+            try:
+                import mongo_proxy
+            except ImportError:
                 LOG.warning("MongoDBProxy not imported. AutoReconnect "
                             "is not enabled.")
+                self._client = pymongo.MongoClient(self.connection_string)
+            else:
                 self._client = mongo_proxy.MongoProxy(
                     pymongo.MongoClient(self.connection_string),
                     logger=LOG)
@@ -270,13 +275,27 @@ class SimplDB(object):
         a semaphore to make sure only one mongodb client is instantiated per
         SimplDB class.
         """
-        if eventlet:
+        if self.client_lock is not None:
             with self.client_lock:
                 self._set_client()
         else:
             self._set_client()
         return self._client
 
+    def close(self):
+        """Close the client (if connected).
+
+        The next use reconnects. Suitable as a server shutdown hook::
+
+            server.on_shutdown(db.close)
+        """
+        if self._client is not None:
+            self._client.close()
+            LOG.debug("Closed connection to MongoDB: %s",
+                      self.safe_connection_string)
+        self._client = None
+        self._connection = None
+
     @property
     def connection(self):
         """Connect to and return mongodb database object."""
@@ -457,6 +476,27 @@ class Collection(object):
                                   sort=sort, **kwargs)
             return list(cursor), cursor.count()
 
+    def iterate(self, offset=0, limit=0, fields=None, sort=None,
+                batch_size=None, **kwargs):
+        """Yield filtered documents in a collection one at a time.
+
+        Takes the same arguments as :meth:`list`, but does not load all the
+        documents (or count them). Use it to stream large result sets, for
+        example with :func:`simpl.rest.ndjson_response`.
+
+        :param batch_size: number of documents fetched per round trip to the
+            server (defaults to the server's choice).
+        """
+        cursor = self._cursor(offset=offset, limit=limit, fields=fields,
+                              sort=sort, **kwargs)
+        if batch_size:
+            cursor.batch_size(batch_size)
+        try:
+            for document in cursor:
+                yield document
+        finally:
+            cursor.close()
+
     def search_alternative(self, limit, **kwargs):
         """Replace $search with $in for mongodb v2.4.
 
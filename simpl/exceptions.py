@@ -27,8 +27,11 @@ __all__ = (
     'SimplException',
     'SimplGitError',
     'SimplGitCommandError',
+    'SimplGitTimeout',
     'SimplGitNotRepo',
     'SimplCalledProcessError',
+    'SimplCalledProcessTimeout',
+    'SimplCalledProcessOutputLimit',
 )
 
 
@@ -83,6 +86,11 @@ class SimplGitCommandError(SimplGitError):
         return rpr
 
 
+class SimplGitTimeout(SimplGitCommandError):
+
+    """A git command was killed for running longer than its timeout."""
+
+
 class SimplGitNotRepo(SimplGitError):
 
     """The directory supplied is not a git repo."""
@@ -109,6 +117,24 @@ class SimplCalledProcessError(SimplException):
                 % (self.cmd, self.returncode))
 
 
+class SimplCalledProcessTimeout(SimplCalledProcessError):
+
+    """Raised when a process run by execute() is killed by its timeout."""
+
+    def __str__(self):
+        """Include custom data in string."""
+        return "Command '%s' timed out" % self.cmd
+
+
+class SimplCalledProcessOutputLimit(SimplCalledProcessError):
+
+    """Raised when a process is killed for writing too much output."""
+
+    def __str__(self):
+        """Include custom data in string."""
+        return "Command '%s' produced too much output" % self.cmd
+
+
 class SimplConfigException(SimplException):
 
     """Errors raised by simpl/config."""
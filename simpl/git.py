@@ -24,26 +24,67 @@ Tested against:
 """
 
 import atexit
+import collections
 import errno
+import functools
+import hashlib
 import logging
 import os
 import pipes
 import re
 import shutil
+import subprocess
 import tempfile
+import threading
+import time
 import warnings
+import weakref
+import zlib
 
+from six.moves import queue
 from six.moves import zip_longest
 
 from simpl import exceptions
 from simpl.utils import shell
 
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
 LOG = logging.getLogger(__name__)
 #: Minimum recommended git version
 MIN_GIT_VERSION = (1, 9)
-
-
-def execute_git_command(command, repo_dir=None):
+#: Listings cached by GitRepo(cache=True) are not kept when their files
+#: changed less than this many seconds before: file times can be too coarse
+#: to tell a second change within that time apart (see git's "racy git").
+CACHE_RACY_SECONDS = 2
+# The version check forks `git --version`, so it runs with the first git
+# command instead of whenever this module is imported.
+_VERSION_CHECK = {'done': False}
+#: A full object name (SHA-1 or SHA-256)
+SHA_REGEX = re.compile(r'^(?:[0-9a-f]{40}|[0-9a-f]{64})$')
+
+# Compact records returned instead of dicts with `records=True` (and by
+# the iter_* generators). Use `._asdict()` for the dict form.
+#: An entry of :func:`git_ls_tree`
+TreeEntry = collections.namedtuple('TreeEntry', 'mode type object file')
+#: A branch of :func:`git_list_branches`
+BranchInfo = collections.namedtuple('BranchInfo', 'branch commit message')
+#: A remote of :func:`git_list_remotes` (cmd is '(fetch)' or '(push)')
+RemoteInfo = collections.namedtuple('RemoteInfo', 'name location cmd')
+#: A tag of :func:`git_list_tags` (message is None unless asked for)
+TagInfo = collections.namedtuple('TagInfo', 'tag message')
+# the strings handed out by _shared()
+_SHARED = {}
+
+_clock = getattr(time, 'monotonic', time.time)
+# the time by which git commands of this thread must finish, set by
+# run_parallel()
+_DEADLINE = threading.local()
+
+
+def execute_git_command(command, repo_dir=None, timeout=None):
     """Execute a git command and return the output.
 
     Catches CalledProcessErrors and OSErrors, wrapping them
@@ -52,9 +93,21 @@ def execute_git_command(command, repo_dir=None):
     Raises :class:`~simpl.exceptions.SimplGitCommandError` if the command
     fails. Returncode and output from the attempt can be found in the
     SimplGitCommandError attributes.
+
+    If the command runs for longer than 'timeout' seconds (or past the
+    deadline of a :func:`run_parallel` operation) it is killed and
+    :class:`~simpl.exceptions.SimplGitTimeout` is raised.
+
+    The first call also checks the installed git version (see
+    :func:`check_git_version`).
     """
+    _check_version_once()
+    timeout = _git_timeout(command, timeout)
     try:
-        output = shell.execute(command, cwd=repo_dir)
+        output = shell.execute(command, cwd=repo_dir, timeout=timeout)
+    except exceptions.SimplCalledProcessTimeout as err:
+        raise exceptions.SimplGitTimeout(err.returncode, err.cmd,
+                                         output=err.output)
     except exceptions.SimplCalledProcessError as err:
         raise exceptions.SimplGitCommandError(err.returncode, err.cmd,
                                               output=err.output)
@@ -66,6 +119,110 @@ def execute_git_command(command, repo_dir=None):
         return output
 
 
+def _git_timeout(command, timeout):
+    """Return the timeout of a git command, given the thread's deadline."""
+    deadline = getattr(_DEADLINE, 'value', None)
+    if deadline is None:
+        return timeout
+    remaining = deadline - _clock()
+    if remaining <= 0:
+        raise exceptions.SimplGitTimeout(
+            -1, command, output="Deadline passed before running")
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def _check_version_once():
+    """Run :func:`check_git_version` before the first git command."""
+    if not _VERSION_CHECK['done']:
+        _VERSION_CHECK['done'] = True
+        check_git_version()
+
+
+def iter_git_command(command, repo_dir=None, separator=b'\n',
+                     timeout=None):
+    r"""Execute a git command and yield its output record by record.
+
+    Records are read from the pipe as git writes them, split on
+    `separator` (ex. b'\0' for commands run with `-z`) and decoded.
+    Unlike :func:`execute_git_command`, the output is never held in
+    memory as a whole and stderr is not mixed into it.
+
+    Raises :class:`~simpl.exceptions.SimplGitCommandError` (once the
+    output has been read) if the command fails. If the generator is
+    closed early, the command is killed.
+
+    If the command runs for longer than 'timeout' seconds (or past the
+    deadline of a :func:`run_parallel` operation), including the time
+    spent by the caller between records, it is killed and
+    :class:`~simpl.exceptions.SimplGitTimeout` is raised after the
+    records read so far.
+    """
+    _check_version_once()
+    timeout = _git_timeout(command, timeout)
+    LOG.debug("Streaming `%s` in %s", ' '.join(command), repo_dir)
+    # with a timeout, run in a new session to kill its children too
+    new_session = timeout is not None and hasattr(os, 'setsid')
+    stderr = tempfile.TemporaryFile()
+    try:
+        process = subprocess.Popen(
+            command, cwd=repo_dir, stdout=subprocess.PIPE, stderr=stderr,
+            **shell._new_session_args(new_session))  # pylint: disable=W0212
+    except OSError as err:
+        stderr.close()
+        raise exceptions.SimplGitCommandError(
+            127, command, output=repr(err), oserror=err)
+    killed = []
+    if timeout is not None:
+        timer = threading.Timer(timeout, shell._kill,  # pylint: disable=W0212
+                                args=(process, killed, new_session))
+        timer.daemon = True
+        timer.start()
+    try:
+        pending = b''
+        while True:
+            chunk = os.read(process.stdout.fileno(), 65536)
+            if not chunk:
+                break
+            records = (pending + chunk).split(separator)
+            pending = records.pop()
+            for record in records:
+                yield record.decode('utf-8', 'replace')
+        if pending:
+            yield pending.decode('utf-8', 'replace')
+        if process.wait() != 0:
+            stderr.seek(0)
+            error = (exceptions.SimplGitTimeout if killed
+                     else exceptions.SimplGitCommandError)
+            raise error(
+                process.returncode, command,
+                output=stderr.read().decode('utf-8', 'replace').strip())
+    finally:
+        if timeout is not None:
+            timer.cancel()
+        process.stdout.close()
+        if process.poll() is None:
+            shell._kill(process, [], new_session)  # pylint: disable=W0212
+            process.wait()
+        stderr.close()
+
+
+def _run_call(repo_dir, command, parse):
+    """Run a read command (None if the answer is known) and parse it.
+
+    The read functions below are split into a `_<name>_call()` returning
+    (command, parse) and this, so :mod:`simpl.aiogit` can run the same
+    commands asynchronously.
+    """
+    if command is None:
+        return parse(None)
+    return parse(execute_git_command(command, repo_dir=repo_dir))
+
+
+def _raw(output):
+    """Parse nothing: return the command output as is."""
+    return output
+
+
 def git_version():
     """Get the `git version`."""
     return execute_git_command(['git', '--version'])
@@ -113,8 +270,231 @@ def check_git_version():
                    rec='.'.join((str(x) for x in MIN_GIT_VERSION))),
             exceptions.GitWarning)
 
-# Check the git version whenever this module is used:
-check_git_version()
+
+class _NeedsGit(Exception):
+
+    """The refs of a repo cannot be read directly; ask git."""
+
+
+#: Files read directly are only trusted with these environment variables
+#: unset, since they change where (or how) git finds them.
+_GIT_ENVIRONMENT = ('GIT_DIR', 'GIT_COMMON_DIR', 'GIT_WORK_TREE',
+                    'GIT_OBJECT_DIRECTORY', 'GIT_NAMESPACE')
+
+
+def _git_dir(repo_dir):
+    """Return the `.git` directory of a plain repo checked out at repo_dir.
+
+    Raises _NeedsGit for anything else (a subdirectory of the work tree,
+    linked worktrees, bare repos, reftable storage, GIT_DIR, ...).
+    """
+    if any(os.environ.get(name) for name in _GIT_ENVIRONMENT):
+        raise _NeedsGit()
+    git_dir = os.path.join(repo_dir, '.git')
+    if not os.path.isdir(os.path.join(git_dir, 'objects')):
+        raise _NeedsGit()
+    if not os.path.isdir(os.path.join(git_dir, 'refs')):
+        raise _NeedsGit()
+    for unusual in ('commondir', 'reftable'):
+        if os.path.exists(os.path.join(git_dir, unusual)):
+            raise _NeedsGit()
+    return git_dir
+
+
+def _parse_ref_value(data):
+    """Parse a loose ref (or HEAD): return ('ref', name) or ('sha', sha)."""
+    data = data.strip()
+    if data.startswith('ref:'):
+        target = data[4:].strip()
+        if target.startswith('refs/'):
+            return 'ref', target
+    elif SHA_REGEX.match(data):
+        return 'sha', data
+    raise _NeedsGit()
+
+
+def _read_file(path):
+    """Return a text file's contents, or None if it does not exist."""
+    try:
+        with open(path) as handle:
+            return handle.read()
+    except (IOError, OSError) as err:
+        if err.errno == errno.ENOENT:
+            return None
+        raise _NeedsGit()
+
+
+def _read_packed_refs(git_dir):
+    """Parse packed-refs: return ({ref: sha}, {ref: peeled sha}, traits)."""
+    refs, peeled, traits = {}, {}, set()
+    data = _read_file(os.path.join(git_dir, 'packed-refs'))
+    last = None
+    for line in (data or '').splitlines():
+        if line.startswith('# pack-refs with:'):
+            traits.update(line.split(':', 1)[1].split())
+        elif line.startswith('^'):
+            if last is None or not SHA_REGEX.match(line[1:].strip()):
+                raise _NeedsGit()
+            peeled[last] = line[1:].strip()
+        elif line.strip() and not line.startswith('#'):
+            fields = line.split()
+            if len(fields) != 2 or not SHA_REGEX.match(fields[0]):
+                raise _NeedsGit()
+            last = fields[1]
+            refs[last] = fields[0]
+    return refs, peeled, traits
+
+
+def _read_loose_refs(git_dir):
+    """Return {ref: ('ref', target) or ('sha', sha)} of the refs/ files."""
+    refs = {}
+    top = os.path.join(git_dir, 'refs')
+    for dirpath, _, filenames in os.walk(top):
+        for filename in filenames:
+            if filename.endswith('.lock'):
+                continue  # being written; git ignores these too
+            path = os.path.join(dirpath, filename)
+            name = 'refs/' + os.path.relpath(path, top).replace(os.sep, '/')
+            data = _read_file(path)
+            if data is None:
+                continue  # deleted since listed
+            refs[name] = _parse_ref_value(data)
+    return refs
+
+
+class _Refs(object):
+
+    """The refs of a repo, read from its files (no git process)."""
+
+    def __init__(self, repo_dir):
+        """Read HEAD. The other refs are read when needed."""
+        self.git_dir = _git_dir(repo_dir)
+        head = _read_file(os.path.join(self.git_dir, 'HEAD'))
+        if head is None:
+            raise _NeedsGit()
+        self.head = _parse_ref_value(head)
+        self._packed = None
+        self._loose = None
+        #: {ref: peeled sha} and the traits of packed-refs (read with it)
+        self.peeled = {}
+        self.traits = set()
+
+    @property
+    def packed(self):
+        """{ref: sha} from packed-refs."""
+        if self._packed is None:
+            self._packed, self.peeled, self.traits = _read_packed_refs(
+                self.git_dir)
+        return self._packed
+
+    @property
+    def loose(self):
+        """{ref: ('ref', target) or ('sha', sha)} of all loose refs."""
+        if self._loose is None:
+            self._loose = _read_loose_refs(self.git_dir)
+        return self._loose
+
+    def names(self):
+        """Return the names of all refs under refs/."""
+        return set(self.packed) | set(self.loose)
+
+    def _lookup(self, name):
+        """Return the value of one ref (loose first), or None."""
+        if self._loose is not None:
+            loose = self._loose.get(name)
+        else:
+            data = _read_file(os.path.join(self.git_dir, *name.split('/')))
+            loose = _parse_ref_value(data) if data is not None else None
+        if loose is not None:
+            return loose
+        if name in self.packed:
+            return 'sha', self.packed[name]
+        return None
+
+    def resolve(self, value):
+        """Follow symbolic refs. Returns a sha or None (unborn/dangling)."""
+        for _ in range(5):
+            kind, value = value
+            if kind == 'sha':
+                return value
+            value = self._lookup(value)
+            if value is None:
+                return None
+        raise _NeedsGit()
+
+    def peel(self, ref, sha):
+        """Return what an annotated tag points to, None if sha is no tag."""
+        if ref not in self.loose and ref in self.packed:
+            if 'fully-peeled' in self.traits or (
+                    'peeled' in self.traits and ref.startswith('refs/tags/')):
+                return self.peeled.get(ref)
+        if not ref.startswith('refs/tags/'):
+            # branches and remote refs point at commits
+            return None
+        peeled = None
+        for _ in range(5):
+            target = self._tag_target(sha)
+            if target is None:
+                return peeled
+            peeled = sha = target
+        raise _NeedsGit()
+
+    def _tag_target(self, sha):
+        """Return the object a tag object points to, None if not a tag."""
+        path = os.path.join(self.git_dir, 'objects', sha[:2], sha[2:])
+        try:
+            with open(path, 'rb') as handle:
+                data = zlib.decompress(handle.read())
+        except (IOError, OSError, zlib.error):
+            raise _NeedsGit()  # packed (or unreadable) object
+        header, _, body = data.partition(b'\0')
+        if not header.startswith(b'tag '):
+            return None
+        first = body.split(b'\n', 1)[0].split()
+        if len(first) != 2 or first[0] != b'object':
+            raise _NeedsGit()
+        return first[1].decode('ascii')
+
+
+def _stat_stamp(path):
+    """Return what changes when `path` is rewritten, or None if missing.
+
+    The first item is the mtime in seconds (see `_racy`).
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, getattr(stat, 'st_mtime_ns', None), stat.st_size,
+            stat.st_ino)
+
+
+def _racy(stamp, since):
+    """Whether a file in `stamp` changed CACHE_RACY_SECONDS before `since`.
+
+    Its mtime may then not change again if it is rewritten right away.
+    """
+    limit = since - CACHE_RACY_SECONDS
+    return any(stat is not None and stat[0] >= limit for _, stat in stamp)
+
+
+def _copy_listing(result):
+    """Return a copy of a cached listing to hand out.
+
+    Listings are a dict of strings, or a list of strings, tuples, records
+    or dicts of strings, so only the containers need copying.
+    """
+    if isinstance(result, dict):
+        return dict(result)
+    return [dict(item) if isinstance(item, dict) else item for item in result]
+
+
+def _fast(func, repo_dir):
+    """Return func(_Refs(repo_dir)), or None if git has to be asked."""
+    try:
+        return func(_Refs(repo_dir))
+    except _NeedsGit:
+        return None
 
 
 def git_init(repo_dir):
@@ -122,22 +502,68 @@ def git_init(repo_dir):
     return execute_git_command(['git', 'init'], repo_dir=repo_dir)
 
 
-def git_clone(target_dir, repo_location, branch_or_tag=None, verbose=True):
+def git_clone(target_dir, repo_location, branch_or_tag=None, verbose=True,
+              hardlinks=False, depth=None, single_branch=False,
+              filter_spec=None, sparse=None):
     """Clone repo at repo_location to target_dir and checkout branch_or_tag.
 
     If branch_or_tag is not specified, the HEAD of the primary
     branch of the cloned repo is checked out.
+
+    Objects of a repo_location on the local filesystem are copied unless
+    'hardlinks' is True.
+
+    To transfer less:
+    - 'depth' only fetches that many commits of history (and implies
+      'single_branch')
+    - 'single_branch' only fetches branch_or_tag (or the remote HEAD)
+    - 'filter_spec' (ex. 'blob:none') leaves objects out until they are
+      needed (the remote must allow it, see `uploadpack.allowFilter`)
+    - 'sparse' (a list of patterns, see :func:`git_sparse_checkout`)
+      only checks out matching files
+    A local repo_location is cloned through a file:// url when using
+    'depth' or 'filter_spec', since git ignores them for plain paths.
     """
+    clone_dir = target_dir
     target_dir = pipes.quote(target_dir)
     command = ['git', 'clone']
     if verbose:
         command.append('--verbose')
     if os.path.isdir(repo_location):
-        command.append('--no-hardlinks')
+        if depth or filter_spec:
+            repo_location = 'file://' + os.path.abspath(repo_location)
+        elif not hardlinks:
+            command.append('--no-hardlinks')
+    if depth:
+        command.extend(['--depth', str(depth)])
+    if single_branch:
+        command.append('--single-branch')
+    if filter_spec:
+        command.append('--filter=%s' % filter_spec)
+    if sparse:
+        command.append('--no-checkout')
     command.extend([pipes.quote(repo_location), target_dir])
     if branch_or_tag:
         command.extend(['--branch', branch_or_tag])
-    return execute_git_command(command)
+    output = execute_git_command(command)
+    if sparse:
+        git_sparse_checkout(clone_dir, sparse)
+        execute_git_command(['git', 'checkout'], repo_dir=clone_dir)
+    return output
+
+
+def git_sparse_checkout(repo_dir, patterns, cone=False):
+    """Only check out the files matching 'patterns' in the working tree.
+
+    'patterns' are .gitignore style patterns (ex. ['docs/', '*.md']), or
+    directories if 'cone' is True. Requires git 2.35 or newer.
+    """
+    if not isinstance(patterns, list):
+        patterns = [patterns]
+    command = ['git', 'sparse-checkout', 'set',
+               '--cone' if cone else '--no-cone']
+    command.extend(patterns)
+    return execute_git_command(command, repo_dir=repo_dir)
 
 
 def git_tag(repo_dir, tagname, message=None, force=True):
@@ -153,8 +579,17 @@ def git_tag(repo_dir, tagname, message=None, force=True):
 
 def git_list_config(repo_dir):
     """Return a list of the git configuration."""
-    command = ['git', 'config', '--list']
-    raw = execute_git_command(command, repo_dir=repo_dir).splitlines()
+    return _run_call(repo_dir, *_list_config_call())
+
+
+def _list_config_call():
+    """Return the command of :func:`git_list_config` and its parser."""
+    return ['git', 'config', '--list'], _parse_config
+
+
+def _parse_config(output):
+    """Parse `git config --list`."""
+    raw = output.splitlines()
     output = {key: val for key, val in
               [cfg.split('=', 1) for cfg in raw]}
     # TODO(sam): maybe turn this into more easily navigable
@@ -163,20 +598,40 @@ def git_list_config(repo_dir):
     return output
 
 
-def git_list_tags(repo_dir, with_messages=False):
-    """Return a list of git tags for the git repo in `repo_dir`."""
+def git_list_tags(repo_dir, with_messages=False, records=False):
+    """Return a list of git tags for the git repo in `repo_dir`.
+
+    If 'records' is True, returns a list of :class:`TagInfo`.
+    """
+    return _run_call(repo_dir, *_list_tags_call(with_messages, records))
+
+
+def _list_tags_call(with_messages, records):
+    """Return the command of :func:`git_list_tags` and its parser."""
     command = ['git', 'tag', '-l']
     if with_messages:
         command.append('-n1')
-    raw = execute_git_command(command, repo_dir=repo_dir).splitlines()
-    output = [l.strip() for l in raw if l.strip()]
+    return command, functools.partial(
+        _parse_tags, with_messages=with_messages, records=records)
+
+
+def _parse_tags(raw, with_messages=False, records=False):
+    """Parse `git tag -l`."""
+    output = [l.strip() for l in raw.splitlines() if l.strip()]
+    if records:
+        if not with_messages:
+            return [TagInfo(tag, None) for tag in output]
+        # <tag> <message> (no message if the tag has none)
+        breakout = [line.split(None, 1) for line in output]
+        return [TagInfo(vals[0], vals[1].strip() if len(vals) > 1 else None)
+                for vals in breakout]
     if with_messages:
         output = [tuple(j.strip() for j in line.split(None, 1))
                   for line in output]
     return output
 
 
-def git_list_branches(repo_dir):
+def git_list_branches(repo_dir, records=False):
     """Return a list of git branches for the git repo in 'repo_dir'.
 
     .. code-block:: python
@@ -187,10 +642,22 @@ def git_list_branches(repo_dir):
              'message': <commit message>},
             {...},
         ]
+
+    If 'records' is True, returns a list of :class:`BranchInfo`.
     """
+    return _run_call(repo_dir, *_list_branches_call(records))
+
+
+def _list_branches_call(records):
+    """Return the command of :func:`git_list_branches` and its parser."""
     command = ['git', 'branch', '--remotes', '--all',
                '--verbose', '--no-abbrev']
-    output = execute_git_command(command, repo_dir=repo_dir).splitlines()
+    return command, functools.partial(_parse_branches, records=records)
+
+
+def _parse_branches(raw, records=False):
+    """Parse `git branch --all --verbose`."""
+    output = raw.splitlines()
     # remove nullish lines
     lines = [l.strip() for l in output if l.strip()]
     # find the * current branch
@@ -206,7 +673,7 @@ def git_list_branches(repo_dir):
             branch, rest = current_branch.split(')', 1)
             branch = "%s)" % branch
             sha, msg = rest.split(None, 1)
-            item = {'branch': branch, 'commit': sha, 'message': msg}
+            item = BranchInfo(branch, sha, msg)
         else:
             lines.insert(0, current_branch)
     # <branch> <hash> <commit_message>
@@ -214,24 +681,64 @@ def git_list_branches(repo_dir):
     breakout = [k.split(None, 2) for k in lines]
     # remove any strange hashless outliers
     breakout = [k for k in breakout if len(k[1]) == 40]
-    headers = ['branch', 'commit', 'message']
-    # use izip_longest so we fill in None if message was empty
-    result = [dict(zip_longest(headers, vals))
-              for vals in breakout]
+    # fill in None if message was empty
+    result = [BranchInfo(*vals) if len(vals) == 3 else BranchInfo(
+        vals[0], vals[1], None) for vals in breakout]
     if item:
         result.append(item)
-    return result
+    if records:
+        return result
+    return [dict(branch._asdict()) for branch in result]
+
 
+def git_iter_branches(repo_dir):
+    """Yield a :class:`BranchInfo` for each branch, as git lists them.
 
-def git_list_remotes(repo_dir):
-    """Return a listing of configured remotes."""
+    The streaming version of :func:`git_list_branches` (same fields, but
+    in git's order). `message` is None if empty.
+    """
+    command = ['git', 'branch', '--remotes', '--all',
+               '--verbose', '--no-abbrev']
+    for line in iter_git_command(command, repo_dir=repo_dir):
+        line = line.strip()
+        if line.startswith('* '):
+            line = line[2:]
+            if re.match(r'\(.*detached.+\)', line):
+                branch, rest = line.split(')', 1)
+                sha, msg = (rest.split(None, 1) + [None])[:2]
+                yield BranchInfo("%s)" % branch, sha, msg)
+                continue
+        # <branch> <hash> <commit_message>
+        vals = line.split(None, 2)
+        # skip strange hashless outliers (ex. `origin/HEAD -> ...`)
+        if len(vals) > 1 and SHA_REGEX.match(vals[1]):
+            yield BranchInfo(vals[0], vals[1],
+                             vals[2] if len(vals) == 3 else None)
+
+
+def git_list_remotes(repo_dir, records=False):
+    """Return a listing of configured remotes.
+
+    If 'records' is True, returns a list of :class:`RemoteInfo`.
+    """
+    return _run_call(repo_dir, *_list_remotes_call(records))
+
+
+def _list_remotes_call(records):
+    """Return the command of :func:`git_list_remotes` and its parser."""
     command = ['git', 'remote', '--verbose', 'show']
-    raw = execute_git_command(command, repo_dir=repo_dir).splitlines()
-    output = [l.strip() for l in raw if l.strip()]
+    return command, functools.partial(_parse_remotes, records=records)
+
+
+def _parse_remotes(raw, records=False):
+    """Parse `git remote --verbose show`."""
+    output = [l.strip() for l in raw.splitlines() if l.strip()]
     # <name> <location> (<cmd>)
     # make a list of lists with clean elements of equal length
-    headers = ['name', 'location', 'cmd']
+    headers = RemoteInfo._fields
     breakout = [k.split(None, len(headers)) for k in output]
+    if records:
+        return [RemoteInfo(*(vals + [None, None])[:3]) for vals in breakout]
     # use izip_longest so we fill in None if message was empty
     return [dict(zip_longest(headers, vals))
             for vals in breakout]
@@ -252,13 +759,43 @@ def git_list_refs(repo_dir):
          <refN>: <commit_hashN>,
         }
     """
+    return _run_call(repo_dir, *_list_refs_call(repo_dir))
+
+
+def _list_refs_call(repo_dir):
+    """Return the command of :func:`git_list_refs` and its parser."""
+    refs = _fast(_list_refs, repo_dir)
+    if refs:
+        return None, lambda _: refs
     command = ['git', 'show-ref', '--dereference', '--head']
-    raw = execute_git_command(command, repo_dir=repo_dir).splitlines()
-    output = [l.strip() for l in raw if l.strip()]
+    return command, _parse_refs
+
+
+def _parse_refs(raw):
+    """Parse `git show-ref` or `git ls-remote` into {ref: commit_hash}."""
+    output = [l.strip() for l in raw.splitlines() if l.strip()
+              and not l.strip().lower().startswith('from ')]
     return {ref: commit_hash for commit_hash, ref in
             [l.split(None, 1) for l in output]}
 
 
+def _list_refs(refs):
+    """`git show-ref --dereference --head` from the files."""
+    listed = {}
+    head = refs.resolve(refs.head)
+    if head:
+        listed['HEAD'] = head
+    for name in refs.names():
+        sha = refs.resolve(('ref', name))
+        if sha is None:
+            raise _NeedsGit()  # git warns about broken refs
+        listed[name] = sha
+        peeled = refs.peel(name, sha)
+        if peeled:
+            listed[name + '^{}'] = peeled
+    return listed
+
+
 def git_ls_remote(repo_dir, remote='origin', refs=None):
     """Run git ls-remote.
 
@@ -275,17 +812,37 @@ def git_ls_remote(repo_dir, remote='origin', refs=None):
          <refN>: <commit_hashN>,
         }
     """
+    return _run_call(repo_dir, *_ls_remote_call(remote, refs))
+
+
+def _ls_remote_call(remote, refs):
+    """Return the command of :func:`git_ls_remote` and its parser."""
     command = ['git', 'ls-remote', pipes.quote(remote)]
     if refs:
         if isinstance(refs, list):
             command.extend(refs)
         else:
             command.append(refs)
-    raw = execute_git_command(command, repo_dir=repo_dir).splitlines()
-    output = [l.strip() for l in raw if l.strip()
-              and not l.strip().lower().startswith('from ')]
-    return {ref: commit_hash for commit_hash, ref in
-            [l.split(None, 1) for l in output]}
+    return command, _parse_refs
+
+
+def git_iter_ls_remote(repo_dir, remote='origin', refs=None):
+    """Yield (ref, commit_hash) for each ref git ls-remote lists.
+
+    The streaming version of :func:`git_ls_remote`;
+    `dict(git_iter_ls_remote(...))` is what that returns.
+    """
+    command = ['git', 'ls-remote', remote]
+    if refs:
+        if isinstance(refs, list):
+            command.extend(refs)
+        else:
+            command.append(refs)
+    for line in iter_git_command(command, repo_dir=repo_dir):
+        # <hash> TAB <ref>
+        commit_hash, _, ref = line.partition('\t')
+        if ref:
+            yield ref, commit_hash
 
 
 def git_branch(repo_dir, branch_name, start_point='HEAD',
@@ -316,10 +873,14 @@ def git_checkout(repo_dir, ref, branch=None):
     return execute_git_command(command, repo_dir=repo_dir)
 
 
-def git_fetch(repo_dir, remote=None, refspec=None, verbose=False, tags=True):
+def git_fetch(repo_dir, remote=None, refspec=None, verbose=False, tags=True,
+              depth=None, filter_spec=None):
     """Do a git fetch of `refspec` in `repo_dir`.
 
     If 'remote' is None, all remotes will be fetched.
+
+    'depth' and 'filter_spec' limit what is fetched like they do for
+    :func:`git_clone` ('depth' also deepens a shallow clone).
     """
     command = ['git', 'fetch']
     if not remote:
@@ -331,6 +892,10 @@ def git_fetch(repo_dir, remote=None, refspec=None, verbose=False, tags=True):
         command.append('--tags')
     if verbose:
         command.append('--verbose')
+    if depth:
+        command.extend(['--depth', str(depth)])
+    if filter_spec:
+        command.append('--filter=%s' % filter_spec)
     if remote:
         command.append(remote)
     if refspec:
@@ -366,18 +931,57 @@ def git_commit(repo_dir, message=None, amend=False, stage=True):
     return execute_git_command(command, repo_dir=repo_dir)
 
 
-def git_ls_tree(repo_dir, treeish='HEAD'):
-    """Run git ls-tree."""
+def git_ls_tree(repo_dir, treeish='HEAD', records=False):
+    """Run git ls-tree.
+
+    If 'records' is True, returns a list of :class:`TreeEntry`.
+    """
+    return _run_call(repo_dir, *_ls_tree_call(treeish, records))
+
+
+def _ls_tree_call(treeish, records):
+    """Return the command of :func:`git_ls_tree` and its parser."""
     command = ['git', 'ls-tree', '-r', '--full-tree', treeish]
-    raw = execute_git_command(command, repo_dir=repo_dir).splitlines()
-    output = [l.strip() for l in raw if l.strip()]
+    return command, functools.partial(_parse_ls_tree, records=records)
+
+
+def _parse_ls_tree(raw, records=False):
+    """Parse `git ls-tree`."""
+    output = [l.strip() for l in raw.splitlines() if l.strip()]
     # <mode> <type> <object> <file>
     # make a list of lists with clean elements of equal length
     breakout = [k.split(None, 3) for k in output]
-    headers = ['mode', 'type', 'object', 'file']
+    if records:
+        # modes and types repeat, share one string of each
+        return [TreeEntry(_shared(mode), _shared(kind), sha, path)
+                for mode, kind, sha, path in breakout]
+    headers = TreeEntry._fields
     return [dict(zip(headers, vals)) for vals in breakout]
 
 
+def _shared(text):
+    """Return one shared copy of a short, often repeated string.
+
+    Like intern(), which only takes byte strings on Python 2.
+    """
+    return _SHARED.setdefault(text, text)
+
+
+def git_iter_ls_tree(repo_dir, treeish='HEAD'):
+    """Yield a :class:`TreeEntry` for each entry of git ls-tree.
+
+    The streaming version of :func:`git_ls_tree`. File names are not
+    quoted, even if they contain unusual characters.
+    """
+    command = ['git', 'ls-tree', '-r', '-z', '--full-tree', treeish]
+    for record in iter_git_command(command, repo_dir=repo_dir,
+                                   separator=b'\0'):
+        # <mode> SP <type> SP <object> TAB <file>
+        info, _, path = record.partition('\t')
+        mode, kind, sha = info.split(' ', 2)
+        yield TreeEntry(_shared(mode), _shared(kind), sha, path)
+
+
 def git_add_all(repo_dir):
     """Stage all changes in the working tree."""
     command = ['git', 'add', '--all']
@@ -386,14 +990,37 @@ def git_add_all(repo_dir):
 
 def git_status(repo_dir):
     """Get the working tree status."""
-    command = ['git', 'status']
-    return execute_git_command(command, repo_dir=repo_dir)
+    return _run_call(repo_dir, ['git', 'status'], _raw)
 
 
 def git_head_commit(repo_dir):
     """Return the current commit hash head points to."""
-    command = ['git', 'rev-parse', 'HEAD']
-    return execute_git_command(command, repo_dir=repo_dir)
+    return _run_call(repo_dir, *_head_commit_call(repo_dir))
+
+
+def _head_commit_call(repo_dir):
+    """Return the command of :func:`git_head_commit` and its parser."""
+    head = _fast(lambda refs: refs.resolve(refs.head), repo_dir)
+    if head:
+        return None, lambda _: head
+    return ['git', 'rev-parse', 'HEAD'], _raw
+
+
+def _current_branch(refs):
+    """`git rev-parse --abbrev-ref HEAD` from the files."""
+    kind, value = refs.head
+    if kind == 'sha':
+        return 'HEAD'
+    if not value.startswith('refs/heads/') or refs.resolve(refs.head) is None:
+        raise _NeedsGit()
+    branch = value[len('refs/heads/'):]
+    names = refs.names()
+    # git abbreviates to heads/<branch> when <branch> alone is ambiguous
+    for other in ('refs/%s', 'refs/tags/%s', 'refs/remotes/%s',
+                  'refs/remotes/%s/HEAD'):
+        if other % branch in names:
+            raise _NeedsGit()
+    return branch
 
 
 def git_current_branch(repo_dir):
@@ -401,12 +1028,21 @@ def git_current_branch(repo_dir):
 
     If the repo is in 'detached HEAD' state, this just returns "HEAD".
     """
-    command = ['git', 'rev-parse', '--abbrev-ref', 'HEAD']
-    return execute_git_command(command, repo_dir=repo_dir)
+    return _run_call(repo_dir, *_current_branch_call(repo_dir))
+
+
+def _current_branch_call(repo_dir):
+    """Return the command of :func:`git_current_branch` and its parser."""
+    branch = _fast(_current_branch, repo_dir)
+    if branch:
+        return None, lambda _: branch
+    return ['git', 'rev-parse', '--abbrev-ref', 'HEAD'], _raw
 
 
 def is_git_repo(repo_dir):
     """Return True if the directory is inside a git repo."""
+    if _fast(lambda refs: True, repo_dir):
+        return True
     command = ['git', 'rev-parse']
     try:
         execute_git_command(command, repo_dir=repo_dir)
@@ -432,18 +1068,300 @@ def git_remote_resolve_reference(repo_dir, ref, remote='origin'):
 
     if ref == 'HEAD':
         return ls_refs['HEAD']
-    else:
-        matching_refs = [
-            'refs/tags/%s^{}' % ref,
-            'refs/heads/%s^{}' % ref,
-            '%s^{}' % ref,
-            'refs/tags/%s' % ref,
-            'refs/heads/%s' % ref,
-            ref,
-        ]
-        for _ref in matching_refs:
-            if _ref in ls_refs:
-                return ls_refs[_ref]
+    return _resolve_reference(ls_refs, ref)
+
+
+def _resolve_reference(ls_refs, ref):
+    """Find the revision of 'ref' in git ls-remote output (or None)."""
+    if ref == 'HEAD':
+        return ls_refs.get('HEAD')
+    matching_refs = [
+        'refs/tags/%s^{}' % ref,
+        'refs/heads/%s^{}' % ref,
+        '%s^{}' % ref,
+        'refs/tags/%s' % ref,
+        'refs/heads/%s' % ref,
+        ref,
+    ]
+    for _ref in matching_refs:
+        if _ref in ls_refs:
+            return ls_refs[_ref]
+
+
+def git_resolve_references(repo_dir, refs, remote='origin', ls_refs=None):
+    """Find the revisions of many refs at 'remote' with one git ls-remote.
+
+    Like :func:`git_remote_resolve_reference` for each of 'refs', but
+    the remote is only asked once (for all its refs).
+
+    'ls_refs' is the output of :func:`git_ls_remote` for 'remote' if
+    already known (then git is not run at all).
+
+    Returns {ref: revision}, with None for refs that were not found.
+    """
+    if ls_refs is None:
+        ls_refs = git_ls_remote(repo_dir, remote=remote)
+    return {ref: _resolve_reference(ls_refs, ref) for ref in refs}
+
+
+def _stop_process(process):
+    """Close the pipes of a process, kill it (if running) and reap it."""
+    for pipe in (process.stdin, process.stdout):
+        try:
+            pipe.close()
+        except (IOError, OSError):
+            pass
+    if process.poll() is None:
+        try:
+            process.kill()
+        except OSError:
+            pass
+    process.wait()
+
+
+class _AtExit(object):
+
+    """Python 2 stand-in for weakref.finalize: runs at exit only."""
+
+    def __init__(self, obj, func, *args):  # pylint: disable=W0613
+        """Call func(*args) at exit (unless detached)."""
+        self.func = func
+        self.args = args
+        atexit.register(self)
+
+    def __call__(self):
+        """Call func (once)."""
+        func, self.func = self.func, None
+        if func is not None:
+            func(*self.args)
+
+    def detach(self):
+        """Do not call func."""
+        self.func = None
+        self.args = ()
+
+
+_finalize = getattr(weakref, 'finalize', _AtExit)
+
+
+class CatFile(object):
+
+    """A long-running `git cat-file --batch` (or `--batch-check`) process.
+
+    Reading objects through one process avoids a fork and exec of git per
+    object. Requests are framed under a lock, so a CatFile can be shared
+    between threads. If the process dies it is restarted (and the request
+    retried once).
+
+    Objects are named like git does: a sha, a ref or `<treeish>:<path>`.
+
+    The process is stopped by `close()` (or leaving a `with` block), when
+    the CatFile is garbage collected, or at exit (on Python 2 only at exit).
+    """
+
+    def __init__(self, repo_dir, check=False):
+        """Set up (the process is started on first use).
+
+        :keyword check: run `--batch-check` (object info only) instead of
+            `--batch` (info and contents).
+        """
+        self.repo_dir = repo_dir
+        self.check = check
+        self.command = ['git', 'cat-file',
+                        '--batch-check' if check else '--batch']
+        self.lock = threading.Lock()
+        self.process = None
+        self._finalizer = None
+
+    def __enter__(self):
+        """Return self (see `close`)."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop the git process."""
+        self.close()
+
+    def _start(self):
+        """Start the git process."""
+        LOG.debug("Starting `%s` in %s", ' '.join(self.command),
+                  self.repo_dir)
+        with open(os.devnull, 'wb') as devnull:
+            try:
+                self.process = subprocess.Popen(
+                    self.command, cwd=self.repo_dir, stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE, stderr=devnull)
+            except OSError as err:
+                raise exceptions.SimplGitCommandError(
+                    127, self.command, output=repr(err), oserror=err)
+        self._finalizer = _finalize(self, _stop_process, self.process)
+
+    def _stop(self):
+        """Stop the git process (if running)."""
+        process, self.process = self.process, None
+        if process is None:
+            return
+        self._finalizer.detach()
+        _stop_process(process)
+
+    def close(self):
+        """Stop the git process. The next request starts a new one."""
+        with self.lock:
+            self._stop()
+
+    def _request(self, name):
+        """Send one object name and read the response."""
+        if self.process is None or self.process.poll() is not None:
+            self._stop()
+            self._start()
+        self.process.stdin.write(name + b'\n')
+        self.process.stdin.flush()
+        header = self.process.stdout.readline()
+        if not header.endswith(b'\n'):
+            raise IOError("git cat-file exited")
+        header = header.rstrip(b'\n')
+        # <name> may contain spaces, so check the last word
+        if header.endswith(b' missing') or header.endswith(b' ambiguous'):
+            return None, None
+        sha, kind, size = header.rsplit(b' ', 2)
+        info = {'object': sha.decode('ascii'),
+                'type': kind.decode('ascii'),
+                'size': int(size)}
+        if self.check:
+            return info, None
+        data = self.process.stdout.read(info['size'] + 1)
+        if len(data) != info['size'] + 1:
+            raise IOError("git cat-file exited")
+        return info, data[:-1]
+
+    def get(self, name):
+        """Return (info, contents) of the object called `name`.
+
+        `info` is a dict with the 'object' (sha), 'type' and 'size' of the
+        object and `contents` its bytes (None with `check`).
+
+        Raises SimplGitCommandError if there is no such object.
+        """
+        if not isinstance(name, bytes):
+            name = name.encode('utf-8')
+        if b'\n' in name:
+            raise ValueError("Object names cannot contain newlines")
+        with self.lock:
+            try:
+                info, data = self._request(name)
+            except (IOError, OSError, ValueError):
+                LOG.debug("`%s` failed in %s, restarting it",
+                          ' '.join(self.command), self.repo_dir)
+                self._stop()
+                try:
+                    info, data = self._request(name)
+                except (IOError, OSError, ValueError) as err:
+                    self._stop()
+                    raise exceptions.SimplGitCommandError(
+                        128, self.command, output=repr(err))
+        if info is None:
+            raise exceptions.SimplGitCommandError(
+                128, self.command,
+                output="Not a valid object name %s" % name.decode('utf-8'))
+        return info, data
+
+
+class MirrorCache(object):
+
+    """A directory of bare mirrors of repos, to clone from locally.
+
+    Cloning from a mirror hardlinks its objects instead of downloading
+    them. A mirror is fetched again when it is older than `max_age`
+    seconds (or does not have the requested branch or tag). Clones get
+    the original location as their 'origin' remote.
+
+    Mirrors are named after their location, so one cache directory can
+    be shared by processes (updates are serialized with a lock file).
+    """
+
+    def __init__(self, directory, max_age=300):
+        """Use (and create if needed) `directory` for the mirrors.
+
+        :keyword max_age: seconds after which a mirror is fetched again.
+        """
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_age = max_age
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def path(self, repo_location):
+        """Return the mirror directory for `repo_location`."""
+        name = repo_location.rstrip('/').rsplit('/', 1)[-1]
+        if name.endswith('.git'):
+            name = name[:-4]
+        name = re.sub(r'[^\w.-]', '_', name) or 'repo'
+        digest = hashlib.sha1(repo_location.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory,
+                            '%s-%s.git' % (name, digest[:16]))
+
+    def _lock(self, path):
+        """Return a lock for `path` shared by this process' threads."""
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def update(self, repo_location, force=False):
+        """Create or refresh the mirror of `repo_location` (if stale).
+
+        Returns the mirror directory.
+        """
+        path = self.path(repo_location)
+        stamp = os.path.join(path, 'simpl-fetched')
+        with self._lock(path), open(path + '.lock', 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.isdir(path):
+                    LOG.debug("Mirroring %s to %s", repo_location, path)
+                    partial = path + '.new'
+                    if os.path.isdir(partial):
+                        shutil.rmtree(partial)
+                    execute_git_command(['git', 'clone', '--mirror',
+                                         repo_location, partial])
+                    # let clones use filter_spec
+                    execute_git_command(['git', 'config',
+                                         'uploadpack.allowFilter', 'true'],
+                                        repo_dir=partial)
+                    os.rename(partial, path)
+                elif force or not os.path.exists(stamp) or (
+                        time.time() - os.path.getmtime(stamp) >=
+                        self.max_age):
+                    LOG.debug("Fetching %s into %s", repo_location, path)
+                    execute_git_command(['git', 'fetch', '--prune',
+                                         'origin'], repo_dir=path)
+                else:
+                    return path
+                with open(stamp, 'w'):
+                    pass
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return path
+
+    def clone(self, repo_location, target_dir, branch_or_tag=None,
+              **options):
+        """Clone `repo_location` into `target_dir` through its mirror.
+
+        `options` are passed to :func:`git_clone` (ex. depth).
+        """
+        mirror = self.update(repo_location)
+        try:
+            git_clone(target_dir, mirror, branch_or_tag=branch_or_tag,
+                      hardlinks=True, **options)
+        except exceptions.SimplGitCommandError:
+            if not branch_or_tag:
+                raise
+            # maybe newer than the mirror (git cleans up failed clones)
+            mirror = self.update(repo_location, force=True)
+            git_clone(target_dir, mirror, branch_or_tag=branch_or_tag,
+                      hardlinks=True, **options)
+        execute_git_command(['git', 'remote', 'set-url', 'origin',
+                             repo_location], repo_dir=target_dir)
 
 
 class GitRepo(object):
@@ -462,7 +1380,7 @@ class GitRepo(object):
     a git repository will raise a SimplGitNotRepo exception.
     """
 
-    def __init__(self, repo_dir=None):
+    def __init__(self, repo_dir=None, cache=False):
         """Initialize wrapper and check for existence of dir.
 
         The init() and clone() classmethods are common ways of
@@ -471,6 +1389,12 @@ class GitRepo(object):
         Defaults to current working directory if repo_dir is not supplied.
 
         If the repo_dir is not a git repository, SimplGitNotRepo is raised.
+
+        If 'cache' is True, the results of list_refs, list_branches,
+        list_tags, list_config and list_remotes (and so origin) are kept
+        until .git/HEAD, .git/refs, .git/packed-refs or .git/config change
+        or this GitRepo changes the repo (commit, tag, branch, fetch,
+        checkout, pull, run_command). See invalidate_cache().
         """
         repo_dir = repo_dir or os.getcwd()
         repo_dir = os.path.abspath(
@@ -485,10 +1409,22 @@ class GitRepo(object):
         if os.path.realpath(self.repo_dir).startswith(
                 os.path.realpath(tempfile.gettempdir())):
             self.temp = True
+        # started on first use, see read_blob() and object_info()
+        self._cat_file = CatFile(repo_dir)
+        self._cat_file_check = CatFile(repo_dir, check=True)
+        #: {(method, args): (stamp, result)}, None when not caching
+        self._cache = {} if cache else None
+        self._cache_lock = threading.Lock()
+        #: directories under .git/refs, see _cache_stamp()
+        self._ref_dirs = None
+        #: {remote: (time, git ls-remote output)} for resolve_references()
+        self._advertised = {}
 
     @classmethod
     def clone(cls, repo_location, repo_dir=None,
-              branch_or_tag=None, temp=False):
+              branch_or_tag=None, temp=False, cache=False,
+              mirror_cache=None, depth=None, single_branch=False,
+              filter_spec=None, sparse=None):
         """Clone repo at repo_location into repo_dir and checkout branch_or_tag.
 
         Defaults into current working directory if repo_dir is not supplied.
@@ -501,6 +1437,12 @@ class GitRepo(object):
 
         If branch_or_tag is not specified, the HEAD of the primary
         branch of the cloned repo is checked out.
+
+        If 'mirror_cache' (a :class:`MirrorCache` or a directory for one)
+        is given, the repo is cloned from a local mirror of it.
+
+        'depth', 'single_branch', 'filter_spec' and 'sparse' make shallow,
+        partial and sparse clones, see :func:`git_clone`.
         """
         if temp:
             reponame = repo_location.rsplit('/', 1)[-1]
@@ -509,12 +1451,22 @@ class GitRepo(object):
             repo_dir = create_tempdir(suffix=suffix, delete=True)
         else:
             repo_dir = repo_dir or os.getcwd()
-        git_clone(repo_dir, repo_location, branch_or_tag=branch_or_tag)
+        options = dict(depth=depth, single_branch=single_branch,
+                       filter_spec=filter_spec, sparse=sparse)
+        if mirror_cache is None:
+            git_clone(repo_dir, repo_location, branch_or_tag=branch_or_tag,
+                      **options)
+        else:
+            if not isinstance(mirror_cache, MirrorCache):
+                mirror_cache = MirrorCache(mirror_cache)
+            mirror_cache.clone(repo_location, repo_dir,
+                               branch_or_tag=branch_or_tag, **options)
         # assuming no errors
-        return cls(repo_dir)
+        return cls(repo_dir, cache=cache)
 
     @classmethod
-    def init(cls, repo_dir=None, temp=False, initial_commit=False):
+    def init(cls, repo_dir=None, temp=False, initial_commit=False,
+             cache=False):
         """Run `git init` in the repo_dir.
 
         Defaults to current working directory if repo_dir is not supplied.
@@ -531,7 +1483,7 @@ class GitRepo(object):
         else:
             repo_dir = repo_dir or os.getcwd()
         git_init(repo_dir)
-        instance = cls(repo_dir)
+        instance = cls(repo_dir, cache=cache)
 
         # NOTE(larsbutler): If we wanted to be defensive about this and favor
         # compatibility over elegance, we could just automatically add a
@@ -582,6 +1534,15 @@ class GitRepo(object):
         """
         return git_current_branch(self.repo_dir)
 
+    @property
+    def aio(self):
+        """Coroutine versions of the read methods (Python 3.5+).
+
+        Ex. `await repo.aio.list_refs()`. See :mod:`simpl.aiogit`.
+        """
+        from simpl import aiogit
+        return aiogit.AsyncGitRepo(self)
+
     def __repr__(self):
         """Customize representation."""
         rpr = '<Simpl GitRepo'
@@ -591,9 +1552,118 @@ class GitRepo(object):
                 % (rpr, self.repo_dir,
                    hex(id(self))))
 
+    def _cache_stamp(self, walk=False):
+        """Return the stats of the files the cached results read.
+
+        That is HEAD, packed-refs, config and the directories under refs
+        (git updates a loose ref by renaming a file into its directory).
+        Unless `walk` is true, only the directories found by the last walk
+        are checked: a new one shows up as a change of its parent.
+
+        None if they cannot be watched (the repo is not a plain work tree
+        with a .git directory), which disables the cache.
+        """
+        try:
+            git_dir = _git_dir(self.repo_dir)
+        except _NeedsGit:
+            return None
+        ref_dirs = self._ref_dirs
+        if walk or ref_dirs is None:
+            ref_dirs = self._ref_dirs = [
+                dirpath for dirpath, _, _ in
+                os.walk(os.path.join(git_dir, 'refs'))]
+        paths = [os.path.join(git_dir, name)
+                 for name in ('HEAD', 'packed-refs', 'config')]
+        return tuple((path, _stat_stamp(path)) for path in paths + ref_dirs)
+
+    def _cached(self, key, func, *args, **kwargs):
+        """Return func(*args, **kwargs), from the cache if still valid.
+
+        Results read right after their files changed are not kept (see
+        CACHE_RACY_SECONDS).
+        """
+        if self._cache is None:
+            return func(*args, **kwargs)
+        with self._cache_lock:
+            hit = self._cache.get(key)
+        if hit is not None and hit[0] == self._cache_stamp():
+            return _copy_listing(hit[1])
+        since = time.time()
+        stamp = self._cache_stamp(walk=True)
+        result = func(*args, **kwargs)
+        if stamp is None or _racy(stamp, since):
+            return result
+        with self._cache_lock:
+            self._cache[key] = (stamp, result)
+        return _copy_listing(result)
+
+    def invalidate_cache(self):
+        """Forget cached results (ex. after changing the repo directly)."""
+        if self._cache is not None:
+            with self._cache_lock:
+                self._cache.clear()
+
     def run_command(self, command):
         """Execute a command inside the repo."""
-        return execute_git_command(command, repo_dir=self.repo_dir)
+        try:
+            return execute_git_command(command, repo_dir=self.repo_dir)
+        finally:
+            self.invalidate_cache()
+
+    @staticmethod
+    def _object_name(sha_or_path, treeish):
+        """Name a blob by sha, or by path in `treeish`."""
+        if SHA_REGEX.match(sha_or_path):
+            return sha_or_path
+        return '%s:%s' % (treeish, sha_or_path.lstrip('/'))
+
+    def read_blob(self, sha_or_path, treeish='HEAD'):
+        """Return the contents (bytes) of a file.
+
+        The file is identified by its blob sha or by its path in 'treeish'.
+        All reads go through one `git cat-file --batch` process.
+        """
+        info, data = self._cat_file.get(
+            self._object_name(sha_or_path, treeish))
+        if info['type'] != 'blob':
+            raise exceptions.SimplGitCommandError(
+                128, self._cat_file.command,
+                output="%s is a %s, not a blob" % (sha_or_path,
+                                                   info['type']))
+        return data
+
+    def object_info(self, sha_or_path, treeish='HEAD'):
+        """Return the sha, type and size of an object without reading it.
+
+        The object is identified by its sha or by its path in 'treeish'.
+        Returns::
+
+            {'object': <object hash>,
+             'type': <git object type>, # blob, tree, commit or tag
+             'size': <size in bytes>}
+        """
+        return self._cat_file_check.get(
+            self._object_name(sha_or_path, treeish))[0]
+
+    def close(self):
+        """Stop the git processes started by read_blob and object_info.
+
+        They are also stopped when the GitRepo is garbage collected or on
+        leaving a `with` block::
+
+            with GitRepo(path) as repo:
+                data = repo.read_blob('setup.py')
+        """
+        self._cat_file.close()
+        self._cat_file_check.close()
+
+    def __enter__(self):
+        """Return self (see `close`)."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop the git processes started by read_blob and object_info."""
+        self.close()
 
     def status(self):
         """Get the working tree status."""
@@ -601,7 +1671,11 @@ class GitRepo(object):
 
     def tag(self, tagname, message=None, force=True):
         """Create an annotated tag."""
-        return git_tag(self.repo_dir, tagname, message=message, force=force)
+        try:
+            return git_tag(self.repo_dir, tagname, message=message,
+                           force=force)
+        finally:
+            self.invalidate_cache()
 
     # pylint: disable=invalid-name
     def ls(self):
@@ -612,11 +1686,15 @@ class GitRepo(object):
         tree = self.ls_tree()
         return [t.get('file') for t in tree if t.get('file')]
 
-    def list_remotes(self):
-        """List configured remotes."""
-        return git_list_remotes(self.repo_dir)
+    def list_remotes(self, records=False):
+        """List configured remotes.
 
-    def ls_tree(self, treeish='HEAD'):
+        If 'records' is True, returns a list of :class:`RemoteInfo`.
+        """
+        return self._cached(('remotes', records), git_list_remotes,
+                            self.repo_dir, records=records)
+
+    def ls_tree(self, treeish='HEAD', records=False):
         """List *all* files/dirs in the repo at ref 'treeish'.
 
         Returns::
@@ -628,8 +1706,18 @@ class GitRepo(object):
                  'file': <path/to/file.py>},
                 {...},
             ]
+
+        If 'records' is True, returns a list of :class:`TreeEntry`, which
+        take a fraction of the memory of the dicts.
         """
-        return git_ls_tree(self.repo_dir, treeish=treeish)
+        return git_ls_tree(self.repo_dir, treeish=treeish, records=records)
+
+    def iter_ls_tree(self, treeish='HEAD'):
+        """Yield a :class:`TreeEntry` for *all* files/dirs at 'treeish'.
+
+        Like :meth:`ls_tree`, but entries are read from git as they come.
+        """
+        return git_iter_ls_tree(self.repo_dir, treeish=treeish)
 
     def list_refs(self):
         """List references available in the local repo with commit ids.
@@ -645,7 +1733,7 @@ class GitRepo(object):
              <refN>: <commit_hashN>,
             }
         """
-        return git_list_refs(self.repo_dir)
+        return self._cached(('refs',), git_list_refs, self.repo_dir)
 
     def ls_remote(self, remote='origin', refs=None):
         """Return a mapping of refs to commit ids for the given remote.
@@ -666,22 +1754,33 @@ class GitRepo(object):
         return git_ls_remote(
             self.repo_dir, remote=remote, refs=refs)
 
-    def list_tags(self, with_messages=False):
+    def iter_ls_remote(self, remote='origin', refs=None):
+        """Yield (ref, commit_hash) for the refs of the given remote.
+
+        Like :meth:`ls_remote`, but refs are read from git as they come.
+        """
+        return git_iter_ls_remote(self.repo_dir, remote=remote, refs=refs)
+
+    def list_tags(self, with_messages=False, records=False):
         """Return a list of git tags for the repository.
 
         If 'with_messages' is True, returns
         a list of (tag, message) tuples::
 
             [(<tag1>, <message1>), (<tag2>, <message2>)]
+
+        If 'records' is True, returns a list of :class:`TagInfo` (with a
+        message of None unless 'with_messages' is True).
         """
-        return git_list_tags(
-            self.repo_dir, with_messages=with_messages)
+        return self._cached(('tags', with_messages, records), git_list_tags,
+                            self.repo_dir, with_messages=with_messages,
+                            records=records)
 
     def list_config(self):
         """Return a dictionary of the git config."""
-        return git_list_config(self.repo_dir)
+        return self._cached(('config',), git_list_config, self.repo_dir)
 
-    def list_branches(self):
+    def list_branches(self, records=False):
         """Return a list of dicts, describing the branches.
 
         Returns::
@@ -692,8 +1791,19 @@ class GitRepo(object):
                  'message': <commit message>},
                 {...},
             ]
+
+        If 'records' is True, returns a list of :class:`BranchInfo`.
+        """
+        return self._cached(('branches', records), git_list_branches,
+                            self.repo_dir, records=records)
+
+    def iter_branches(self):
+        """Yield a :class:`BranchInfo` for each branch.
+
+        Like :meth:`list_branches`, but branches are read from git as they
+        come (and never cached).
         """
-        return git_list_branches(self.repo_dir)
+        return git_iter_branches(self.repo_dir)
 
     def branch(self, branch_name, start_point='HEAD', force=True,
                checkout=False):
@@ -701,22 +1811,43 @@ class GitRepo(object):
 
         If 'checkout' is True, checkout the branch after creation.
         """
-        return git_branch(
-            self.repo_dir, branch_name, start_point, force=force,
-            checkout=checkout)
+        try:
+            return git_branch(
+                self.repo_dir, branch_name, start_point, force=force,
+                checkout=checkout)
+        finally:
+            self.invalidate_cache()
 
     def checkout(self, ref, branch=None):
         """Do a git checkout of `ref`."""
-        return git_checkout(self.repo_dir, ref, branch=branch)
+        try:
+            return git_checkout(self.repo_dir, ref, branch=branch)
+        finally:
+            self.invalidate_cache()
 
-    def fetch(self, remote=None, refspec=None, verbose=False, tags=True):
+    def fetch(self, remote=None, refspec=None, verbose=False, tags=True,
+              depth=None, filter_spec=None):
         """Do a git fetch of `refspec`."""
-        return git_fetch(self.repo_dir, remote=remote,
-                         refspec=refspec, verbose=verbose, tags=tags)
+        try:
+            return git_fetch(self.repo_dir, remote=remote,
+                             refspec=refspec, verbose=verbose, tags=tags,
+                             depth=depth, filter_spec=filter_spec)
+        finally:
+            self.invalidate_cache()
+
+    def sparse_checkout(self, patterns, cone=False):
+        """Only check out the files matching 'patterns'.
+
+        See :func:`git_sparse_checkout`.
+        """
+        return git_sparse_checkout(self.repo_dir, patterns, cone=cone)
 
     def pull(self, remote="origin", ref=None):
         """Do a git pull of `ref` from `remote`."""
-        return git_pull(self.repo_dir, remote=remote, ref=ref)
+        try:
+            return git_pull(self.repo_dir, remote=remote, ref=ref)
+        finally:
+            self.invalidate_cache()
 
     def add_all(self):
         """Stage all changes in the working tree."""
@@ -724,13 +1855,145 @@ class GitRepo(object):
 
     def commit(self, message=None, amend=False, stage=True):
         """Commit any changes, optionally staging all changes beforehand."""
-        return git_commit(self.repo_dir, message=message,
-                          amend=amend, stage=stage)
+        try:
+            return git_commit(self.repo_dir, message=message,
+                              amend=amend, stage=stage)
+        finally:
+            self.invalidate_cache()
 
     def remote_resolve_reference(self, ref, remote='origin'):
         """Resolve a reference to a remote revision."""
         return git_remote_resolve_reference(self.repo_dir, ref, remote=remote)
 
+    def resolve_references(self, refs, remote='origin', ttl=0):
+        """Resolve many references to remote revisions at once.
+
+        Runs one `git ls-remote`, or none if 'remote' was listed by this
+        method less than 'ttl' seconds ago.
+
+        Returns {ref: revision}, with None for refs that were not found.
+        See :func:`git_resolve_references`.
+        """
+        now = _clock()
+        with self._cache_lock:
+            listed = self._advertised.get(remote)
+        if listed is None or now - listed[0] >= ttl:
+            listed = (now, git_ls_remote(self.repo_dir, remote=remote))
+            with self._cache_lock:
+                self._advertised[remote] = listed
+        return git_resolve_references(self.repo_dir, refs, remote=remote,
+                                      ls_refs=listed[1])
+
+
+class ParallelResult(collections.namedtuple(
+        'ParallelResult', 'repo result error seconds')):
+
+    """The outcome of one repo's operation in :func:`run_parallel`.
+
+    `result` is what the operation returned, `error` the exception it
+    raised (or None) and `seconds` how long it took.
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        """True if the operation succeeded."""
+        return self.error is None
+
+    @property
+    def timed_out(self):
+        """True if the operation was stopped by its timeout."""
+        return isinstance(self.error, exceptions.SimplGitTimeout)
+
+
+#: The GitRepo methods run_parallel() runs by name
+PARALLEL_OPERATIONS = ('fetch', 'ls_remote', 'remote_resolve_reference',
+                       'resolve_references', 'clone')
+
+
+def _clone(spec, **kwargs):
+    """Clone a location (into a tempdir) or with the arguments given."""
+    if isinstance(spec, dict):
+        return GitRepo.clone(**dict(kwargs, **spec))
+    return GitRepo.clone(spec, temp=True, **kwargs)
+
+
+def _call(name, repo, **kwargs):
+    """Call the GitRepo method called `name`."""
+    return getattr(repo, name)(**kwargs)
+
+
+def _run_one(operation, repo, timeout):
+    """Run `operation(repo)` with a deadline and capture the outcome."""
+    start = _clock()
+    _DEADLINE.value = None if timeout is None else start + timeout
+    try:
+        result = operation(repo)
+    except Exception as exc:  # pylint: disable=W0703
+        LOG.debug("%r failed: %r", repo, exc)
+        return ParallelResult(repo, None, exc, _clock() - start)
+    finally:
+        _DEADLINE.value = None
+    return ParallelResult(repo, result, None, _clock() - start)
+
+
+def run_parallel(repos, operation, workers=8, timeout=None, **kwargs):
+    """Run an operation on many repos concurrently.
+
+    'operation' is the name of a GitRepo method (one of
+    PARALLEL_OPERATIONS) called with 'kwargs', or a function taking a
+    repo. For 'clone', 'repos' are repo locations (cloned into temporary
+    directories) or dicts of :meth:`GitRepo.clone` arguments, and results
+    are the new GitRepos.
+
+    At most 'workers' operations run at a time, each in a thread (the work
+    is done by git processes). The git commands of an operation are killed
+    if they run past 'timeout' seconds after it started.
+
+    Returns a :class:`ParallelResult` per repo, in the order of 'repos'.
+    Errors are returned, not raised. For example, to fetch many repos and
+    find the ones that failed:
+
+    .. code-block:: python
+
+        results = run_parallel(repos, 'fetch', timeout=60, tags=True)
+        failed = [result.repo for result in results if not result.ok]
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1, not %r" % workers)
+    if operation == 'clone':
+        operation = functools.partial(_clone, **kwargs)
+    elif operation in PARALLEL_OPERATIONS:
+        operation = functools.partial(_call, operation, **kwargs)
+    elif not callable(operation):
+        raise ValueError("Unknown operation %r, expected one of %s or a "
+                         "function" % (operation,
+                                       ', '.join(PARALLEL_OPERATIONS)))
+    repos = list(repos)
+    results = [None] * len(repos)
+    pending = queue.Queue()
+    for index, repo in enumerate(repos):
+        pending.put((index, repo))
+
+    def work():
+        """Run operations until there are none left."""
+        while True:
+            try:
+                index, repo = pending.get_nowait()
+            except queue.Empty:
+                return
+            results[index] = _run_one(operation, repo, timeout)
+
+    threads = [threading.Thread(target=work, name='simpl-git-%d' % number)
+               for number in range(min(workers, len(repos)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
 
 def _cleanup_tempdir(tempdir):
     """Clean up temp directory ignoring ENOENT errors."""
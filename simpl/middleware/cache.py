@@ -0,0 +1,324 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Response Cache WSGI Middleware.
+
+Caches complete responses (status, headers and body) to GET requests in an
+in-process LRU cache. Entries expire after `ttl` seconds and the cache is
+bounded by both a number of entries and a total byte budget.
+
+Responses are keyed on:
+- the normalized path (duplicate and trailing slashes removed)
+- the query params, sorted (so ?a=1&b=2 and ?b=2&a=1 share an entry)
+- the request values of the headers listed in `vary`
+- the request values of the headers listed in the response's `Vary`
+
+Only `200 OK` responses without `Set-Cookie`, `Cache-Control: no-store`,
+`Cache-Control: private` or `Vary: *` are cached.
+
+Requests with `Authorization` or `Cookie` headers may render a response for
+one user only, so they are only served from (and stored in) the cache when
+the response is marked `Cache-Control: public`.
+
+Per-request headers (ex. `X-Transaction-Id`) are never stored. Place this
+middleware *inside* the ContextMiddleware so that every response, including
+cache hits, gets a fresh transaction id.
+
+Example usage:
+
+    import bottle
+    from simpl.middleware import cache
+    from simpl.middleware import context
+
+    app = bottle.default_app()
+    cached = cache.ResponseCacheMiddleware(app, ttl=30)
+    chain = context.ContextMiddleware(cached)
+    bottle.run(app=chain)
+
+    # after a write, drop any cached pages of the collection
+    cached.purge('/widgets')
+"""
+
+import collections
+import logging
+import re
+import threading
+import time
+
+from six.moves.urllib import parse
+
+LOG = logging.getLogger(__name__)
+
+
+class ResponseCacheMiddleware(object):
+
+    """Caches responses to GET requests in an LRU cache with a TTL."""
+
+    default_vary = ('Accept', 'Accept-Encoding')
+    #: request headers that identify a user (responses to these requests
+    #: are shared only if marked public)
+    credential_headers = ('HTTP_AUTHORIZATION', 'HTTP_COOKIE')
+    #: headers that belong to a single request and are never replayed
+    per_request_headers = ('x-transaction-id', 'date')
+
+    def __init__(self, app, ttl=60, max_entries=1024,
+                 max_bytes=64 * 1024 * 1024, max_entry_bytes=None,
+                 vary=default_vary):
+        """Configure cache bounds and keying.
+
+        :keyword ttl: seconds an entry stays fresh.
+        :keyword max_entries: maximum number of cached responses.
+        :keyword max_bytes: budget for the sum of all cached bodies and
+            headers. Least recently used entries are evicted to stay within
+            it.
+        :keyword max_entry_bytes: responses larger than this are not cached
+            (default is a tenth of `max_bytes`).
+        :keyword vary: iterable of request header names to include in the
+            cache key.
+        """
+        self.app = app
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        if max_entry_bytes is None:
+            max_entry_bytes = max_bytes // 10
+        self.max_entry_bytes = max_entry_bytes
+        # Precalculate the environ keys since they won't change per request
+        self.vary = tuple(
+            'HTTP_%s' % h.upper().replace('-', '_') for h in vary)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        # cache_key -> [environ keys of the response's Vary, entry count]
+        self._varies = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_path(path):
+        """Collapse duplicate slashes and drop any trailing slash."""
+        path = re.sub('/{2,}', '/', path or '/')
+        if len(path) > 1:
+            path = path.rstrip('/')
+        return path
+
+    def cache_key(self, environ):
+        """Return the cache key for a request."""
+        query = parse.parse_qsl(environ.get('QUERY_STRING', ''),
+                                keep_blank_values=True)
+        return (self.normalize_path(environ.get('PATH_INFO')),
+                tuple(sorted(query)),
+                tuple(environ.get(h) for h in self.vary))
+
+    @staticmethod
+    def _variant_key(key, vary, environ):
+        """Add the request values of a response's `Vary` headers to key."""
+        return key + (tuple(environ.get(h) for h in vary),)
+
+    def get(self, key):
+        """Return a fresh entry for key (and mark it as recently used)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.time():
+                self._remove(key)
+                return None
+            del self._entries[key]
+            self._entries[key] = entry
+            return entry
+
+    def put(self, key, entry):
+        """Store an entry and evict least recently used ones over budget."""
+        with self._lock:
+            varied = self._varies.get(key[:-1])
+            if varied is not None and varied[0] != entry.vary:
+                # the response now varies on other headers: drop old ones
+                for old in [k for k in self._entries if k[:-1] == key[:-1]]:
+                    self._remove(old)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.size += entry.size
+            self._varies.setdefault(key[:-1], [entry.vary, 0])[1] += 1
+            while self._entries and (self.size > self.max_bytes or
+                                     len(self._entries) > self.max_entries):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        """Remove an entry. Caller must hold the lock."""
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+        varied = self._varies[key[:-1]]
+        varied[1] -= 1
+        if not varied[1]:
+            del self._varies[key[:-1]]
+
+    def purge(self, path=None, prefix=False):
+        """Remove cached responses.
+
+        :param path: only remove entries for this path (all query params and
+            vary values). If not supplied, the whole cache is cleared.
+        :keyword prefix: remove all entries whose path starts with `path`.
+        :returns: the number of entries removed.
+        """
+        with self._lock:
+            if path is None:
+                keys = list(self._entries)
+            else:
+                path = self.normalize_path(path)
+                if prefix:
+                    keys = [k for k in self._entries
+                            if k[0].startswith(path)]
+                else:
+                    keys = [k for k in self._entries if k[0] == path]
+            for key in keys:
+                self._remove(key)
+        LOG.debug("Purged %s cached response(s) for %s", len(keys),
+                  path or 'all paths')
+        return len(keys)
+
+    def __len__(self):
+        """Return the number of cached responses."""
+        return len(self._entries)
+
+    @staticmethod
+    def _no_cache(environ):
+        """Check if the client asked us not to serve from cache."""
+        control = environ.get('HTTP_CACHE_CONTROL', '').lower()
+        return 'no-cache' in control or 'no-store' in control
+
+    def _has_credentials(self, environ):
+        """Check if the request identifies a user."""
+        return any(environ.get(h) for h in self.credential_headers)
+
+    @staticmethod
+    def _cache_policy(status, headers):
+        """Check if the response can be stored.
+
+        :returns: None if it can't, else (public, vary) where `public` is
+            True if it may be shared between users and `vary` the environ
+            keys of the headers listed in its `Vary`.
+        """
+        if not status.startswith('200'):
+            return None
+        public = False
+        vary = set()
+        for name, value in headers:
+            name = name.lower()
+            if name == 'set-cookie':
+                return None
+            if name == 'cache-control':
+                value = value.lower()
+                if 'no-store' in value or 'private' in value:
+                    return None
+                public = public or 'public' in value
+            if name == 'vary':
+                for header in value.split(','):
+                    header = header.strip()
+                    if header == '*':
+                        return None
+                    if header:
+                        vary.add(
+                            'HTTP_%s' % header.upper().replace('-', '_'))
+        return public, tuple(sorted(vary))
+
+    def __call__(self, environ, start_response):
+        """Serve from cache or call the app and cache the response."""
+        if environ.get('REQUEST_METHOD') != 'GET':
+            return self.app(environ, start_response)
+
+        key = self.cache_key(environ)
+        credentials = self._has_credentials(environ)
+        if not self._no_cache(environ):
+            varied = self._varies.get(key)
+            entry = varied and self.get(
+                self._variant_key(key, varied[0], environ))
+            if entry and (entry.public or not credentials):
+                self.hits += 1
+                # downstream middleware append to headers, so pass a copy
+                start_response(entry.status, list(entry.headers))
+                return [entry.body]
+        self.misses += 1
+
+        captured = {}
+
+        def callback(status, headers, exc_info=None):
+            """Snapshot the response before upstream headers are added."""
+            policy = None
+            if exc_info is None:
+                policy = self._cache_policy(status, headers)
+            if policy and (policy[0] or not credentials):
+                captured['key'] = self._variant_key(key, policy[1], environ)
+                captured['public'], captured['vary'] = policy
+                captured['status'] = status
+                captured['headers'] = tuple(
+                    (k, v) for k, v in headers
+                    if k.lower() not in self.per_request_headers)
+            else:
+                captured.clear()
+            write = start_response(status, headers, exc_info)
+
+            def _write(data):
+                """Legacy write() callable: pass through, don't cache."""
+                captured.clear()
+                return write(data)
+            return _write
+
+        result = self.app(environ, callback)
+        return self._store_iter(result, captured)
+
+    def _store_iter(self, result, captured):
+        """Stream the response while keeping a copy to cache."""
+        chunks = []
+        length = 0
+        try:
+            for chunk in result:
+                if captured:
+                    length += len(chunk)
+                    if length > self.max_entry_bytes:
+                        captured.clear()
+                        chunks = []
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        if captured:
+            self.put(captured['key'], CacheEntry(
+                captured['status'], captured['headers'], b''.join(chunks),
+                self.ttl, public=captured['public'], vary=captured['vary']))
+
+
+class CacheEntry(object):  # pylint: disable=R0903
+
+    """A cached response."""
+
+    __slots__ = ('status', 'headers', 'body', 'expires', 'size', 'public',
+                 'vary')
+
+    def __init__(self, status, headers, body, ttl, public=False, vary=()):
+        """Store response and calculate its expiry and approximate size.
+
+        :keyword public: the response may be served to any user.
+        :keyword vary: environ keys of the headers in the response's `Vary`.
+        """
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.public = public
+        self.vary = vary
+        self.expires = time.time() + ttl
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers)
@@ -0,0 +1,270 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compression WSGI Middleware.
+
+Compresses response bodies with gzip (or brotli, if the `brotli` package is
+installed and the client prefers it) when the client sends a matching
+`Accept-Encoding` header and the body is at least `min_size` bytes.
+
+Bodies are compressed chunk by chunk as the app yields them, so large
+iterable responses are never held in memory. Only the first `min_size` bytes
+are buffered to decide whether compressing is worth it.
+
+Content types that are already compressed (images, archives, etc.) and
+responses that already have a `Content-Encoding` are passed through as is.
+
+The call to the upstream `start_response` is deferred until the first body
+chunk is ready. This means middleware further in that call start_response
+more than once (ex. FormatExceptionMiddleware replacing a response with an
+error) or that append headers (ex. CORSMiddleware, ContextMiddleware) work
+unchanged no matter where this sits in the chain.
+
+Example usage:
+
+    import bottle
+    from simpl.middleware import compression
+    from simpl.middleware import errors
+
+    app = bottle.default_app()
+    app.catchall = False
+    chain = errors.FormatExceptionMiddleware(app)
+    chain = compression.CompressionMiddleware(chain, min_size=1024)
+    bottle.run(app=chain)
+"""
+
+import logging
+import zlib
+
+import six
+try:
+    import brotli  # pylint: disable=import-error
+except ImportError:
+    brotli = None
+
+LOG = logging.getLogger(__name__)
+
+
+class CompressionMiddleware(object):
+
+    """Compresses responses the client accepts compressed."""
+
+    default_skip_types = (
+        'application/gzip',
+        'application/x-gzip',
+        'application/x-bzip2',
+        'application/x-xz',
+        'application/zip',
+        'application/octet-stream',
+        'audio/',
+        'font/woff',
+        'image/',
+        'video/',
+    )
+
+    def __init__(self, app, min_size=1024, level=6,
+                 skip_types=default_skip_types, brotli_quality=5):
+        """Configure thresholds and compression levels.
+
+        :keyword min_size: bodies smaller than this (in bytes) are not
+            compressed.
+        :keyword level: gzip compression level (1-9).
+        :keyword skip_types: iterable of content types (or prefixes of
+            content types, ex. 'image/') that are never compressed.
+        :keyword brotli_quality: brotli quality (0-11), used when brotli is
+            installed.
+        """
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.skip_types = tuple(skip_types)
+        self.brotli_quality = brotli_quality
+        self.encodings = ('br', 'gzip') if brotli else ('gzip',)
+
+    def choose_encoding(self, environ):
+        """Return the best encoding the client accepts or None.
+
+        Honors q-values (ex. `gzip;q=0`) and the `*` wildcard.
+        """
+        header = environ.get('HTTP_ACCEPT_ENCODING')
+        if not header:
+            return None
+        accepted = {}
+        for part in header.split(','):
+            params = part.strip().split(';')
+            name = params[0].strip().lower()
+            quality = 1.0
+            for param in params[1:]:
+                key, _, value = param.strip().partition('=')
+                if key.strip() == 'q':
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if name:
+                accepted[name] = quality
+        best = None
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, accepted.get('*', 0.0))
+            if quality > 0 and (best is None or quality > best[1]):
+                best = (encoding, quality)
+        return best[0] if best else None
+
+    def compressible(self, status, headers):
+        """Check the response status and headers allow compression."""
+        if status[:3] in ('204', '206', '304') or status[0] == '1':
+            return False
+        for name, value in headers:
+            name = name.lower()
+            if name == 'content-encoding':
+                return False
+            if name == 'content-type':
+                ctype = value.split(';', 1)[0].strip().lower()
+                if ctype.startswith(self.skip_types):
+                    return False
+            if name == 'cache-control' and 'no-transform' in value.lower():
+                return False
+            if name == 'content-length':
+                try:
+                    if int(value) < self.min_size:
+                        return False
+                except ValueError:
+                    pass
+        return True
+
+    def compressor(self, encoding):
+        """Return a (compress, flush) pair of callables for the encoding."""
+        if encoding == 'br':
+            comp = brotli.Compressor(quality=self.brotli_quality)
+            return comp.process, comp.finish
+        comp = zlib.compressobj(self.level, zlib.DEFLATED,
+                                16 + zlib.MAX_WBITS)
+        return comp.compress, comp.flush
+
+    def __call__(self, environ, start_response):
+        """Defer start_response and compress the body if we should."""
+        encoding = self.choose_encoding(environ)
+        if not encoding or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        response = {}
+        pending = []
+
+        def callback(status, headers, exc_info=None):
+            """Record (or replace) the response until the body is ready."""
+            if exc_info and response.get('sent'):
+                six.reraise(*exc_info)
+            response['status'] = status
+            response['headers'] = headers
+            response['exc_info'] = exc_info
+            return pending.append
+
+        result = self.app(environ, callback)
+        return self._compress_iter(result, response, pending, encoding,
+                                   start_response)
+
+    def _compress_iter(self, result, response, pending, encoding,
+                       start_response):
+        """Buffer up to min_size, then stream (compressed or not)."""
+        iterator = iter(result)
+        try:
+            buffered = []
+            size = 0
+            pulled = 0
+            exhausted = False
+            while size < self.min_size:
+                if pending:
+                    chunk = pending.pop(0)
+                else:
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pulled += 1
+                buffered.append(chunk)
+                size += len(chunk)
+            if isinstance(result, (list, tuple)):
+                # bottle returns lists, so we know when we have it all
+                exhausted = pulled == len(result)
+            status = response['status']
+            headers = response['headers']
+            if size < self.min_size or not self.compressible(status,
+                                                             headers):
+                response['sent'] = True
+                start_response(status, headers, response['exc_info'])
+                for chunk in buffered:
+                    yield chunk
+                for chunk in self._remaining(iterator, pending):
+                    yield chunk
+                return
+
+            compress, flush = self.compressor(encoding)
+            headers = self._compressed_headers(headers, encoding)
+            if exhausted and not pending:
+                # Whole body is in hand: we can send an exact length
+                body = b''.join(compress(c) for c in buffered) + flush()
+                headers.append(('Content-Length', str(len(body))))
+                response['sent'] = True
+                start_response(status, headers, response['exc_info'])
+                yield body
+                return
+
+            response['sent'] = True
+            start_response(status, headers, response['exc_info'])
+            for chunk in buffered:
+                data = compress(chunk)
+                if data:
+                    yield data
+            for chunk in self._remaining(iterator, pending):
+                data = compress(chunk)
+                if data:
+                    yield data
+            yield flush()
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    @staticmethod
+    def _remaining(iterator, pending):
+        """Yield data from write() calls and the rest of the iterable."""
+        while pending:
+            yield pending.pop(0)
+        for chunk in iterator:
+            while pending:
+                yield pending.pop(0)
+            yield chunk
+        while pending:
+            yield pending.pop(0)
+
+    @staticmethod
+    def _compressed_headers(headers, encoding):
+        """Return headers for the compressed response."""
+        result = []
+        vary = None
+        for name, value in headers:
+            lname = name.lower()
+            if lname == 'content-length':
+                continue
+            if lname == 'vary':
+                vary = value
+                continue
+            result.append((name, value))
+        if not vary:
+            vary = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            vary = '%s, Accept-Encoding' % vary
+        result.append(('Vary', vary))
+        result.append(('Content-Encoding', encoding))
+        return result
@@ -0,0 +1,202 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Request Metrics WSGI Middleware.
+
+Records, per route:
+- request counts by method, route and status code
+- a latency histogram (from the call until the response body is sent)
+and a gauge of requests in flight.
+
+Requests are labeled with the bottle route rule that matched them (ex.
+`/widgets/<id>`), not the raw path, so the number of series stays bounded.
+Requests that matched no route are labeled `<unmatched>`.
+
+The numbers are rendered in the Prometheus text exposition format by
+:meth:`MetricsMiddleware.render`. `simpl server --metrics` adds this
+middleware and serves them on `/_simpl/metrics`.
+
+Example usage:
+
+    import bottle
+    from simpl.middleware import metrics
+
+    app = bottle.default_app()
+    chain = metrics.MetricsMiddleware(app)
+    app.route('/metrics', callback=chain.metrics_callback)
+    bottle.run(app=chain)
+"""
+
+import bisect
+import logging
+import threading
+import time
+
+import bottle
+
+LOG = logging.getLogger(__name__)
+
+#: Latency histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+#: Methods labeled as themselves. Others are labeled 'other'.
+KNOWN_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+UNMATCHED = '<unmatched>'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+def _escape(value):
+    """Escape a Prometheus label value."""
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _labels(**labels):
+    """Format a label set (sorted by name)."""
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(str(value)))
+                             for name, value in sorted(labels.items()))
+
+
+class MetricsMiddleware(object):
+
+    """Counts and times requests by route."""
+
+    def __init__(self, app, buckets=DEFAULT_BUCKETS, prefix='simpl_http'):
+        """Set up the metrics.
+
+        :keyword buckets: latency histogram bucket upper bounds (seconds).
+        :keyword prefix: prefix of the metric names.
+        """
+        self.app = app
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        #: {(method, route, status): count}
+        self.requests = {}
+        #: {(method, route): [bucket counts..., +Inf count, sum]}
+        self.latency = {}
+
+    def __call__(self, environ, start_response):
+        """Time the request and count it once its response is done."""
+        start = _clock()
+        response = {}
+
+        def callback(status, headers, exc_info=None):
+            """Record the status code."""
+            response['status'] = status[:3]
+            return start_response(status, headers, exc_info)
+
+        with self.lock:
+            self.in_flight += 1
+        try:
+            result = self.app(environ, callback)
+        except Exception:
+            self.observe(environ, '500', _clock() - start)
+            raise
+        return _ObservedResponse(result, self, environ, response, start)
+
+    def observe(self, environ, status, elapsed):
+        """Record a finished request."""
+        route = environ.get('bottle.route')
+        rule = route.rule if route is not None else UNMATCHED
+        method = environ.get('REQUEST_METHOD', 'GET').upper()
+        if method not in KNOWN_METHODS:
+            method = 'other'
+        index = bisect.bisect_left(self.buckets, elapsed)
+        with self.lock:
+            self.in_flight -= 1
+            key = (method, rule, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            series = self.latency.get((method, rule))
+            if series is None:
+                series = self.latency[(method, rule)] = \
+                    [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += elapsed
+
+    def render(self):
+        """Return the metrics in the Prometheus text format."""
+        with self.lock:
+            in_flight = self.in_flight
+            requests = sorted(self.requests.items())
+            latency = sorted((key, list(series))
+                             for key, series in self.latency.items())
+        name = self.prefix + '_requests_total'
+        lines = [
+            '# HELP %s Requests handled, by method, route and status.' %
+            name,
+            '# TYPE %s counter' % name,
+        ]
+        for (method, rule, status), count in requests:
+            lines.append('%s%s %d' % (name, _labels(
+                method=method, route=rule, status=status), count))
+
+        name = self.prefix + '_request_duration_seconds'
+        lines.append('# HELP %s Request latency, by method and route.' %
+                     name)
+        lines.append('# TYPE %s histogram' % name)
+        bounds = [repr(float(b)) for b in self.buckets] + ['+Inf']
+        for (method, rule), series in latency:
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (name, _labels(
+                    method=method, route=rule, le=bound), cumulative))
+            labels = _labels(method=method, route=rule)
+            lines.append('%s_sum%s %r' % (name, labels, series[-1]))
+            lines.append('%s_count%s %d' % (name, labels, cumulative))
+
+        name = self.prefix + '_requests_in_flight'
+        lines.append('# HELP %s Requests being handled.' % name)
+        lines.append('# TYPE %s gauge' % name)
+        lines.append('%s %d' % (name, in_flight))
+        return '\n'.join(lines) + '\n'
+
+    def metrics_callback(self):
+        """Bottle route callback serving :meth:`render`."""
+        bottle.response.content_type = CONTENT_TYPE
+        return self.render()
+
+
+class _ObservedResponse(object):  # pylint: disable=R0903
+
+    """Response iterable recording the request when closed."""
+
+    def __init__(self, result, middleware, environ, response, start):
+        """Wrap the app's response."""
+        self.result = result
+        self.middleware = middleware
+        self.environ = environ
+        self.response = response
+        self.start = start
+        self.observed = False
+
+    def __iter__(self):
+        """Iterate over the wrapped response."""
+        return iter(self.result)
+
+    def close(self):
+        """Close the wrapped response and record the request (once)."""
+        try:
+            if hasattr(self.result, 'close'):
+                self.result.close()
+        finally:
+            if not self.observed:
+                self.observed = True
+                self.middleware.observe(
+                    self.environ, self.response.get('status', '500'),
+                    _clock() - self.start)
@@ -0,0 +1,255 @@
+# Copyright 2013-2015 Rackspace US, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pre-fork process manager.
+
+Used by `simpl server --workers N` to serve from N processes (and so N CPU
+cores) without an external process manager.
+
+The master process binds the listening socket once, forks N workers that
+all accept connections on it, and then supervises them:
+
+- workers that exit or crash are replaced (with a back-off if they keep
+  dying right after starting).
+- SIGHUP reloads: a new set of workers is started, then the old workers are
+  sent SIGTERM. Since the master never imports the app, new workers load
+  fresh application code.
+- SIGTERM, SIGINT and SIGQUIT stop: workers are sent SIGTERM, given
+  `graceful_timeout` seconds to exit and are then killed.
+
+Example usage:
+
+    from simpl import prefork
+
+    def serve(sock):
+        bottle.run(app=app, server='xeventlet', shared_socket=sock)
+
+    prefork.Arbiter(serve, workers=4,
+                    listen=lambda: prefork.bind_socket('0.0.0.0', 8080)).run()
+"""
+
+import errno
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+LOG = logging.getLogger(__name__)
+
+#: Signals handled by the master
+HANDLED_SIGNALS = ('SIGHUP', 'SIGTERM', 'SIGINT', 'SIGQUIT')
+
+
+def bind_socket(host, port, backlog=1024):
+    """Create, bind and return a listening TCP socket."""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def _original_sleep():
+    """Return an unpatched time.sleep.
+
+    The master must not start an eventlet hub that forked workers would
+    inherit, so if eventlet has monkey patched `time`, use the original.
+    """
+    patcher = sys.modules.get('eventlet.patcher')
+    if patcher and patcher.is_monkey_patched('time'):
+        return patcher.original('time').sleep
+    return time.sleep
+
+
+class Arbiter(object):
+
+    """Forks and supervises worker processes that share a socket."""
+
+    def __init__(self, serve, workers, listen=None, graceful_timeout=30,
+                 min_uptime=1.0, check_interval=0.5):
+        """Configure the master.
+
+        :param serve: callable run in each worker with the listening socket
+            (or None if no `listen` is supplied). The worker exits when it
+            returns.
+        :param workers: number of worker processes to run.
+        :keyword listen: callable returning the listening socket. Called once
+            in the master before forking.
+        :keyword graceful_timeout: seconds workers are given to exit after
+            SIGTERM before they are killed.
+        :keyword min_uptime: workers exiting sooner than this after starting
+            are considered to be crashing and are respawned with a back-off.
+        :keyword check_interval: seconds between supervision checks.
+        """
+        self.serve = serve
+        self.num_workers = workers
+        self.listen = listen
+        self.graceful_timeout = graceful_timeout
+        self.min_uptime = min_uptime
+        self.check_interval = check_interval
+        self.sock = None
+        self.generation = 0
+        #: {pid: (generation, start time)}
+        self.workers = {}
+        self.signals = []
+        self.backoff = 0
+        self.next_spawn = 0
+        self.pid = None
+        self.stopping = False
+        self._sleep = _original_sleep()
+
+    def run(self):
+        """Bind, fork the workers and supervise them until stopped."""
+        self.pid = os.getpid()
+        if self.listen:
+            self.sock = self.listen()
+        self.install_signals()
+        LOG.info("Master %s starting %d workers", self.pid,
+                 self.num_workers)
+        try:
+            self.spawn_workers()
+            while True:
+                self.reap_workers()
+                if self.signals:
+                    signum = self.signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        self.reload()
+                    else:
+                        LOG.info("Master %s received signal %s, stopping",
+                                 self.pid, signum)
+                        self.stop()
+                        return
+                self.spawn_workers()
+                self._sleep(self.check_interval)
+        finally:
+            if self.sock is not None:
+                self.sock.close()
+
+    def install_signals(self):
+        """Queue handled signals for the supervision loop."""
+        for name in HANDLED_SIGNALS:
+            signal.signal(getattr(signal, name), self.handle_signal)
+
+    def handle_signal(self, signum, frame):  # pylint: disable=W0613
+        """Record a signal. It is acted on by the supervision loop."""
+        self.signals.append(signum)
+
+    def spawn_workers(self):
+        """Fork workers until the current generation is complete."""
+        current = [pid for pid, (gen, _) in self.workers.items()
+                   if gen == self.generation]
+        missing = self.num_workers - len(current)
+        if missing <= 0 or time.time() < self.next_spawn:
+            return
+        for _ in range(missing):
+            self.spawn_worker()
+
+    def spawn_worker(self):
+        """Fork a single worker."""
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (self.generation, time.time())
+            LOG.debug("Started worker %s (generation %s)", pid,
+                      self.generation)
+            return pid
+
+        # we are the worker
+        for name in HANDLED_SIGNALS:
+            signal.signal(getattr(signal, name), signal.SIG_DFL)
+        status = 0
+        try:
+            self.serve(self.sock)
+        except SystemExit as exc:
+            if exc.code is None:
+                status = 0
+            else:
+                status = exc.code if isinstance(exc.code, int) else 1
+        except BaseException:  # pylint: disable=broad-except
+            LOG.exception("Worker %s failed", os.getpid())
+            status = 1
+        finally:
+            os._exit(status)  # pylint: disable=protected-access
+
+    def reap_workers(self):
+        """Collect exited workers and track crash loops."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as exc:
+                if exc.errno == errno.ECHILD:
+                    return
+                raise
+            if not pid:
+                return
+            generation, started = self.workers.pop(pid, (None, None))
+            if generation is None:
+                continue
+            if generation != self.generation or self.stopping:
+                LOG.debug("Worker %s exited", pid)
+                continue
+            LOG.warning("Worker %s exited with status %s", pid, status)
+            if time.time() - started < self.min_uptime:
+                self.backoff = min(max(self.backoff * 2, 1), 30)
+                self.next_spawn = time.time() + self.backoff
+                LOG.warning("Worker %s died right after starting. Waiting "
+                            "%ss before starting another.", pid,
+                            self.backoff)
+            else:
+                self.backoff = 0
+
+    def reload(self):
+        """Start a new generation of workers, then stop the old one."""
+        LOG.info("Master %s reloading workers", self.pid)
+        old = [pid for pid, (gen, _) in self.workers.items()
+               if gen == self.generation]
+        self.generation += 1
+        self.backoff = 0
+        self.next_spawn = 0
+        self.spawn_workers()
+        for pid in old:
+            self.kill_worker(pid, signal.SIGTERM)
+
+    def kill_worker(self, pid, signum):
+        """Send a signal to a worker, ignoring already exited ones."""
+        try:
+            os.kill(pid, signum)
+        except OSError as exc:
+            if exc.errno != errno.ESRCH:
+                raise
+
+    def stop(self):
+        """Stop all workers, killing those that outlive graceful_timeout."""
+        self.stopping = True
+        for pid in list(self.workers):
+            self.kill_worker(pid, signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout
+        while self.workers and time.time() < deadline:
+            self.reap_workers()
+            if self.workers:
+                self._sleep(0.1)
+        for pid in list(self.workers):
+            LOG.warning("Killing worker %s after %ss", pid,
+                        self.graceful_timeout)
+            self.kill_worker(pid, signal.SIGKILL)
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except OSError as exc:
+                if exc.errno == errno.ECHILD:
+                    break
+                raise
+            self.workers.pop(pid, None)
@@ -14,14 +14,22 @@
 
 """REST-ful API Utilites."""
 
+import codecs
 import functools
+import io
 import itertools
 import json
 import logging
+import re
 import sys
+import threading
+import time
 import traceback
 
 import bottle
+import six
+from six.moves import queue
+from six.moves.urllib import parse
 try:
     import yaml  # pylint: disable=wrong-import-order
 except ImportError:
@@ -31,25 +39,47 @@ from simpl.exceptions import SimplHTTPError as HTTPError  # noqa
 
 
 LOG = logging.getLogger(__name__)
+BODY_CHUNK_SIZE = 64 * 1024
+MAX_CACHED_PAGINATORS = 1024
 MAX_PAGE_SIZE = 10000000
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson')
 STANDARD_QUERY_PARAMS = ('offset', 'limit', 'sort', 'q', 'facets')
 UNEXPECTED_ERROR = "We're sorry, something went wrong."
+_NUMBER_TAIL = re.compile(r'[0-9+\-.eE]*\Z')
+# strings (so their contents are skipped), a lone quote (an unterminated
+# string) and the characters that nest or separate JSON values
+_STRUCTURE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|["\[\]{},]', re.S)
+_WHITESPACE = ' \t\n\r'
+_PAGINATORS = {}
+_NDJSON_DONE = object()
 
 
-def body(schema=None, types=None, required=False, default=None):
+def body(schema=None, types=None, required=False, default=None,
+         max_bytes=None, stream=False):
     """Decorator to parse and validate API body.
 
     :keyword schema: callable that accepts raw data and returns the coerced (or
         unchanged) data if it is valid. It should raise an error if the data is
         not valid.
-    :keyword types: supported content types (default is ['application/json'])
+    :keyword types: supported content types (default is ['application/json']
+        or, when streaming, also ['application/x-ndjson'])
     :keyword required: if true and no body specified will raise an error.
     :keyword default: default value to return if no body supplied
+    :keyword max_bytes: reject bodies larger than this with a 413 before
+        reading them (when the client sends a Content-Length) or as soon as
+        the limit is crossed (chunked bodies).
+    :keyword stream: if true, the body is not parsed up front. The decorated
+        function receives an iterator that yields the elements of a top-level
+        JSON array, or the lines of an NDJSON body, as they are read from the
+        request. `schema` is applied to each element. Use this for bulk
+        ingest endpoints so memory use does not grow with the body size.
 
     Note: only json types are supported.
     """
     if not types:
         types = ['application/json']
+        if stream:
+            types.extend(NDJSON_TYPES)
     if not all('json' in t for t in types):
         raise NotImplementedError("Only 'json' body supported.")
 
@@ -57,8 +87,16 @@ def body(schema=None, types=None, required=False, default=None):
         """Return a decorated callable."""
         def wrapped(*args, **kwargs):
             """Callable to called when the decorated function is called."""
+            check_content_length(bottle.request, max_bytes)
+            if stream:
+                data = _stream_body(bottle.request, types, schema, required,
+                                    default, max_bytes)
+                return fxn(data, *args, **kwargs)
             try:
-                data = bottle.request.json
+                if max_bytes is None:
+                    data = bottle.request.json
+                else:
+                    data = _read_json(bottle.request, max_bytes)
             except (ValueError, UnicodeDecodeError) as exc:
                 bottle.abort(400, str(exc))
             if required and not data:
@@ -75,7 +113,444 @@ def body(schema=None, types=None, required=False, default=None):
     return wrap
 
 
-def paginated(resource_name=None):
+def check_content_length(request, max_bytes):
+    """Abort with a 413 if the declared body size is over max_bytes."""
+    if max_bytes is not None and request.content_length > max_bytes:
+        bottle.abort(413, "Request body is larger than %d bytes" % max_bytes)
+
+
+def _read_json(request, max_bytes):
+    """Parse a JSON body like `request.json`, aborting past max_bytes."""
+    ctype = request.content_type.split(';')[0].strip().lower()
+    if ctype != 'application/json':
+        return None
+    raw = b''.join(iter_body(request, max_bytes=max_bytes))
+    # keep the body readable through bottle (it was read from wsgi.input)
+    request.environ['bottle.request.body'] = io.BytesIO(raw)
+    if not raw:
+        return None
+    return json.loads(raw.decode('utf-8'))
+
+
+def _stream_body(request, types, schema, required, default, max_bytes):
+    """Return an iterator over the elements of the request body."""
+    ctype = request.content_type.split(';')[0].strip().lower()
+    if request.content_length <= 0 and not request.chunked:
+        items = iter([])
+    elif ctype not in types:
+        bottle.abort(415, "Unsupported content type '%s'. Try one of %s."
+                     % (ctype, ", ".join(types)))
+    elif ctype in NDJSON_TYPES:
+        items = iter_ndjson(iter_body(request, max_bytes=max_bytes))
+    else:
+        items = iter_json_array(iter_body(request, max_bytes=max_bytes))
+    try:
+        first = next(items)
+    except StopIteration:
+        if required:
+            bottle.abort(400, "Call body cannot be empty")
+        items = iter(default or [])
+    else:
+        items = itertools.chain([first], items)
+    if schema:
+        items = _apply_schema(schema, items)
+    return items
+
+
+def _apply_schema(schema, items):
+    """Apply schema to each item, aborting on the first invalid one."""
+    for index, item in enumerate(items):
+        try:
+            yield schema(item)
+        except Exception as exc:  # pylint: disable=broad-except
+            bottle.abort(400, "Item %d: %s" % (index, exc))
+
+
+def iter_body(request, max_bytes=None, chunk_size=BODY_CHUNK_SIZE):
+    """Read the request body in chunks of bytes.
+
+    Reads (and de-chunks) directly from `wsgi.input`, so the body is never
+    held in memory, unless bottle has already read it.
+
+    Aborts with a 413 as soon as more than max_bytes have been read.
+    """
+    read = 0
+    for chunk in _iter_raw_body(request, chunk_size):
+        read += len(chunk)
+        if max_bytes is not None and read > max_bytes:
+            bottle.abort(413,
+                         "Request body is larger than %d bytes" % max_bytes)
+        yield chunk
+
+
+def _iter_raw_body(request, chunk_size):
+    """Yield the request body in chunks of bytes, as sent by the client."""
+    if 'bottle.request.body' in request.environ:
+        # already read (and spooled) by bottle
+        source, length = request.body, None
+    elif request.chunked:
+        read = request.environ['wsgi.input'].read
+        # pylint: disable=protected-access
+        for chunk in request._iter_chunked(read, chunk_size):
+            yield chunk
+        return
+    else:
+        source = request.environ['wsgi.input']
+        length = max(request.content_length, 0)
+    read = 0
+    while length is None or read < length:
+        size = chunk_size if length is None else min(chunk_size,
+                                                     length - read)
+        chunk = source.read(size)
+        if not chunk:
+            break
+        read += len(chunk)
+        yield chunk
+
+
+def _iter_text(chunks):
+    """Decode utf-8 byte chunks incrementally."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for chunk in chunks:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', final=True)
+    except UnicodeDecodeError as exc:
+        bottle.abort(400, str(exc))
+    if text:
+        yield text
+
+
+def iter_json_array(chunks):
+    """Parse a top-level JSON array incrementally, yielding its elements.
+
+    `chunks` is an iterable of bytes (ex. from :func:`iter_body`). Only one
+    element (plus a read buffer) is held in memory at a time.
+
+    Raises a 400 HTTPError if the body is not a valid JSON array.
+    """
+    decoder = json.JSONDecoder()
+    text = _iter_text(chunks)
+    buf, pos = _skip_whitespace(text, '', 0)
+    if pos >= len(buf):
+        return
+    if buf[pos] != '[':
+        bottle.abort(400, "Invalid JSON: body is not an array")
+    buf, pos = _skip_whitespace(text, buf, pos + 1)
+    index = 0
+    while buf[pos:pos + 1] != ']' or index:
+        item, buf, pos = _decode_item(decoder, text, buf, pos, index)
+        yield item
+        buf, pos = _skip_whitespace(text, buf, pos)
+        if buf[pos:pos + 1] == ']':
+            break
+        if pos >= len(buf):
+            bottle.abort(400, "Invalid JSON: unterminated array")
+        if buf[pos] != ',':
+            bottle.abort(400, "Invalid JSON: expected ',' after item %d"
+                         % index)
+        buf, pos = _skip_whitespace(text, buf, pos + 1)
+        index += 1
+    buf, pos = _skip_whitespace(text, buf, pos + 1)
+    if pos < len(buf):
+        bottle.abort(400, "Invalid JSON: unexpected data after the array")
+
+
+def _skip_whitespace(text, buf, pos):
+    """Return (buf, pos) of the next non-whitespace character of text.
+
+    `pos` is past the end of `buf` once the text is exhausted.
+    """
+    while True:
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        if pos < len(buf):
+            return buf, pos
+        try:
+            buf, pos = next(text), 0
+        except StopIteration:
+            return '', 0
+
+
+def _decode_item(decoder, text, buf, pos, index):
+    """Decode the array item at pos, reading more text if needed.
+
+    :returns: (item, buf, position after the item)
+    """
+    eof = False
+    while True:
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except ValueError as exc:
+            if eof or _value_ends(buf, pos):
+                bottle.abort(400, "Invalid JSON in item %d: %s"
+                             % (index, exc))
+        else:
+            # a number that reaches the end of buf may continue
+            if eof or not _NUMBER_TAIL.match(buf, end):
+                return item, buf, end
+        try:
+            buf, pos = buf[pos:] + next(text), 0
+        except StopIteration:
+            buf, pos, eof = buf[pos:], 0, True
+
+
+def _value_ends(buf, pos):
+    """Check if the JSON value at pos is followed by a ',' or ']' in buf.
+
+    Only strings and nesting are tracked, so this finds the end of invalid
+    values too: once it does, reading more text won't make them valid.
+    """
+    depth = 0
+    for match in _STRUCTURE.finditer(buf, pos):
+        token = match.group()
+        if token == '"':
+            return False
+        if token in ('[', '{'):
+            depth += 1
+        elif token in (']', '}'):
+            if not depth:
+                return True
+            depth -= 1
+        elif token == ',' and not depth:
+            return True
+    return False
+
+
+def iter_ndjson(chunks):
+    """Parse newline-delimited JSON incrementally, yielding each line's value.
+
+    Blank lines are skipped. Raises a 400 HTTPError for the first line that is
+    not valid JSON.
+    """
+    return iter(NDJSONReader(chunks))
+
+
+class NDJSONReader(object):
+
+    """Iterates over the values of a newline-delimited JSON body.
+
+    Lines are read and parsed lazily. Invalid lines (bad JSON or failing
+    `schema`) either abort the request with a 400 that names the line
+    (`strict=True`, the default) or are skipped and recorded in `errors` as
+    `{'line': <line number>, 'message': <error>}` dicts. When not strict,
+    the request is aborted once more than `max_errors` lines have failed.
+
+    `count` holds the number of values yielded so far.
+    """
+
+    def __init__(self, chunks, schema=None, strict=True, max_errors=None):
+        """Wrap an iterable of bytes (ex. from :func:`iter_body`)."""
+        self.chunks = chunks
+        self.schema = schema
+        self.strict = strict
+        self.max_errors = max_errors
+        self.errors = []
+        self.count = 0
+
+    def __iter__(self):
+        """Yield the value of each valid line."""
+        for number, line in _iter_lines(_iter_text(self.chunks)):
+            try:
+                value = json.loads(line)
+            except ValueError as exc:
+                self._error(number, "Invalid JSON on line %d: %s"
+                            % (number, exc))
+                continue
+            if self.schema:
+                try:
+                    value = self.schema(value)
+                except Exception as exc:  # pylint: disable=broad-except
+                    self._error(number, "Line %d: %s" % (number, exc))
+                    continue
+            self.count += 1
+            yield value
+
+    def _error(self, number, message):
+        """Abort or record an invalid line."""
+        if self.strict:
+            bottle.abort(400, message)
+        self.errors.append({'line': number, 'message': message})
+        if self.max_errors is not None and len(self.errors) > self.max_errors:
+            bottle.abort(400, "Too many invalid lines (%d). Last error: %s"
+                         % (len(self.errors), message))
+
+
+def ndjson_body(schema=None, max_bytes=None, strict=True, max_errors=None,
+                types=NDJSON_TYPES):
+    """Decorator to lazily parse a newline-delimited JSON body.
+
+    The decorated function receives an :class:`NDJSONReader` as its first
+    argument. Iterating it reads and parses the body one line at a time, so
+    memory use does not grow with the size of the upload:
+
+        @app.post('/widgets/bulk')
+        @rest.ndjson_body(schema=WIDGET_SCHEMA, strict=False)
+        def bulk_import(reader):
+            for widget in reader:
+                DB.widgets.save(widget['id'], widget)
+            return {'imported': reader.count, 'errors': reader.errors}
+
+    :keyword schema: callable applied to each line's value.
+    :keyword max_bytes: reject bodies larger than this with a 413.
+    :keyword strict: abort on the first invalid line (default). If false,
+        invalid lines are skipped and listed in `reader.errors`.
+    :keyword max_errors: when not strict, abort after this many invalid lines.
+    :keyword types: accepted content types.
+    """
+    def wrap(fxn):
+        """Return a decorated callable."""
+        def wrapped(*args, **kwargs):
+            """Callable to called when the decorated function is called."""
+            request = bottle.request
+            check_content_length(request, max_bytes)
+            ctype = request.content_type.split(';')[0].strip().lower()
+            has_body = request.content_length > 0 or request.chunked
+            if has_body and ctype not in types:
+                bottle.abort(415, "Unsupported content type '%s'. Try one "
+                             "of %s." % (ctype, ", ".join(types)))
+            reader = NDJSONReader(iter_body(request, max_bytes=max_bytes),
+                                  schema=schema, strict=strict,
+                                  max_errors=max_errors)
+            return fxn(reader, *args, **kwargs)
+        return functools.wraps(fxn)(wrapped)
+    return wrap
+
+
+def ndjson_response(items, flush_lines=100, flush_seconds=1.0,
+                    response=None):
+    """Stream an iterable of dicts as a newline-delimited JSON response.
+
+    Return the result from a bottle route. Lines are sent in batches: a batch
+    is flushed to the client once it has `flush_lines` lines or
+    BODY_CHUNK_SIZE bytes, and no line waits more than `flush_seconds` for
+    its batch to be sent, even while `items` is slow to produce the next one.
+    Combined with a database cursor (ex.
+    :meth:`simpl.db.mongodb.Collection.iterate`) this exports any number of
+    records in constant memory:
+
+        @app.get('/widgets/export')
+        def export():
+            return rest.ndjson_response(DB.widgets.iterate())
+
+    To bound that wait, `items` is read on a separate thread (a greenthread
+    under eventlet), so it should not rely on thread-local state such as
+    `bottle.request`. With `flush_seconds=0` each line is sent as soon as it
+    is produced and `items` is read in the calling thread.
+
+    :param items: iterable of JSON-serializable objects.
+    :keyword response: response to set the content type on (defaults to
+        bottle.response).
+    """
+    response = response or bottle.response
+    response.content_type = 'application/x-ndjson'
+    if not flush_seconds:
+        return _encode_ndjson(items)
+    return _iter_ndjson_lines(items, flush_lines, flush_seconds)
+
+
+def _encode_ndjson(items):
+    """Yield each item as an encoded NDJSON line."""
+    encoder = json.JSONEncoder(separators=(',', ':'))
+    try:
+        for item in items:
+            yield (encoder.encode(item) + '\n').encode('utf-8')
+    finally:
+        if hasattr(items, 'close'):
+            items.close()
+
+
+def _read_ndjson_lines(items, lines, stopped):
+    """Put encoded lines (then _NDJSON_DONE) on `lines`, until `stopped`.
+
+    Runs on the reader thread of `_iter_ndjson_lines`. An error raised by
+    `items` is put on the queue as its exc_info tuple.
+    """
+    encoded = _encode_ndjson(items)
+    try:
+        for line in encoded:
+            lines.put(line)
+            if stopped.is_set():
+                break
+    except Exception:  # pylint: disable=broad-except
+        lines.put(sys.exc_info())
+    finally:
+        encoded.close()
+        lines.put(_NDJSON_DONE)
+
+
+def _iter_ndjson_lines(items, flush_lines, flush_seconds):
+    """Yield batches of encoded NDJSON lines read from a reader thread."""
+    # room for what the reader may still put after we stop taking lines
+    lines = queue.Queue(max(flush_lines, 2))
+    stopped = threading.Event()
+    reader = threading.Thread(target=_read_ndjson_lines,
+                              args=(items, lines, stopped),
+                              name='ndjson-reader')
+    reader.daemon = True
+    reader.start()
+    batch = []
+    size = 0
+    deadline = None
+    try:
+        while True:
+            if batch:
+                try:
+                    line = lines.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    yield b''.join(batch)
+                    batch = []
+                    size = 0
+                    continue
+            else:
+                line = lines.get()
+                deadline = time.time() + flush_seconds
+            if line is _NDJSON_DONE:
+                break
+            if isinstance(line, tuple):
+                six.reraise(*line)
+            batch.append(line)
+            size += len(line)
+            if len(batch) >= flush_lines or size >= BODY_CHUNK_SIZE:
+                yield b''.join(batch)
+                batch = []
+                size = 0
+        if batch:
+            yield b''.join(batch)
+    finally:
+        stopped.set()
+        # unblock the reader if it is waiting for room on the queue
+        while True:
+            try:
+                lines.get_nowait()
+            except queue.Empty:
+                break
+
+
+def _iter_lines(text):
+    """Yield (line number, line) for non-blank lines of streamed text."""
+    pending = []
+    number = 0
+    for chunk in text:
+        if '\n' not in chunk:
+            pending.append(chunk)
+            continue
+        lines = chunk.split('\n')
+        pending.append(lines[0])
+        lines[0] = ''.join(pending)
+        pending = [lines.pop()]
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+    rest = ''.join(pending)
+    if rest.strip():
+        yield number + 1, rest
+
+
+def paginated(resource_name=None, body_links=False):
     """Decorator that handles pagination headers, params, and links.
 
     This accepts, parses, validates, and handles `limit` and `offset` optional
@@ -98,9 +573,14 @@ def paginated(resource_name=None):
     It adds link headers based on RFC 5988 (by ex-Racker Mark Nottingham) -
     https://tools.ietf.org/html/rfc5988#section-5.5.
 
-    Future changes to the RFCs or common API concepts, such as adding links to
-    the response body, may be implemented here to consistently handle
-    pagination across all projects using simpl pagination for their APIs.
+    Query params other than `limit` and `offset` (ex. filters and sort) are
+    preserved in the links. If `body_links` is true, the same links are also
+    added to the response body under a `link` key, ex.
+    `{"link": {"next": "/widgets?limit=2&offset=5", ...}}`.
+
+    Future changes to the RFCs or common API concepts may be implemented here
+    to consistently handle pagination across all projects using simpl
+    pagination for their APIs.
 
     Opinionated assumptions:
     - body has data items under a `data` or `results` key.
@@ -149,8 +629,9 @@ def paginated(resource_name=None):
             except ValueError:
                 bottle.response.status = 416
                 bottle.response.set_header(
-                    'Content-Range', '%s */*' %
-                    resource_name or bottle.request.path.split('/')[-1])
+                    'Content-Range', '%s */*' % (
+                        resource_name or
+                        bottle.request.path.strip('/').split('/')[-1]))
                 return
 
             data = fxn(*args, **kwargs)
@@ -160,7 +641,10 @@ def paginated(resource_name=None):
                 int(kwargs.get('limit') or 100),
                 bottle.response,
                 bottle.request.path,
-                resource_name)
+                resource_name,
+                query=bottle.request.query.allitems(),
+                body_links=body_links,
+                rule=_route_rule(bottle.request))
             return data
         return functools.wraps(fxn)(_decorator)
     return _paginated
@@ -176,74 +660,185 @@ def validate_range_values(request, label, kwargs):
 
 
 def write_pagination_headers(data, offset, limit, response, uripath,
-                             resource_name):
+                             resource_name, query=None, body_links=False,
+                             rule=None):
     """Add pagination headers to the bottle response.
 
+    :keyword query: iterable of (key, value) query params of the request.
+        All but `limit` and `offset` (ex. filters and sort) are preserved in
+        the generated links.
+    :keyword body_links: also add the links to the body under a `link` key.
+    :keyword rule: the rule of the route being served (ex.
+        '/tenants/<tenant_id>/widgets'), so requests to every path it
+        matches share one :class:`Paginator`.
+
     See docs in :func:`paginated`.
     """
-    items = data.get('results') or data.get('data') or {}
-    count = len(items)
+    paginator = get_paginator(rule, resource_name)
+    paginator.write(data, offset, limit, response, uripath, query=query,
+                    body_links=body_links)
+
+
+def _route_rule(request):
+    """Return the rule of the route matched by request (or None)."""
+    route = request.environ.get('bottle.route')
+    return route.rule if route is not None else None
+
+
+def get_paginator(rule=None, resource_name=None):
+    """Return a (cached) :class:`Paginator` for a route rule.
+
+    Paginators don't depend on the request path, so one is kept per route
+    (and resource name). Once MAX_CACHED_PAGINATORS are cached, new ones are
+    built for each call instead of evicting others.
+    """
+    key = (rule, resource_name)
     try:
-        total = int(data['collection-count'])
-    except (ValueError, TypeError, KeyError):
-        total = None
-    if total is None and offset == 0 and (limit is None or limit > len(items)):
-        total = count
-
-    # Set 'content-range' header
-    response.set_header(
-        'Content-Range',
-        "%s %d-%d/%s" % (resource_name, offset, offset + max(count - 1, 0),
-                         total if total is not None else '*')
-    )
+        return _PAGINATORS[key]
+    except KeyError:
+        paginator = Paginator(resource_name)
+        if len(_PAGINATORS) < MAX_CACHED_PAGINATORS:
+            _PAGINATORS[key] = paginator
+        return paginator
 
-    partial = False
-    if offset:
-        partial = True  # Any offset automatically means we've skipped data
-    elif total is None and count == limit:
-        # Unknown total, but first page is full (so there may be more)
-        partial = True  # maybe more records in next page
-    elif total > count:
-        # Known total and not all records returned
-        partial = True
-
-    if partial:
-        uripath = uripath.strip('/')
-        response.status = 206  # Partial
 
-        # Add Next page link to http header
-        if total is None or (offset + limit) < total - 1:
-            nextfmt = (
-                '</%s?limit=%d&offset=%d>; rel="next"; title="Next page"')
-            response.add_header(
-                "Link", nextfmt % (uripath, limit, offset + limit)
-            )
+class Paginator(object):
 
-        # Add Previous page link to http header
-        if offset > 0 and (offset - limit) >= 0:
-            prevfmt = ('</%s?limit=%d&offset=%d>; rel="previous"; '
-                       'title="Previous page"')
-            response.add_header(
-                "Link", prevfmt % (uripath, limit, offset - limit)
-            )
+    """Writes pagination headers and links for one route.
 
-        # Add first page link to http header
+    The Link header and URI templates are built once per route, so each
+    response only formats in the path and numbers (and any extra query
+    params).
+
+    Handles every combination of known or unknown (None) totals and limits:
+    - an unknown total means no `last` link, and `next` is only offered if
+      the page is full.
+    - no limit means the response holds everything from `offset` on, so only
+      Content-Range (and a 206 for a non-zero offset) is written.
+    """
+
+    rels = (
+        ('next', 'Next page'),
+        ('previous', 'Previous page'),
+        ('first', 'First page'),
+        ('last', 'Last page'),
+    )
+
+    def __init__(self, resource_name=None):
+        """Precompute the templates.
+
+        :keyword resource_name: name used in Content-Range. Defaults to the
+            last segment of the request path.
+        """
+        self.resource_name = resource_name
+        uri = '%s?'
+        self.uri_templates = {
+            'next': uri + 'limit=%d&offset=%d%s',
+            'previous': uri + 'limit=%d&offset=%d%s',
+            'first': uri + 'limit=%d%s',
+            'last': uri + 'offset=%d%s',
+        }
+        self.header_templates = {
+            rel: '<%s>; rel="%s"; title="%s"' % (
+                self.uri_templates[rel], rel, title)
+            for rel, title in self.rels
+        }
+        self._extra = {}
+
+    def extra_params(self, query):
+        """Return the query string suffix to preserve in links.
+
+        List endpoints see the same few filter/sort combinations over and
+        over, so the encoded suffixes are memoized.
+        """
+        if not query:
+            return ''
+        key = tuple(query)
+        try:
+            return self._extra[key]
+        except KeyError:
+            pass
+        params = [(k, v) for k, v in key if k not in ('limit', 'offset')]
+        extra = '&' + parse.urlencode(params) if params else ''
+        if len(self._extra) >= MAX_CACHED_PAGINATORS:
+            self._extra.clear()
+        self._extra[key] = extra
+        return extra
+
+    @staticmethod
+    def page_values(data, offset, limit):
+        """Return (count, total, partial) for a page of data."""
+        count = len(data.get('results') or data.get('data') or {})
+        try:
+            total = int(data['collection-count'])
+        except (ValueError, TypeError, KeyError):
+            total = None
+        if total is None and offset == 0 and (limit is None or limit > count):
+            total = count
+
+        if offset:
+            partial = True  # Any offset automatically means we've skipped data
+        elif total is None:
+            # Unknown total, but first page is full (so there may be more)
+            partial = limit is not None and count >= limit
+        else:
+            # Known total and not all records returned
+            partial = total > count
+        return count, total, partial
+
+    def links(self, path, offset, limit, total, extra=''):
+        """Return a list of (rel, args) for the links of a partial page.
+
+        `args` are the values for the uri and header templates of `rel`.
+        """
+        links = []
+        if not limit:
+            # no limit: the rest of the collection is in this page
+            return links
+        # Add Next page link
+        if total is None or offset + limit < total:
+            links.append(('next', (path, limit, offset + limit, extra)))
+        # Add Previous page link
+        if offset > 0 and (offset - limit) >= 0:
+            links.append(('previous', (path, limit, offset - limit, extra)))
+        # Add first page link
         if offset > 0:
-            firstfmt = '</%s?limit=%d>; rel="first"; title="First page"'
-            response.add_header(
-                "Link", firstfmt % (uripath, limit))
-
-        # Add last page link to http header
-        if (total is not None and  # can't calculate last page if unknown total
-                limit and  # if no limit, then any page is the last page!
-                limit < total):
-            lastfmt = '</%s?offset=%d>; rel="last"; title="Last page"'
-            if limit and total % limit:
+            links.append(('first', (path, limit, extra)))
+        # Add last page link (can't calculate last page if unknown total)
+        if total is not None and limit < total:
+            if total % limit:
                 last_offset = total - (total % limit)
             else:
                 last_offset = total - limit
-            response.add_header(
-                "Link", lastfmt % (uripath, last_offset))
+            links.append(('last', (path, last_offset, extra)))
+        return links
+
+    def write(self, data, offset, limit, response, uripath, query=None,
+              body_links=False):
+        """Add pagination headers (and optionally body links) for data.
+
+        :param uripath: path of the request, used in the links.
+        """
+        count, total, partial = self.page_values(data, offset, limit)
+        path = '/' + uripath.strip('/')
+
+        # Set 'content-range' header
+        response.set_header(
+            'Content-Range',
+            '%s %d-%d/%s' % (self.resource_name or path.rsplit('/', 1)[-1],
+                             offset, offset + max(count - 1, 0),
+                             total if total is not None else '*'))
+        if not partial:
+            return
+
+        response.status = 206  # Partial
+        links = self.links(path, offset, limit, total,
+                           extra=self.extra_params(query))
+        for rel, args in links:
+            response.add_header('Link', self.header_templates[rel] % args)
+        if body_links:
+            data['link'] = {rel: self.uri_templates[rel] % args
+                            for rel, args in links}
 
 
 def process_params(request, standard_params=STANDARD_QUERY_PARAMS,
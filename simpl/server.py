@@ -16,12 +16,19 @@
 
 from __future__ import print_function
 
+import atexit
+import collections
 import copy
+import json
 import logging
 import operator
 import os
+import re
+import signal
+import socket
 import sys
 import textwrap
+import threading
 
 import bottle
 import six  # pylint: disable=wrong-import-order
@@ -29,6 +36,9 @@ import six  # pylint: disable=wrong-import-order
 import simpl
 
 from simpl import config
+from simpl import prefork
+from simpl import routing
+from simpl.middleware import metrics
 from simpl.utils import cli as cli_utils
 
 LOG = logging.getLogger(__name__)
@@ -90,6 +100,82 @@ OPTIONS = [
         default=1,
         group='Server Options',
     ),
+    config.Option(
+        '--workers', '-w',
+        help=_fill(
+            'Number of worker processes. With more than one, the socket is '
+            'bound once and shared by forked workers which are restarted if '
+            'they die. Send SIGHUP to reload the workers. Supported by the '
+            'xeventlet, xtornado and xasyncio adapters. Implies '
+            '--no-reloader.'),
+        type=int,
+        default=1,
+        group='Server Options',
+    ),
+    config.Option(
+        '--metrics',
+        default=False,
+        action='store_true',
+        help=_fill(
+            'Record request counts, latencies and in-flight requests per '
+            'route and serve them in the Prometheus text format on '
+            '/_simpl/metrics.'),
+        group='Server Options',
+    ),
+    config.Option(
+        '--fast-routes',
+        default=False,
+        action='store_true',
+        help=_fill(
+            'Match requests to routes with a prebuilt hash table and trie '
+            'instead of bottle\'s regular expressions. With --debug, the '
+            'match cost of each route is logged on shutdown.'),
+        group='Server Options',
+    ),
+    config.Option(
+        '--max-greenthreads',
+        help=_fill(
+            'Maximum number of requests xeventlet handles concurrently (the '
+            'size of its GreenPool). Default: 1024.'),
+        type=int,
+        group='Server Options',
+    ),
+    config.Option(
+        '--keepalive-timeout',
+        help=_fill(
+            'Seconds an idle keep-alive connection is kept open waiting for '
+            'the next request. 0 disables keep-alive. Used by the xeventlet '
+            'and xasyncio adapters.'),
+        type=float,
+        group='Server Options',
+    ),
+    config.Option(
+        '--socket-timeout',
+        help=_fill(
+            'Seconds a client socket may block on reads or writes before '
+            'the connection is dropped. Used by the xeventlet adapter.'),
+        type=float,
+        group='Server Options',
+    ),
+    config.Option(
+        '--backlog',
+        help=_fill(
+            'Maximum number of connections queued by the listening socket. '
+            'Used by the xeventlet and xasyncio adapters.'),
+        type=int,
+        group='Server Options',
+    ),
+    config.Option(
+        '--reuse-port',
+        default=None,
+        action='store_true',
+        help=_fill(
+            'With --workers, have each worker bind its own listening socket '
+            'with SO_REUSEPORT instead of sharing one, so the kernel '
+            'balances connections across workers. Supported by the '
+            'xeventlet adapter on Linux 3.9+ and BSDs.'),
+        group='Server Options',
+    ),
     config.Option(
         '--adapter-options', '-o',
         help=(
@@ -104,12 +190,335 @@ OPTIONS = [
     ),
 ]
 
-CONFIG = config.Config(
-    prog='simpl_server',
-    options=OPTIONS,
-    argparser_class=cli_utils.HelpfulParser,
-    formatter_class=cli_utils.SimplHelpFormatter
-)
+#: Default seconds in-flight requests are given to finish on shutdown
+GRACEFUL_TIMEOUT = 30
+#: Signals that trigger a graceful shutdown of the xeventlet and xtornado
+#: adapters
+STOP_SIGNALS = ('SIGTERM', 'SIGINT')
+#: Callables run (in order) after the server stops, see `on_shutdown`
+SHUTDOWN_HOOKS = []
+#: Server options passed on to the adapter (when set) as adapter options
+TUNING_OPTIONS = ('max_greenthreads', 'keepalive_timeout', 'socket_timeout',
+                  'backlog', 'reuse_port')
+#: Default size of the xeventlet GreenPool (same as eventlet's)
+DEFAULT_MAX_GREENTHREADS = 1024
+
+_CONFIG = None
+
+
+def get_config():
+    """Return the `simpl server` configuration, building it once."""
+    global _CONFIG  # pylint: disable=W0603
+    if _CONFIG is None:
+        _CONFIG = config.Config(
+            prog='simpl_server',
+            options=OPTIONS,
+            argparser_class=cli_utils.HelpfulParser,
+            formatter_class=cli_utils.SimplHelpFormatter
+        )
+    return _CONFIG
+
+
+class _LazyConfig(collections.MutableMapping):
+
+    """Stands in for the server configuration until it is first used.
+
+    Building a :class:`simpl.config.Config` parses sys.argv for the meta
+    config, so it is not done on import. Item and attribute access are
+    passed on to the configuration returned by `get_config`.
+    """
+
+    def __getitem__(self, key):
+        """Get item from config."""
+        return get_config()[key]
+
+    def __setitem__(self, key, value):
+        """Set item in config."""
+        get_config()[key] = value
+
+    def __delitem__(self, key):
+        """Delete item from config."""
+        del get_config()[key]
+
+    def __iter__(self):
+        """Iterate config."""
+        return iter(get_config())
+
+    def __len__(self):
+        """Check number of config options."""
+        return len(get_config())
+
+    def __getattr__(self, attr):
+        """Get attribute from config."""
+        return getattr(get_config(), attr)
+
+    def __setattr__(self, attr, value):
+        """Set attribute on config."""
+        setattr(get_config(), attr, value)
+
+    def __repr__(self):
+        """Show the config."""
+        return repr(get_config())
+
+
+#: The `simpl server` configuration. Built on first use, see `get_config`.
+CONFIG = _LazyConfig()
+
+
+def on_shutdown(func):
+    """Register a callable to run when the server shuts down gracefully.
+
+    Hooks run after in-flight requests have drained (or the graceful timeout
+    expired), in the order they were registered. Use for app-level cleanup,
+    ex. closing database clients::
+
+        db = SimplDB(url)
+        server.on_shutdown(db.close)
+
+    Can also be used as a decorator. Returns `func`.
+    """
+    SHUTDOWN_HOOKS.append(func)
+    return func
+
+
+def run_shutdown_hooks():
+    """Run the registered shutdown hooks, logging (not raising) failures."""
+    for hook in SHUTDOWN_HOOKS:
+        try:
+            hook()
+        except Exception:  # pylint: disable=broad-except
+            LOG.exception("Error in shutdown hook %r", hook)
+
+
+def _install_stop_handler(callback):
+    """Call `callback` (once) when a stop signal is received."""
+    state = {}
+
+    def handler(signum, frame):  # pylint: disable=W0613
+        """Start shutting down on the first signal only."""
+        if state.get('stopping'):
+            LOG.info("Already shutting down (signal %s)", signum)
+            return
+        state['stopping'] = True
+        callback(signum)
+
+    for name in STOP_SIGNALS:
+        try:
+            signal.signal(getattr(signal, name), handler)
+        except ValueError:
+            # not in the main thread (ex. embedded). Stay killable.
+            LOG.debug("Cannot handle %s outside the main thread", name)
+
+
+class _DrainTimeout(Exception):
+
+    """Raised in the eventlet server when draining takes too long."""
+
+
+class InFlightCounter(object):  # pylint: disable=R0903
+
+    """WSGI wrapper keeping count of requests being handled."""
+
+    def __init__(self, app):
+        """Wrap `app`."""
+        self.app = app
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        """Count the request until its response iterable is closed."""
+        with self.lock:
+            self.active += 1
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            self.done()
+            raise
+        return _CountedResponse(result, self.done)
+
+    def done(self):
+        """Mark a request as finished."""
+        with self.lock:
+            self.active -= 1
+
+
+class _CountedResponse(object):  # pylint: disable=R0903
+
+    """Response iterable that calls back when closed."""
+
+    def __init__(self, result, callback):
+        """Wrap a WSGI response iterable."""
+        self.result = result
+        self.callback = callback
+
+    def __iter__(self):
+        """Iterate over the wrapped response."""
+        return iter(self.result)
+
+    def close(self):
+        """Close the wrapped response and call back (once)."""
+        try:
+            if hasattr(self.result, 'close'):
+                self.result.close()
+        finally:
+            callback, self.callback = self.callback, None
+            if callback:
+                callback()
+
+
+def _original(module):
+    """Return the module, unpatched if eventlet has monkey patched it."""
+    patcher = sys.modules.get('eventlet.patcher')
+    if patcher and patcher.is_monkey_patched(module):
+        return patcher.original(module)
+    return __import__(module)
+
+
+class BufferedAccessLog(object):
+
+    """File-like access log that batches writes on a background thread.
+
+    `write()` only appends the line to an in-memory queue, so requests never
+    wait on file I/O or locks. A writer thread (a real OS thread, even when
+    eventlet has monkey patched threading) flushes the queue to `stream`
+    when `flush_lines` lines are waiting or every `flush_interval` seconds.
+
+    If more than `max_queue` lines are waiting (the disk can't keep up), new
+    lines are dropped and counted in `dropped` instead of blocking. The
+    number of lines dropped is also logged as a warning once there is room
+    in the queue again.
+
+    The writer thread only writes to `stream` (ex. a file): it doesn't log,
+    as logging handlers may hold locks eventlet made green. Its errors are
+    logged by the next `write()` or `flush()` call instead.
+
+    With `fmt='json'`, eventlet (apache-style) lines are written as JSON
+    objects with `client_ip`, `time`, `method`, `path`, `protocol`,
+    `status`, `bytes` and `duration` keys. Other lines are written as
+    `{"message": line}`.
+
+    Example usage:
+
+        access_log = server.BufferedAccessLog(open('access.log', 'a'),
+                                              fmt='json')
+        server.on_shutdown(access_log.close)
+        bottle.run(server='xeventlet', log=server.EventletLogFilter(
+            LOG, access_log=access_log, log_requests=False))
+    """
+
+    #: Parses eventlet.wsgi's default log format
+    line_regex = re.compile(
+        r'(?P<client_ip>\S+) - \S+ \[(?P<time>[^\]]+)\] '
+        r'"(?P<method>\S+) (?P<path>\S+) (?P<protocol>[^"]+)" '
+        r'(?P<status>\d+) (?P<bytes>\d+|-) (?P<duration>[\d.]+)')
+
+    def __init__(self, stream, fmt='text', max_queue=10000, flush_lines=100,
+                 flush_interval=1.0):
+        """Start the writer thread.
+
+        :param stream: file-like object lines are written to.
+        :keyword fmt: 'text' (lines as received) or 'json'.
+        :keyword max_queue: lines held in memory before dropping new ones.
+        :keyword flush_lines: write as soon as this many lines are waiting.
+        :keyword flush_interval: maximum seconds a line waits.
+        """
+        if fmt not in ('text', 'json'):
+            raise ValueError("Access log format must be 'text' or 'json'")
+        self.stream = stream
+        self.fmt = fmt
+        self.max_queue = max_queue
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.queue = collections.deque()
+        self.dropped = 0
+        self.written = 0
+        self._reported_drops = 0
+        self._error = None
+        threads = _original('threading')
+        self._wake = threads.Event()
+        self._closed = False
+        self._thread = threads.Thread(target=self._run,
+                                      name='access-log-writer')
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, text):
+        """Queue a line (never blocks)."""
+        if self._closed:
+            return
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        if self._error is not None or self.dropped != self._reported_drops:
+            self._report()
+        self.queue.append(text)
+        if len(self.queue) >= self.flush_lines:
+            self._wake.set()
+
+    def flush(self):
+        """Write out everything queued so far (in the calling thread)."""
+        self._write()
+        self._report()
+
+    def _write(self):
+        """Write the queued lines to the stream (without logging)."""
+        lines = []
+        while True:
+            try:
+                lines.append(self.queue.popleft())
+            except IndexError:
+                break
+        if lines:
+            if self.fmt == 'json':
+                lines = [self.format_json(line) for line in lines]
+            self.stream.write(''.join(lines))
+            self.stream.flush()
+            self.written += len(lines)
+
+    def _report(self):
+        """Log writer errors and dropped lines since the last report."""
+        error, self._error = self._error, None
+        if error is not None:
+            LOG.error("Error writing access log: %s", error)
+        dropped = self.dropped
+        if dropped != self._reported_drops:
+            LOG.warning("Access log queue full: dropped %d line(s)",
+                        dropped - self._reported_drops)
+            self._reported_drops = dropped
+
+    def format_json(self, text):
+        """Return a line as a JSON object (with trailing newline)."""
+        text = text.rstrip('\n')
+        match = self.line_regex.match(text)
+        if match:
+            entry = match.groupdict()
+            entry['status'] = int(entry['status'])
+            entry['bytes'] = (int(entry['bytes'])
+                              if entry['bytes'] != '-' else None)
+            entry['duration'] = float(entry['duration'])
+        else:
+            entry = {'message': text}
+        return json.dumps(entry, sort_keys=True) + '\n'
+
+    def close(self):
+        """Stop the writer thread and write out what is left."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(self.flush_interval + 5)
+        self.flush()
+
+    def _run(self):
+        """Writer thread loop (raw writes only, see the class docs)."""
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self._write()
+            except Exception as exc:  # pylint: disable=broad-except
+                self._error = exc
 
 
 class EventletLogFilter(object):  # pylint: disable=R0903
@@ -130,17 +539,24 @@ class EventletLogFilter(object):  # pylint: disable=R0903
 
     An instance of this class can be passed in to a bottle.run command using
     the `log` keyword.
+
+    Under load, use a :class:`BufferedAccessLog` as the access_log and
+    `log_requests=False` so requests don't wait on file I/O and logging
+    locks.
     """
 
-    def __init__(self, log, access_log=None):
+    def __init__(self, log, access_log=None, log_requests=True):
         """Initialize with config and optional access_log.
 
         :param log: logger instance (ex. logging.getLogger()).
         :keyword access_log: a file handle to an access log that should receive
-            apache-style entries for each call and response.
+            apache-style entries for each call and response (ex. a
+            :class:`BufferedAccessLog`).
+        :keyword log_requests: also log each entry at INFO level.
         """
         self.log = log
         self.access_log = access_log
+        self.log_requests = log_requests
 
     def write(self, text):
         """Write to appropriate target."""
@@ -151,7 +567,87 @@ class EventletLogFilter(object):  # pylint: disable=R0903
                 return
             if self.access_log:
                 self.access_log.write(text)
-            self.log.info(text[:-1])
+            if self.log_requests:
+                self.log.info(text[:-1])
+
+
+def _tracking_protocol(base, idle_timeout=None):
+    """Subclass eventlet.wsgi protocol `base` to track its connections.
+
+    With `idle_timeout`, a keep-alive connection waiting longer than that
+    many seconds for its next request is closed. (eventlet 0.17 only reads
+    its `keepalive` argument as on/off, so this is enforced here.)
+
+    Calling `drain()` on the class shuts down the connections waiting for a
+    request and makes the others close after their current response (with
+    `Connection: close`). eventlet.wsgi.server only waits for connections
+    when it stops, so without this an idle keep-alive client holds up the
+    shutdown until the graceful timeout.
+    """
+    import eventlet
+    from eventlet import greenio
+
+    class TrackingProtocol(base):  # pylint: disable=W0232
+
+        """eventlet.wsgi protocol keeping track of open connections."""
+
+        connections = set()
+        draining = False
+        keepalive_timeout = idle_timeout
+
+        def setup(self):
+            """Register the connection (idle until a request arrives)."""
+            base.setup(self)
+            self.idle = True
+            self.idle_timer = None
+            self.requests = 0
+            self.connections.add(self)
+
+        def finish(self):
+            """Forget the connection."""
+            self.connections.discard(self)
+            base.finish(self)
+
+        def handle_one_request(self):
+            """Wait for and handle the next request (unless draining)."""
+            if self.requests and self.draining:
+                self.close_connection = 1
+                return
+            self.idle = True
+            if not (self.requests and self.keepalive_timeout):
+                base.handle_one_request(self)
+                return
+            # cancelled by parse_request once the request line is read
+            timer = self.idle_timer = eventlet.Timeout(self.keepalive_timeout)
+            try:
+                base.handle_one_request(self)
+            except eventlet.Timeout as exc:
+                if exc is not timer:
+                    raise
+                self.close_connection = 1  # idle for too long
+            finally:
+                timer.cancel()
+
+        def parse_request(self):
+            """Mark the connection busy once a request line was read."""
+            self.idle = False
+            self.requests += 1
+            if self.idle_timer is not None:
+                self.idle_timer.cancel()
+            result = base.parse_request(self)
+            if self.draining:
+                self.close_connection = 1
+            return result
+
+        @classmethod
+        def drain(cls):
+            """Close idle connections, and the others after their request."""
+            cls.draining = True
+            for protocol in list(cls.connections):
+                if protocol.idle:
+                    greenio.shutdown_safe(protocol.connection)
+
+    return TrackingProtocol
 
 
 class XEventletServer(bottle.ServerAdapter):
@@ -165,6 +661,19 @@ class XEventletServer(bottle.ServerAdapter):
       value is system-dependent.
     * `family`: (default is 2) socket family, optional. See socket
       documentation for available families.
+    * `max_greenthreads`: (default 1024) size of the GreenPool, i.e. the
+      maximum number of requests handled concurrently.
+    * `keepalive_timeout`: seconds idle keep-alive connections are kept
+      open. 0 disables keep-alive.
+    * `socket_timeout`: seconds client sockets may block before the
+      connection is dropped.
+    * `shared_socket`: an already listening socket to serve on (ex. one
+      bound by the master process in `--workers` mode).
+    * `reuse_port`: bind the listening socket with SO_REUSEPORT, so several
+      processes can each have their own listener on the same port and the
+      kernel balances connections between them (see `--reuse-port`).
+    * `graceful_timeout`: (default 30) seconds in-flight requests are given
+      to finish after SIGTERM or SIGINT. See below.
     * `**kwargs`: directly map to python's ssl.wrap_socket arguments from
       https://docs.python.org/2/library/ssl.html#ssl.wrap_socket and
       wsgi.server arguments from
@@ -179,8 +688,16 @@ class XEventletServer(bottle.ServerAdapter):
       test.crt
 
       bottle.run(server='eventlet', keyfile='test.key', certfile='test.crt')
+
+    On SIGTERM or SIGINT the server stops accepting connections, closes idle
+    keep-alive connections, lets in-flight requests finish (closing their
+    connections afterwards) for up to `graceful_timeout` seconds, runs the
+    `on_shutdown` hooks and returns.
     """
 
+    supports_prefork = True
+    supports_reuse_port = True
+
     def get_socket(self):
         """Create listener socket based on bottle server parameters."""
         import eventlet
@@ -189,7 +706,8 @@ class XEventletServer(bottle.ServerAdapter):
         socket_args = {}
         for arg in ('backlog', 'family'):
             try:
-                socket_args[arg] = self.options.pop(arg)
+                # may be strings from --adapter-options
+                socket_args[arg] = int(self.options.pop(arg))
             except KeyError:
                 pass
         # Separate out wrap_ssl arguments
@@ -202,18 +720,42 @@ class XEventletServer(bottle.ServerAdapter):
             except KeyError:
                 pass
         address = (self.host, self.port)
-        try:
-            sock = eventlet.listen(address, **socket_args)
-        except TypeError:
-            # Fallback, if we have old version of eventlet
-            sock = eventlet.listen(address)
+        if _truthy(self.options.pop('reuse_port', False)):
+            sock = self._reuse_port_socket(address, **socket_args)
+        else:
+            try:
+                sock = eventlet.listen(address, **socket_args)
+            except TypeError:
+                # Fallback, if we have old version of eventlet
+                sock = eventlet.listen(address)
         if ssl_args:
             sock = eventlet.wrap_ssl(sock, **ssl_args)
         return sock
 
+    @staticmethod
+    def _reuse_port_socket(address, backlog=50, family=socket.AF_INET):
+        """Bind a listener with SO_REUSEPORT set.
+
+        Several processes can each bind one of these to the same address and
+        the kernel load-balances new connections between them.
+        """
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise RuntimeError("SO_REUSEPORT is not supported on this "
+                               "platform")
+        from eventlet.green import socket as green_socket
+        sock = green_socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(address)
+        sock.listen(backlog)
+        return sock
+
     def run(self, handler):
         """Start bottle server."""
+        import eventlet.hubs
         import eventlet.patcher
+        import eventlet.wsgi
+        import greenlet
         if not eventlet.patcher.is_monkey_patched(os):
             msg = ("%s requires eventlet.monkey_patch() (before "
                    "import)" % self.__class__.__name__)
@@ -232,10 +774,67 @@ class XEventletServer(bottle.ServerAdapter):
                 pass
         if 'log_output' not in wsgi_args:
             wsgi_args['log_output'] = not self.quiet
+        max_greenthreads = self.options.pop('max_greenthreads', None)
+        if 'custom_pool' not in wsgi_args:
+            size = (max_greenthreads or wsgi_args.pop('max_size', None) or
+                    DEFAULT_MAX_GREENTHREADS)
+            wsgi_args['custom_pool'] = eventlet.GreenPool(int(size))
+        pool = wsgi_args['custom_pool']
+        keepalive_timeout = self.options.pop('keepalive_timeout', None)
+        if keepalive_timeout is not None and 'keepalive' not in wsgi_args:
+            keepalive_timeout = float(keepalive_timeout)
+            wsgi_args['keepalive'] = bool(keepalive_timeout)
+        else:
+            keepalive_timeout = None
+        protocol = wsgi_args['protocol'] = _tracking_protocol(
+            wsgi_args.get('protocol') or eventlet.wsgi.HttpProtocol,
+            idle_timeout=keepalive_timeout)
+        if wsgi_args.get('socket_timeout') is not None:
+            wsgi_args['socket_timeout'] = float(wsgi_args['socket_timeout'])
+        timeout = float(self.options.pop('graceful_timeout',
+                                         GRACEFUL_TIMEOUT))
 
-        import eventlet.wsgi
         sock = self.options.pop('shared_socket', None) or self.get_socket()
-        eventlet.wsgi.server(sock, handler, **wsgi_args)
+        server_thread = greenlet.getcurrent()
+        hub = eventlet.hubs.get_hub()
+        timers = []
+
+        # The signal handler runs while the hub waits on its sockets, and
+        # that wait is resumed afterwards (PEP 475), so an idle server would
+        # not see the calls scheduled below until its next event. Writing
+        # to this pipe is that event.
+        real_os = eventlet.patcher.original('os')
+        wake_out, wake_in = real_os.pipe()
+        wakeup = hub.add(hub.READ, wake_out,
+                         lambda fileno: real_os.read(fileno, 64),
+                         lambda *args: None, lambda: None)
+
+        def stop(signum):
+            """Make eventlet.wsgi.server stop accepting and drain."""
+            LOG.info("Received signal %s, draining %s request(s) (timeout "
+                     "%ss)", signum, pool.running(), timeout)
+            # wsgi.server stops accepting on SystemExit and waits for its
+            # connections, so close the idle ones (the others close after
+            # their response) first
+            hub.schedule_call_global(0, protocol.drain)
+            hub.schedule_call_global(0, server_thread.throw, SystemExit)
+            timers.append(hub.schedule_call_global(
+                timeout, server_thread.throw, _DrainTimeout))
+            real_os.write(wake_in, b'.')
+
+        _install_stop_handler(stop)
+        try:
+            eventlet.wsgi.server(sock, handler, **wsgi_args)
+        except _DrainTimeout:
+            LOG.warning("Graceful timeout expired with %s request(s) still "
+                        "in flight", pool.running())
+        finally:
+            for timer in timers:
+                timer.cancel()
+            hub.remove(wakeup)
+            real_os.close(wake_out)
+            real_os.close(wake_in)
+        run_shutdown_hooks()
 
     def __repr__(self):
         """Show class name, even if subclassed."""
@@ -244,30 +843,317 @@ class XEventletServer(bottle.ServerAdapter):
 bottle.server_names['xeventlet'] = XEventletServer
 
 
+class ThreadPoolWSGIContainer(object):
+
+    """Tornado request callback running WSGI calls in a pool of threads.
+
+    Unlike `tornado.wsgi.WSGIContainer`, which calls the app on the IOLoop
+    thread (so one slow request stalls every connection), this hands each
+    request to one of `threads` worker threads. Accepting, reading requests,
+    keep-alive and writing responses stay on the IOLoop.
+
+    Requests waiting for a thread are queued. When `max_queue` requests are
+    already waiting, new ones are rejected right away with `reject_status`
+    (and a `Retry-After` header) instead of piling up.
+    """
+
+    def __init__(self, wsgi_application, threads=10, max_queue=100,
+                 reject_status=503, retry_after=1):
+        """Start the worker threads.
+
+        :param wsgi_application: the WSGI app.
+        :keyword threads: number of worker threads.
+        :keyword max_queue: maximum number of requests waiting for a thread.
+            0 queues without limit.
+        :keyword reject_status: HTTP status returned when the queue is full.
+        :keyword retry_after: seconds sent in the `Retry-After` header of
+            rejected requests. None or 0 to not send it.
+        """
+        import tornado.wsgi
+        self.app = wsgi_application
+        self.reject_status = reject_status
+        self.retry_after = retry_after
+        self.queue = six.moves.queue.Queue(max_queue)
+        #: requests accepted and not yet answered (queued or running)
+        self.active = 0
+        self.rejected = 0
+        self._environ = tornado.wsgi.WSGIContainer(wsgi_application).environ
+        self.workers = []
+        for number in range(threads):
+            worker = threading.Thread(target=self._work,
+                                      name='wsgi-worker-%d' % number)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def __call__(self, request):
+        """Queue the request for a worker (runs on the IOLoop)."""
+        import tornado.ioloop
+        environ = self._environ(request)
+        environ['wsgi.multithread'] = True
+        try:
+            self.queue.put_nowait((request, environ,
+                                   tornado.ioloop.IOLoop.current()))
+        except six.moves.queue.Full:
+            self.rejected += 1
+            self._reject(request)
+            return
+        self.active += 1
+
+    def stop(self):
+        """Let the worker threads exit once the queue is empty."""
+        for _ in self.workers:
+            self.queue.put(None)
+
+    def _work(self):
+        """Worker thread loop."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            request, environ, io_loop = item
+            try:
+                response = self._call(environ)
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception("Error running WSGI app for %s %s",
+                              request.method, request.uri)
+                response = ('500 Internal Server Error',
+                            [('Content-Type', 'text/plain')],
+                            b'Internal Server Error')
+            io_loop.add_callback(self._finish, request, *response)
+
+    def _call(self, environ):
+        """Call the app. Returns (status, headers, body)."""
+        data = {}
+        body = []
+
+        def start_response(status, headers, exc_info=None):
+            """Record the response."""
+            if exc_info and data.get('sent'):
+                six.reraise(*exc_info)
+            data['status'] = status
+            data['headers'] = headers
+            return body.append
+
+        result = self.app(environ, start_response)
+        try:
+            for chunk in result:
+                body.append(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        if 'status' not in data:
+            raise RuntimeError("WSGI app did not call start_response")
+        return data['status'], data['headers'], b''.join(body)
+
+    def _finish(self, request, status, headers, body):
+        """Write the response (runs on the IOLoop)."""
+        self.active -= 1
+        self._write(request, status, headers, body)
+
+    def _reject(self, request):
+        """Answer right away with the rejection status."""
+        reason = bottle.HTTP_CODES.get(self.reject_status, 'Unavailable')
+        body = json.dumps({
+            'code': self.reject_status,
+            'message': 'Server is busy. Try again later.',
+            'reason': reason,
+        }).encode('utf-8')
+        headers = [('Content-Type', 'application/json')]
+        if self.retry_after:
+            headers.append(('Retry-After', str(self.retry_after)))
+        LOG.warning("Rejected %s %s: %d requests queued", request.method,
+                    request.uri, self.queue.qsize())
+        self._write(request, '%d %s' % (self.reject_status, reason),
+                    headers, body)
+
+    @staticmethod
+    def _write(request, status, headers, body):
+        """Write a complete response, as tornado's WSGIContainer does."""
+        import tornado
+        import tornado.httputil
+        code, reason = status.split(' ', 1)
+        code = int(code)
+        names = set(name.lower() for name, _ in headers)
+        headers = list(headers)
+        if code != 304:
+            if 'content-length' not in names:
+                headers.append(('Content-Length', str(len(body))))
+            if 'content-type' not in names:
+                headers.append(('Content-Type', 'text/html; charset=UTF-8'))
+        if 'server' not in names:
+            headers.append(('Server', 'TornadoServer/%s' % tornado.version))
+        header_obj = tornado.httputil.HTTPHeaders()
+        for name, value in headers:
+            header_obj.add(name, value)
+        start_line = tornado.httputil.ResponseStartLine('HTTP/1.1', code,
+                                                        reason)
+        request.connection.write_headers(start_line, header_obj, chunk=body)
+        request.connection.finish()
+
+
 class XTornadoServer(bottle.ServerAdapter):  # pylint: disable=R0903
 
-    """The Tornado Server Adapter with xheaders enabled."""
+    """The Tornado Server Adapter with xheaders enabled.
+
+    Accepts additional parameters:
+
+    * `shared_socket`: an already listening socket to serve on (ex. one
+      bound by the master process in `--workers` mode).
+    * `graceful_timeout`: (default 30) seconds in-flight requests are given
+      to finish after SIGTERM or SIGINT.
+    * `threads`: (default 0) when set, WSGI calls run in a pool of this many
+      threads instead of on the IOLoop, so a slow request does not stall
+      other connections. See :class:`ThreadPoolWSGIContainer`.
+    * `max_queue`: (default 100) with `threads`, the maximum number of
+      requests waiting for a thread. 0 queues without limit.
+    * `reject_status`: (default 503) with `threads`, the status returned
+      when the queue is full.
+    * `retry_after`: (default 1) with `threads`, the `Retry-After` header
+      (seconds) sent with rejections. 0 to not send it.
+
+    On SIGTERM or SIGINT the server stops accepting connections, waits for
+    in-flight requests to finish (for up to `graceful_timeout` seconds),
+    closes the remaining (keep-alive) connections, runs the `on_shutdown`
+    hooks and returns.
+
+    Example::
+
+      simpl server -s xtornado -o threads=16 max_queue=64
+    """
+
+    supports_prefork = True
 
     def run(self, handler):
         """Start up the server."""
+        import tornado.gen
         import tornado.httpserver
         import tornado.ioloop
         import tornado.wsgi
-        container = tornado.wsgi.WSGIContainer(handler)
+        timeout = float(self.options.pop('graceful_timeout',
+                                         GRACEFUL_TIMEOUT))
+        threads = int(self.options.pop('threads', 0))
+        pool_options = {}
+        for arg in ('max_queue', 'reject_status', 'retry_after'):
+            if arg in self.options:
+                pool_options[arg] = int(self.options.pop(arg))
+        if threads:
+            # counts queued and running requests
+            container = counter = ThreadPoolWSGIContainer(
+                handler, threads=threads, **pool_options)
+        else:
+            counter = InFlightCounter(handler)
+            container = tornado.wsgi.WSGIContainer(counter)
         server = tornado.httpserver.HTTPServer(container, xheaders=True)
-        server.listen(port=self.port, address=self.host)
-        tornado.ioloop.IOLoop.instance().start()
+        sock = self.options.pop('shared_socket', None)
+        if sock is not None:
+            sock.setblocking(False)
+            server.add_sockets([sock])
+        else:
+            server.listen(port=self.port, address=self.host)
+        io_loop = tornado.ioloop.IOLoop.instance()
+
+        def drain(deadline):
+            """Wait for in-flight requests, then close connections."""
+            if counter.active and io_loop.time() < deadline:
+                io_loop.call_later(0.05, drain, deadline)
+                return
+            if counter.active:
+                LOG.warning("Graceful timeout expired with %s request(s) "
+                            "still in flight", counter.active)
+            closing = tornado.gen.convert_yielded(
+                server.close_all_connections())
+            io_loop.add_future(closing, lambda _: io_loop.stop())
+            # don't let a stuck connection hold up the exit
+            io_loop.call_later(1, io_loop.stop)
+
+        def stop(signum):
+            """Stop accepting and start draining (on the IOLoop)."""
+            LOG.info("Received signal %s, draining %s request(s) (timeout "
+                     "%ss)", signum, counter.active, timeout)
+
+            def begin():
+                """Runs on the IOLoop."""
+                server.stop()
+                drain(io_loop.time() + timeout)
+            io_loop.add_callback_from_signal(begin)
+
+        _install_stop_handler(stop)
+        io_loop.start()
+        if threads:
+            container.stop()
+        run_shutdown_hooks()
 
 bottle.server_names['xtornado'] = XTornadoServer
 
 
+class XAsyncioServer(bottle.ServerAdapter):  # pylint: disable=R0903
+
+    """Asyncio HTTP server running the WSGI app in a thread pool.
+
+    Connections are accepted, read and kept alive on an asyncio event loop;
+    only the WSGI calls run in worker threads, so a slow request does not
+    hold up other connections. See :mod:`simpl.aioserver`. Requires Python
+    3.5+.
+
+    Accepts additional parameters (all optional):
+
+    * `threads`: (default 10) number of worker threads.
+    * `backlog`: (default 1024) maximum number of queued connections.
+    * `keepalive_timeout`: (default 5) seconds idle keep-alive connections
+      are kept open. 0 disables keep-alive.
+    * `request_timeout`: (default 30) seconds clients have to send a
+      request (line, headers and body) before getting a 408.
+    * `max_body`: (default 10MiB) request bodies larger than this many
+      bytes get a 413.
+    * `graceful_timeout`: (default 30) seconds in-flight requests are given
+      to finish after SIGTERM or SIGINT, before `on_shutdown` hooks run.
+    * `shared_socket`: an already listening socket to serve on (ex. one
+      bound by the master process in `--workers` mode).
+
+    Example::
+
+      simpl server -s xasyncio -o threads=32 keepalive_timeout=15
+    """
+
+    supports_prefork = True
+
+    def run(self, handler):
+        """Start up the server."""
+        from simpl import aioserver
+        timeout = float(self.options.pop('graceful_timeout',
+                                         GRACEFUL_TIMEOUT))
+        sock = self.options.pop('shared_socket', None)
+        server = aioserver.WSGIServer(
+            handler,
+            threads=int(self.options.pop('threads', 10)),
+            backlog=int(self.options.pop('backlog', 1024)),
+            keepalive_timeout=float(self.options.pop('keepalive_timeout',
+                                                     5)),
+            request_timeout=float(self.options.pop('request_timeout', 30)),
+            max_body=int(self.options.pop('max_body', aioserver.MAX_BODY)),
+            access_log=not self.quiet)
+
+        def stop(signum):
+            """Drain and stop the server."""
+            LOG.info("Received signal %s, shutting down (timeout %ss)",
+                     signum, timeout)
+            server.stop(timeout)
+
+        _install_stop_handler(stop)
+        server.run(self.host, self.port, sock=sock)
+        run_shutdown_hooks()
+
+bottle.server_names['xasyncio'] = XAsyncioServer
+
+
 def attach_parser(subparser):
     """Given a subparser, build and return the server parser."""
     return subparser.add_parser(
         'server',
         help='Run a bottle based server',
         parents=[
-            CONFIG.build_parser(
+            get_config().build_parser(
                 add_help=False,
                 # might need conflict_handler
             ),
@@ -353,6 +1239,15 @@ def build_application(conf):
     bottle_app = _find_bottle_app(conf.app)
     bottle_app.route(
         path='/_simpl', method='GET', callback=_version_callback)
+    if conf.get('metrics'):
+        conf['app'] = metrics.MetricsMiddleware(conf.app)
+        bottle_app.route(path='/_simpl/metrics', method='GET',
+                         callback=conf.app.metrics_callback)
+    if conf.get('fast_routes'):
+        table = routing.accelerate(bottle_app, debug=bool(conf.debug))
+        if table.debug:
+            on_shutdown(lambda: LOG.info("Route match cost:\n%s",
+                                         table.report()))
 
     def _show_routes():
         """Conditionally print the app's routes."""
@@ -378,8 +1273,13 @@ def run(conf, build_app=True):
     configured your application (conf.app) already, set build_app
     to false.
 
+    If conf.workers is more than one, the server runs in pre-fork mode
+    (see :func:`run_prefork`).
+
     Expects configuration options defined in server.OPTIONS
     """
+    if (conf.get('workers') or 1) > 1:
+        return run_prefork(conf, build_app=build_app)
     if build_app:
         # The following sets conf.app
         build_application(conf)
@@ -395,14 +1295,104 @@ def run(conf, build_app=True):
         reloader=conf.reloader,
         quiet=conf.quiet,
         debug=conf.debug,
-        **conf.adapter_options
+        **_adapter_options(conf)
     )
 
 
+def run_prefork(conf, build_app=True):
+    """Run conf.workers server processes sharing one listening socket.
+
+    The socket is bound once in this (master) process, which then forks the
+    workers and supervises them using :class:`simpl.prefork.Arbiter`.
+
+    With the `reuse_port` option (`--reuse-port`), nothing is bound in the
+    master: each worker binds its own listener with SO_REUSEPORT and the
+    kernel spreads connections across them, which avoids all workers
+    contending to accept on one socket.
+
+    The application is built in each worker, after the fork, so the master
+    never imports it and a reload (SIGHUP) picks up new application code.
+    """
+    adapter = bottle.server_names.get(conf.server, conf.server)
+    if not getattr(adapter, 'supports_prefork', False):
+        raise ValueError(
+            "Server adapter '%s' does not support --workers. Use "
+            "xeventlet, xtornado or xasyncio." % conf.server)
+    if conf.reloader:
+        LOG.info("The auto-reloader is disabled when running with workers.")
+    adapter_options = _adapter_options(conf)
+    reuse_port = _truthy(adapter_options.get('reuse_port', False))
+    if reuse_port and not getattr(adapter, 'supports_reuse_port', False):
+        raise ValueError("Server adapter '%s' does not support reuse_port. "
+                         "Use xeventlet." % conf.server)
+
+    def listen():
+        """Bind the shared socket (with the adapter's options, ex. SSL)."""
+        if hasattr(adapter, 'get_socket'):
+            return adapter(host=conf.host, port=conf.port,
+                           **copy.copy(adapter_options)).get_socket()
+        return prefork.bind_socket(
+            conf.host, conf.port,
+            backlog=int(adapter_options.get('backlog', 1024)))
+
+    def serve(sock):
+        """Build the app and serve on the shared socket."""
+        if build_app:
+            build_application(conf)
+        if conf.app and (os.getcwd() not in sys.path):
+            sys.path.append(os.getcwd())
+        options = _adapter_options(conf)
+        if sock is not None:
+            options['shared_socket'] = sock
+        bottle.run(
+            app=conf.app,
+            server=conf.server,
+            host=conf.host,
+            port=conf.port,
+            reloader=False,
+            quiet=conf.quiet,
+            debug=conf.debug,
+            **options
+        )
+
+    # give workers time to drain before the master kills them
+    graceful_timeout = float(adapter_options.get('graceful_timeout',
+                                                 GRACEFUL_TIMEOUT))
+    arbiter = prefork.Arbiter(serve, conf.workers,
+                              listen=None if reuse_port else listen,
+                              graceful_timeout=graceful_timeout + 5)
+    return arbiter.run()
+
+
+def _truthy(value):
+    """Interpret a (possibly string, from --adapter-options) flag."""
+    if isinstance(value, six.string_types):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def _adapter_options(conf):
+    """Return adapter options as a dict, even before build_application.
+
+    Server options in TUNING_OPTIONS that are set are included, unless also
+    given as adapter options (which win).
+    """
+    options = conf.adapter_options
+    if isinstance(options, list):
+        options = {key: val for _dict in options for key, val in _dict.items()}
+    else:
+        options = copy.copy(options) or {}
+    for name in TUNING_OPTIONS:
+        if conf.get(name) is not None:
+            options.setdefault(name, conf.get(name))
+    return options
+
+
 def main(argv=None):
     """Command line entry point for server, runs based on parsed CONFIG."""
-    CONFIG.parse(argv=argv)
-    return run(CONFIG)
+    conf = get_config()
+    conf.parse(argv=argv)
+    return run(conf)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,122 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+#
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Asyncio shell (subprocess) utilities. Requires Python 3.5+.
+
+Use through :func:`simpl.utils.shell.execute_async`.
+"""
+
+import asyncio
+import locale
+import logging
+import os
+import signal
+import subprocess
+
+from simpl import exceptions
+from simpl.utils import shell
+
+LOG = logging.getLogger(__name__)
+
+#: Bytes read from the process at a time
+CHUNK_SIZE = 65536
+
+
+class _OutputLimit(Exception):
+
+    """The process wrote more than allowed (with what was read)."""
+
+    def __init__(self, output):
+        """Keep the output read so far."""
+        super(_OutputLimit, self).__init__()
+        self.output = output
+
+
+async def _read(stream, max_output):
+    """Read a stream to the end, up to `max_output` bytes."""
+    chunks = []
+    size = 0
+    while True:
+        chunk = await stream.read(CHUNK_SIZE)
+        if not chunk:
+            return b''.join(chunks)
+        size += len(chunk)
+        if max_output is not None and size > max_output:
+            raise _OutputLimit(b''.join(chunks))
+        chunks.append(chunk)
+
+
+async def _communicate(process, max_output):
+    """Return the output of a process once it has exited."""
+    output = await _read(process.stdout, max_output)
+    await process.wait()
+    return output
+
+
+def _kill(process):
+    """Kill a process and the processes it started."""
+    if process.returncode is not None:
+        return
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        pass
+
+
+def _decode(output, strip):
+    """Decode output like `universal_newlines` does."""
+    text = output.decode(locale.getpreferredencoding(False), 'replace')
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text.strip() if strip else text
+
+
+async def execute(command, cwd=None, strip=True, timeout=None,
+                  max_output=None):
+    """Execute a command locally without blocking the event loop.
+
+    See :func:`simpl.utils.shell.execute_async`.
+    """
+    cmd, command = shell._split(command)  # pylint: disable=W0212
+    # a new session, to kill the processes the command starts too
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd,
+        start_new_session=hasattr(os, 'killpg'))
+    try:
+        output = await asyncio.wait_for(_communicate(process, max_output),
+                                        timeout)
+    except asyncio.TimeoutError:
+        LOG.debug("`%s` timed out after %ss", command, timeout)
+        _kill(process)
+        await process.wait()
+        raise exceptions.SimplCalledProcessTimeout(
+            process.returncode, command)
+    except _OutputLimit as exc:
+        LOG.debug("`%s` wrote more than %d bytes", command, max_output)
+        _kill(process)
+        await process.wait()
+        raise exceptions.SimplCalledProcessOutputLimit(
+            process.returncode, command, output=_decode(exc.output, strip))
+    except BaseException:
+        # cancelled (or failed reading): do not leave it running
+        _kill(process)
+        await process.wait()
+        raise
+    output = _decode(output, strip)
+    if process.returncode != 0:
+        raise exceptions.SimplCalledProcessError(
+            process.returncode, command, output=output)
+    return output
@@ -15,9 +15,12 @@
 """Shell (subprocess) utilities."""
 
 import logging
+import os
 import pipes
 import shlex
+import signal
 import subprocess
+import threading
 
 import six
 
@@ -26,7 +29,7 @@ from simpl import exceptions
 LOG = logging.getLogger(__name__)
 
 
-def execute(command, cwd=None, strip=True):
+def execute(command, cwd=None, strip=True, timeout=None):
     """Execute a shell command (containing no shell operators) locally.
 
     If 'command' is a string, it will be split into args to be passed
@@ -51,6 +54,10 @@ def execute(command, cwd=None, strip=True):
                             since it is passed directly to os.chdir() by
                             subprocess.Popen
     :param strip:           Strip the output of whitespace using str.strip()
+    :param timeout:         Seconds after which the command (and any
+                            processes it started) is killed and
+                            SimplCalledProcessTimeout is raised. None to
+                            wait for as long as it takes.
     :returns:               The output of the command (stdout + stderr) if
                             the returncode is zero, otherwise raises
                             SimplCalledProcessError
@@ -59,24 +66,92 @@ def execute(command, cwd=None, strip=True):
     In this function, Popen is called with stderr=subprocess.STDOUT, which
     sends all stderr to stdout.
     """
-    if isinstance(command, six.string_types):
-        cmd = shlex.split(command)
-        LOG.debug("Command after split: %s", cmd)
-    elif isinstance(command, list):
-        cmd = command
-        command = " ".join(cmd)
-    else:
-        raise TypeError("'command' should be a string or a list")
-    LOG.debug("Executing `%s` on local machine", command)
+    cmd, command = _split(command)
     if cwd:
         cwd = pipes.quote(cwd)
+    # with a timeout, run in a new session to kill its children too (they
+    # would keep the output pipe open)
+    new_session = timeout is not None and hasattr(os, 'setsid')
     pope = subprocess.Popen(
         cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd,
-        universal_newlines=True)
-    out, err = pope.communicate()
+        universal_newlines=True, **_new_session_args(new_session))
+    killed = []
+    if timeout is not None:
+        timer = threading.Timer(timeout, _kill,
+                                args=(pope, killed, new_session))
+        timer.daemon = True
+        timer.start()
+    try:
+        out, err = pope.communicate()
+    finally:
+        if timeout is not None:
+            timer.cancel()
     assert not err
     out = out.strip() if strip else out
+    if killed:
+        raise exceptions.SimplCalledProcessTimeout(
+            pope.returncode, command, output=out)
     if pope.returncode != 0:
         raise exceptions.SimplCalledProcessError(
             pope.returncode, command, output=out)
     return out
+
+
+def execute_async(command, cwd=None, strip=True, timeout=None,
+                  max_output=None):
+    """Execute a command like :func:`execute`, in an asyncio subprocess.
+
+    Returns a coroutine (Python 3.5+), so
+
+        output = await shell.execute_async(['git', 'status'])
+
+    does not block the event loop while the command runs. The command
+    (and any processes it started) is killed if the coroutine is
+    cancelled, when 'timeout' seconds have passed (raising
+    SimplCalledProcessTimeout) or when it writes more than 'max_output'
+    bytes (raising SimplCalledProcessOutputLimit).
+    """
+    from simpl.utils import aioshell
+    return aioshell.execute(command, cwd=cwd, strip=strip, timeout=timeout,
+                            max_output=max_output)
+
+
+def _split(command):
+    """Return (args, command string) of a command string or list."""
+    if isinstance(command, six.string_types):
+        cmd = shlex.split(command)
+        LOG.debug("Command after split: %s", cmd)
+    elif isinstance(command, list):
+        cmd = command
+        command = " ".join(cmd)
+    else:
+        raise TypeError("'command' should be a string or a list")
+    LOG.debug("Executing `%s` on local machine", command)
+    return cmd, command
+
+
+def _new_session_args(new_session=True):
+    """Return the Popen arguments to start a process in a new session.
+
+    `preexec_fn` can deadlock the child when other threads are running (as
+    with :func:`simpl.git.run_parallel`), so it is only used on Python 2,
+    which has no `start_new_session`.
+    """
+    if not new_session:
+        return {}
+    if six.PY2:
+        return {'preexec_fn': os.setsid}
+    return {'start_new_session': True}
+
+
+def _kill(process, killed, group=False):
+    """Kill a process that timed out (unless it just exited)."""
+    if process.poll() is None:
+        try:
+            if group:
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except OSError:
+            return
+        killed.append(True)
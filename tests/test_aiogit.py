@@ -0,0 +1,174 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Test :func:`simpl.utils.shell.execute_async` and :mod:`simpl.aiogit`."""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+from simpl import exceptions
+from simpl import git
+from simpl.utils import shell
+from tests.test_git import TestGitBase
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from simpl import aiogit
+else:
+    asyncio = aiogit = None
+
+
+def run(coroutine):
+    """Run a coroutine on a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def run_all(*coroutines):
+    """Run coroutines concurrently on a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        tasks = [loop.create_task(coroutine) for coroutine in coroutines]
+        return loop.run_until_complete(asyncio.gather(*tasks))
+    finally:
+        loop.close()
+
+
+@unittest.skipIf(asyncio is None, "asyncio requires Python 3.5+")
+class TestExecuteAsync(unittest.TestCase):
+
+    def test_output(self):
+        self.assertEqual(run(shell.execute_async(['echo', ' hello '])),
+                         'hello')
+        self.assertEqual(run(shell.execute_async('echo hello', strip=False)),
+                         'hello\n')
+        self.assertEqual(run(shell.execute_async(['pwd'], cwd='/')), '/')
+
+    def test_error(self):
+        with self.assertRaises(exceptions.SimplCalledProcessError) as ctx:
+            run(shell.execute_async(['sh', '-c', 'echo failed; exit 3']))
+        self.assertEqual(ctx.exception.returncode, 3)
+        self.assertEqual(ctx.exception.output, 'failed')
+
+    def test_timeout(self):
+        start = time.time()
+        self.assertRaises(
+            exceptions.SimplCalledProcessTimeout, run,
+            shell.execute_async(['sh', '-c', 'sleep 10 & sleep 10'],
+                                timeout=0.3))
+        self.assertLess(time.time() - start, 5)
+
+    def test_max_output(self):
+        with self.assertRaises(
+                exceptions.SimplCalledProcessOutputLimit) as ctx:
+            run(shell.execute_async(['yes'], max_output=100000))
+        self.assertLessEqual(len(ctx.exception.output), 100000)
+        self.assertEqual(run(shell.execute_async(['echo', 'ok'],
+                                                 max_output=10)), 'ok')
+
+    def test_cancel(self):
+        pidfile = tempfile.NamedTemporaryFile()
+        self.addCleanup(pidfile.close)
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        task = loop.create_task(shell.execute_async(
+            ['sh', '-c', 'echo $$ > %s; exec sleep 10' % pidfile.name]))
+        deadline = time.time() + 5
+        while not os.path.getsize(pidfile.name) and time.time() < deadline:
+            loop.run_until_complete(asyncio.sleep(0.05))
+        with open(pidfile.name) as handle:
+            pid = int(handle.read())
+        task.cancel()
+        self.assertRaises(asyncio.CancelledError, loop.run_until_complete,
+                          task)
+        # killed and already reaped
+        self.assertRaises(OSError, os.kill, pid, 0)
+
+    def test_concurrent(self):
+        start = time.time()
+        run_all(*[shell.execute_async(['sleep', '0.3'])
+                  for _ in range(10)])
+        self.assertLess(time.time() - start, 2)
+
+
+@unittest.skipIf(asyncio is None, "asyncio requires Python 3.5+")
+class TestAsyncGitRepo(TestGitBase):
+
+    def setUp(self):
+        super(TestAsyncGitRepo, self).setUp()
+        with open(os.path.join(self.repo.repo_dir, 'a.txt'), 'w') as handle:
+            handle.write('a')
+        self.repo.commit(message='a file')
+        self.repo.branch('feature')
+        self.repo.tag('v1', message='first release')
+        self.clone = git.GitRepo.clone(self.repo.repo_dir,
+                                       repo_dir=self.create_tempdir())
+
+    def test_same_as_sync(self):
+        calls = [
+            ('status', {}), ('head', {}), ('current_branch', {}),
+            ('list_refs', {}), ('list_branches', {}),
+            ('list_branches', {'records': True}), ('list_tags', {}),
+            ('list_tags', {'with_messages': True, 'records': True}),
+            ('list_config', {}), ('list_remotes', {}), ('ls_tree', {}),
+            ('ls_tree', {'records': True}), ('ls', {}), ('ls_remote', {}),
+            ('remote_resolve_reference', {'ref': 'v1'}),
+            ('resolve_references', {'refs': ['v1', 'feature', 'nope']}),
+        ]
+        for name, kwargs in calls:
+            expected = getattr(self.clone, name)
+            if callable(expected):
+                expected = expected(**kwargs)
+            self.assertEqual(
+                run(getattr(self.clone.aio, name)(**kwargs)), expected, name)
+
+    def test_gather(self):
+        self.assertEqual(run_all(self.clone.aio.list_branches(),
+                                 self.clone.aio.ls_remote()),
+                         [self.clone.list_branches(),
+                          self.clone.ls_remote()])
+
+    def test_version_check_off_the_loop(self):
+        git._VERSION_CHECK['done'] = False
+        self.addCleanup(git._VERSION_CHECK.update, done=True)
+        threads = []
+        with mock.patch.object(git, 'check_git_version',
+                               side_effect=lambda: threads.append(
+                                   threading.current_thread())):
+            run(self.repo.aio.list_config())
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_errors(self):
+        self.assertRaises(exceptions.SimplGitCommandError, run,
+                          self.repo.aio.ls_tree('no-such-tree'))
+        self.assertRaises(exceptions.SimplGitTimeout, run,
+                          aiogit.execute_git_command(['sleep', '10'],
+                                                     timeout=0.2))
+        repo = aiogit.AsyncGitRepo(self.repo, max_output=10)
+        self.assertRaises(exceptions.SimplGitCommandError, run,
+                          repo.ls_tree())
+
+
+if __name__ == '__main__':
+    unittest.main()
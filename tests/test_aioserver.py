@@ -0,0 +1,172 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Test :mod:`simpl.aioserver`."""
+
+import socket
+import sys
+import threading
+import time
+import unittest
+
+import requests
+
+from tests.test_server import get_free_port
+
+if sys.version_info >= (3, 5):
+    from simpl import aioserver
+else:
+    aioserver = None
+
+
+def app(environ, start_response):
+    """Echo the request details back; /slow sleeps, /stream streams."""
+    path = environ['PATH_INFO']
+    if path == '/slow':
+        time.sleep(0.5)
+    if path == '/stream':
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return (chunk for chunk in [b'one ', b'two ', b'three'])
+    body = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [('%s %s %s' % (environ['REQUEST_METHOD'], path,
+                           environ['QUERY_STRING'])).encode(), b' ', body]
+
+
+@unittest.skipIf(aioserver is None, "asyncio server requires Python 3.5+")
+class TestWSGIServer(unittest.TestCase):
+
+    def setUp(self):
+        self.port = get_free_port()
+        self.server = aioserver.WSGIServer(app, threads=4,
+                                           keepalive_timeout=2,
+                                           request_timeout=0.5,
+                                           access_log=False)
+        self.thread = threading.Thread(
+            target=self.server.run, args=('127.0.0.1', self.port))
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%s' % self.port
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', self.port)).close()
+                break
+            except socket.error:
+                time.sleep(0.01)
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            self.server.stop(timeout=1)
+            self.thread.join(5)
+
+    def raw(self, data, conn=None):
+        """Send raw bytes and return what the server sends back."""
+        conn = conn or socket.create_connection(('127.0.0.1', self.port),
+                                                timeout=2)
+        conn.sendall(data)
+        received = b''
+        try:
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                received += chunk
+        except socket.timeout:
+            pass
+        conn.close()
+        return received
+
+    def test_get(self):
+        resp = requests.get(self.url + '/x?a=1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.text, 'GET /x a=1 ')
+        self.assertEqual(resp.headers['Content-Length'], '11')
+
+    def test_post_chunked(self):
+        resp = requests.post(self.url + '/echo',
+                             data=(part for part in [b'abc', b'def']))
+        self.assertEqual(resp.text, 'POST /echo  abcdef')
+
+    def test_keep_alive(self):
+        session = requests.Session()
+        for _ in range(3):
+            self.assertTrue(session.get(self.url + '/').ok)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_http10_closes(self):
+        data = self.raw(b'GET /old HTTP/1.0\r\n\r\n')
+        self.assertTrue(data.startswith(b'HTTP/1.0 200 OK'))
+        self.assertIn(b'Connection: close', data)
+        self.assertTrue(data.endswith(b'GET /old  '))
+
+    def test_streamed_response(self):
+        resp = requests.get(self.url + '/stream')
+        self.assertEqual(resp.headers['Transfer-Encoding'], 'chunked')
+        self.assertEqual(resp.text, 'one two three')
+
+    def test_head(self):
+        data = self.raw(b'HEAD /h HTTP/1.1\r\nConnection: close\r\n\r\n')
+        self.assertIn(b'Content-Length: 9', data)
+        self.assertTrue(data.endswith(b'\r\n\r\n'))
+
+    def test_bad_request(self):
+        self.assertTrue(self.raw(b'NONSENSE\r\n\r\n').startswith(
+            b'HTTP/1.1 400'))
+
+    def test_body_too_large(self):
+        self.server.max_body = 10
+        self.assertTrue(self.raw(
+            b'POST / HTTP/1.1\r\nContent-Length: 11\r\n'
+            b'Expect: 100-continue\r\n\r\n').startswith(b'HTTP/1.1 413'))
+        self.assertTrue(self.raw(
+            b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n'
+            b'6\r\nabcdef\r\n6\r\nghijkl\r\n0\r\n\r\n').startswith(
+                b'HTTP/1.1 413'))
+        resp = requests.post(self.url + '/echo', data=b'abcdefghij')
+        self.assertEqual(resp.text, 'POST /echo  abcdefghij')
+
+    def test_request_timeout(self):
+        self.assertTrue(self.raw(b'GET / HTTP/1.1\r\nHost: x').startswith(
+            b'HTTP/1.1 408'))
+
+    def test_slow_request_does_not_block(self):
+        slow = threading.Thread(target=requests.get,
+                                args=(self.url + '/slow',))
+        slow.start()
+        time.sleep(0.1)
+        start = time.time()
+        self.assertTrue(requests.get(self.url + '/fast').ok)
+        self.assertLess(time.time() - start, 0.3)
+        slow.join()
+
+    def test_graceful_stop(self):
+        result = {}
+
+        def request():
+            result['response'] = requests.get(self.url + '/slow')
+        client = threading.Thread(target=request)
+        client.start()
+        time.sleep(0.1)
+        self.server.stop(timeout=5)
+        client.join(5)
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertTrue(self.server.loop.is_closed())
+        self.assertEqual(result['response'].text, 'GET /slow  ')
+        self.assertRaises(socket.error, socket.create_connection,
+                          ('127.0.0.1', self.port))
+
+
+if __name__ == '__main__':
+    unittest.main()
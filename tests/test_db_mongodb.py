@@ -114,6 +114,20 @@ class TestMongoDB(unittest.TestCase):
         )
         self.assertEqual(self.db.gadgets.list(), expected)
 
+    def test_iterate(self):
+        self.db.womps.save("A", {"name": "test A"})
+        self.db.womps.save("B", {"name": "test B"})
+        results = self.db.womps.iterate(sort=["-name"], batch_size=1)
+        self.assertFalse(isinstance(results, list))
+        self.assertEqual(list(results),
+                         [{'name': 'test B'}, {'name': 'test A'}])
+
+    def test_close(self):
+        self.db.womps.save("A", {"name": "test A"})
+        self.db.close()
+        self.assertIsNone(self.db._client)
+        self.assertEqual(self.db.womps.get("A"), {"name": "test A"})
+
     def test_write_dots(self):
         self.db.womps.save("A.B.C", {"name.1": "test.A"})
         self.assertEqual(self.db.womps.get('A.B.C'), {"name.1": "test.A"})
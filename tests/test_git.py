@@ -15,11 +15,15 @@
 
 """Tests for git module."""
 
+import gc
 import os
 import tempfile
 import shutil
+import threading
+import time
 import unittest
 import warnings
+import weakref
 
 import mock
 
@@ -458,6 +462,667 @@ class TestGitRepo(TestGitBase):
                 raise err.oserror
 
 
+class TestCatFile(TestGitBase):
+
+    def setUp(self):
+        super(TestCatFile, self).setUp()
+        self.files = {
+            'a.txt': b'alpha\n',
+            'dir/b.bin': b'\x00\x01\nline\n\n\xff',
+            'dir/empty': b'',
+        }
+        for path, data in self.files.items():
+            full = os.path.join(self.repo.repo_dir, path)
+            if not os.path.isdir(os.path.dirname(full)):
+                os.makedirs(os.path.dirname(full))
+            with open(full, 'wb') as handle:
+                handle.write(data)
+        self.repo.commit(message='files')
+
+    def tearDown(self):
+        self.repo.close()
+        super(TestCatFile, self).tearDown()
+
+    def test_read_blob(self):
+        for path, data in self.files.items():
+            self.assertEqual(self.repo.read_blob(path), data)
+        tree = {t['file']: t['object'] for t in self.repo.ls_tree()}
+        self.assertEqual(self.repo.read_blob(tree['a.txt']), b'alpha\n')
+
+    def test_read_blob_treeish(self):
+        with open(os.path.join(self.repo.repo_dir, 'a.txt'), 'wb') as fh:
+            fh.write(b'changed\n')
+        self.repo.commit(message='change')
+        self.assertEqual(self.repo.read_blob('a.txt'), b'changed\n')
+        self.assertEqual(self.repo.read_blob('a.txt', treeish='HEAD~1'),
+                         b'alpha\n')
+
+    def test_read_blob_errors(self):
+        self.assertRaises(exceptions.SimplGitCommandError,
+                          self.repo.read_blob, 'nope.txt')
+        self.assertRaises(exceptions.SimplGitCommandError,
+                          self.repo.read_blob, 'dir')
+        self.assertRaises(ValueError, self.repo.read_blob, 'a\nb')
+
+    def test_missing_name_with_spaces(self):
+        self.repo.read_blob('a.txt')
+        process = self.repo._cat_file.process
+        for name in ('a b', 'a b c', 'HEAD:no such file'):
+            self.assertRaises(exceptions.SimplGitCommandError,
+                              self.repo.read_blob, name)
+        self.assertIs(self.repo._cat_file.process, process)
+
+    def test_object_info(self):
+        info = self.repo.object_info('dir/b.bin')
+        self.assertEqual(info['type'], 'blob')
+        self.assertEqual(info['size'], len(self.files['dir/b.bin']))
+        self.assertEqual(self.repo.object_info('dir')['type'], 'tree')
+        self.assertEqual(self.repo.object_info(info['object']), info)
+
+    def test_one_process(self):
+        self.repo.read_blob('a.txt')
+        process = self.repo._cat_file.process
+        for path in self.files:
+            self.repo.read_blob(path)
+        self.assertIs(self.repo._cat_file.process, process)
+
+    def test_restart(self):
+        self.repo.read_blob('a.txt')
+        self.repo._cat_file.process.kill()
+        self.repo._cat_file.process.wait()
+        self.assertEqual(self.repo.read_blob('a.txt'), b'alpha\n')
+
+    def test_threads(self):
+        errors = []
+
+        def read(path):
+            try:
+                for _ in range(20):
+                    if self.repo.read_blob(path) != self.files[path]:
+                        errors.append(path)
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(exc)
+        threads = [threading.Thread(target=read, args=(path,))
+                   for path in sorted(self.files) * 3]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_context_manager(self):
+        with git.GitRepo(self.repo.repo_dir) as repo:
+            repo.read_blob('a.txt')
+            repo.object_info('a.txt')
+            processes = [repo._cat_file.process,
+                         repo._cat_file_check.process]
+        self.assertIsNone(repo._cat_file.process)
+        self.assertIsNone(repo._cat_file_check.process)
+        self.assertEqual([p.poll() is None for p in processes],
+                         [False, False])
+
+    @unittest.skipUnless(hasattr(weakref, 'finalize'),
+                         "weakref.finalize is Python 3.4+")
+    def test_stopped_when_collected(self):
+        repo = git.GitRepo(self.repo.repo_dir)
+        repo.read_blob('a.txt')
+        process = repo._cat_file.process
+        del repo
+        gc.collect()
+        self.assertIsNotNone(process.poll())
+
+
+class TestRefFiles(TestGitBase):
+
+    """Refs read from the files match what git says."""
+
+    def assert_matches_git(self, repo):
+        raw = repo.run_command(['git', 'show-ref', '--dereference',
+                                '--head'])
+        expected = {ref: sha for sha, ref in
+                    (line.split(None, 1) for line in raw.splitlines())}
+        with mock.patch.object(git, 'execute_git_command') as execute:
+            self.assertEqual(repo.list_refs(), expected)
+            self.assertEqual(repo.head, expected['HEAD'])
+            self.assertFalse(execute.called)
+        self.assertEqual(repo.current_branch, repo.run_command(
+            ['git', 'rev-parse', '--abbrev-ref', 'HEAD']))
+
+    def test_refs(self):
+        self.assert_matches_git(self.repo)
+        self.repo.branch('feature')
+        self.repo.tag('annotated', message='annotated tag')
+        self.repo.run_command(['git', 'tag', 'lightweight'])
+        self.repo.commit(message='second', stage=False)
+        self.assert_matches_git(self.repo)
+        self.repo.run_command(['git', 'pack-refs', '--all'])
+        self.assert_matches_git(self.repo)
+        self.repo.commit(message='third', stage=False)
+        self.assert_matches_git(self.repo)
+
+    def test_clone(self):
+        self.repo.tag('v1', message='v1')
+        clone = git.GitRepo.clone(self.repo.repo_dir,
+                                  repo_dir=self.create_tempdir())
+        self.assertIn('refs/remotes/origin/HEAD', clone.list_refs())
+        self.assert_matches_git(clone)
+
+    def test_detached(self):
+        self.repo.commit(message='second', stage=False)
+        self.repo.checkout('HEAD~1')
+        self.assertEqual(self.repo.current_branch, 'HEAD')
+        self.assert_matches_git(self.repo)
+
+    def test_ambiguous_branch(self):
+        self.repo.run_command(['git', 'tag', 'master'])
+        self.assertEqual(self.repo.current_branch, 'heads/master')
+
+    def test_unborn(self):
+        repo = git.GitRepo.init(self.create_tempdir())
+        self.assertRaises(exceptions.SimplGitCommandError,
+                          lambda: repo.head)
+        self.assertRaises(exceptions.SimplGitCommandError, repo.list_refs)
+
+    def test_subdirectory(self):
+        subdir = os.path.join(self.repo.repo_dir, 'sub')
+        os.mkdir(subdir)
+        self.assertTrue(git.is_git_repo(subdir))
+        self.assertEqual(git.git_head_commit(subdir), self.repo.head)
+
+
+class TestStreaming(TestGitBase):
+
+    """The iter_* variants yield what the list variants return."""
+
+    def test_iter_ls_tree(self):
+        for name in ('a.txt', 'dir/b.txt', 'with space.txt', 'tab\there'):
+            path = os.path.join(self.repo.repo_dir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as handle:
+                handle.write(name)
+        self.repo.commit(message='files')
+        entries = list(self.repo.iter_ls_tree())
+        self.assertIn('tab\there', [entry[3] for entry in entries])
+        headers = ['mode', 'type', 'object', 'file']
+        self.assertEqual(
+            [dict(zip(headers, entry)) for entry in entries
+             if entry[3] != 'tab\there'],
+            [entry for entry in self.repo.ls_tree()
+             if 'tab' not in entry['file']])
+
+    def test_iter_ls_tree_fails(self):
+        entries = self.repo.iter_ls_tree('no-such-tree')
+        self.assertRaises(exceptions.SimplGitCommandError, list, entries)
+
+    def test_close_early(self):
+        for number in range(200):
+            with open(os.path.join(self.repo.repo_dir, '%d.txt' % number),
+                      'w') as handle:
+                handle.write('%d' % number)
+        self.repo.commit(message='files')
+        entries = self.repo.iter_ls_tree()
+        self.assertEqual(next(entries)[1], 'blob')
+        entries.close()
+
+    def test_timeout(self):
+        start = time.time()
+        records = git.iter_git_command(
+            ['sh', '-c', 'echo one; sleep 10 & sleep 10'], timeout=0.3)
+        self.assertEqual(next(records), 'one')
+        self.assertRaises(exceptions.SimplGitTimeout, list, records)
+        self.assertLess(time.time() - start, 5)
+
+    def test_deadline(self):
+        def stream(repo):
+            return list(git.iter_git_command(['sleep', '10']))
+        results = git.run_parallel([self.repo], stream, timeout=0.3)
+        self.assertTrue(results[0].timed_out)
+        self.assertLess(results[0].seconds, 5)
+
+    def test_iter_branches(self):
+        self.repo.branch('feature')
+        self.repo.commit(message='second', stage=False)
+        self.assert_same_branches()
+        self.repo.checkout('HEAD~1')
+        self.assertEqual(len(list(self.repo.iter_branches())), 3)
+        self.assert_same_branches()
+
+    def assert_same_branches(self):
+        self.assertEqual(
+            sorted(self.repo.iter_branches()),
+            sorted((branch['branch'], branch['commit'], branch['message'])
+                   for branch in self.repo.list_branches()))
+
+    def test_iter_ls_remote(self):
+        self.repo.tag('v1', message='v1')
+        clone = git.GitRepo.clone(self.repo.repo_dir,
+                                  repo_dir=self.create_tempdir())
+        self.assertEqual(dict(clone.iter_ls_remote()), clone.ls_remote())
+        self.assertEqual(dict(clone.iter_ls_remote(refs='v1*')),
+                         clone.ls_remote(refs='v1*'))
+
+
+class TestRecords(TestGitBase):
+
+    """records=True returns the same data as compact records."""
+
+    def setUp(self):
+        super(TestRecords, self).setUp()
+        with open(os.path.join(self.repo.repo_dir, 'a.txt'), 'w') as handle:
+            handle.write('a')
+        self.repo.commit(message='a file')
+        self.repo.branch('feature')
+        self.repo.tag('v1', message='first release')
+        self.repo.run_command(['git', 'remote', 'add', 'upstream',
+                               self.repo_b.repo_dir])
+
+    def assert_same(self, method, record_type, **kwargs):
+        records = getattr(self.repo, method)(records=True, **kwargs)
+        self.assertTrue(records)
+        for record in records:
+            self.assertIsInstance(record, record_type)
+            self.assertEqual(record.__slots__, ())
+        self.assertEqual([dict(record._asdict()) for record in records],
+                         getattr(self.repo, method)(**kwargs))
+
+    def test_ls_tree(self):
+        self.assert_same('ls_tree', git.TreeEntry)
+        self.assertEqual(list(self.repo.iter_ls_tree()),
+                         self.repo.ls_tree(records=True))
+
+    def test_list_branches(self):
+        self.assert_same('list_branches', git.BranchInfo)
+        self.assertIsInstance(next(self.repo.iter_branches()),
+                              git.BranchInfo)
+
+    def test_list_remotes(self):
+        self.assert_same('list_remotes', git.RemoteInfo)
+        self.assertEqual(self.repo.list_remotes(records=True)[0].location,
+                         self.repo_b.repo_dir)
+
+    def test_list_tags(self):
+        self.assertEqual(self.repo.list_tags(records=True),
+                         [git.TagInfo('v1', None)])
+        self.assertEqual(self.repo.list_tags(with_messages=True,
+                                             records=True),
+                         [git.TagInfo('v1', 'first release')])
+        self.assertEqual(self.repo.list_tags(with_messages=True),
+                         [('v1', 'first release')])
+
+
+class TestMirrorCache(TestGitBase):
+
+    def setUp(self):
+        super(TestMirrorCache, self).setUp()
+        self.cache = git.MirrorCache(self.create_tempdir(), max_age=3600)
+        self.location = self.repo.repo_dir
+
+    def clone(self, **kwargs):
+        kwargs.setdefault('mirror_cache', self.cache)
+        return git.GitRepo.clone(self.location,
+                                 repo_dir=self.create_tempdir(), **kwargs)
+
+    def test_clone(self):
+        clone = self.clone()
+        self.assertEqual(clone.head, self.repo.head)
+        self.assertEqual(clone.run_command(['git', 'remote', 'get-url',
+                                            'origin']), self.location)
+        self.assertTrue(os.path.isdir(self.cache.path(self.location)))
+        with mock.patch.object(git, 'execute_git_command',
+                               wraps=git.execute_git_command) as execute:
+            self.clone()
+        commands = [call[0][0][:2] for call in execute.call_args_list]
+        self.assertNotIn(['git', 'fetch'], commands)
+        self.assertEqual(commands.count(['git', 'clone']), 1)
+
+    def test_hardlinks(self):
+        with mock.patch.object(git, 'execute_git_command',
+                               wraps=git.execute_git_command) as execute:
+            self.clone()
+        clone_command = execute.call_args_list[-2][0][0]
+        self.assertIn(self.cache.path(self.location), clone_command)
+        self.assertNotIn('--no-hardlinks', clone_command)
+
+    def test_stale(self):
+        self.clone()
+        self.repo.commit(message='second', stage=False)
+        self.assertNotEqual(self.clone().head, self.repo.head)
+        self.cache.max_age = 0
+        self.assertEqual(self.clone().head, self.repo.head)
+
+    def test_new_branch(self):
+        self.clone()
+        self.repo.branch('feature', checkout=True)
+        self.repo.commit(message='on feature', stage=False)
+        clone = self.clone(branch_or_tag='feature')
+        self.assertEqual(clone.head, self.repo.head)
+        self.assertRaises(exceptions.SimplGitCommandError, self.clone,
+                          branch_or_tag='no-such-branch')
+
+    def test_directory(self):
+        directory = self.create_tempdir()
+        clone = self.clone(mirror_cache=directory, temp=True)
+        self.assertEqual(clone.head, self.repo.head)
+        mirror = os.path.basename(self.cache.path(self.location))
+        self.assertEqual(sorted(os.listdir(directory)),
+                         [mirror, mirror + '.lock'])
+
+    def test_path(self):
+        self.assertNotEqual(self.cache.path('https://example.com/a/app.git'),
+                            self.cache.path('https://example.com/b/app.git'))
+        self.assertTrue(os.path.basename(self.cache.path(
+            'https://example.com/a/app.git')).startswith('app-'))
+
+
+class TestCloneOptions(TestGitBase):
+
+    """Shallow, partial and sparse clones of a local bare repo."""
+
+    def setUp(self):
+        super(TestCloneOptions, self).setUp()
+        for number in range(3):
+            for path in ('docs/%d.md' % number, 'src/%d.py' % number):
+                path = os.path.join(self.repo.repo_dir, path)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, 'w') as handle:
+                    handle.write(path)
+            with open(os.path.join(self.repo.repo_dir, 'CHANGES'),
+                      'a') as handle:
+                handle.write('commit %d\n' % number)
+            self.repo.commit(message='commit %d' % number)
+        self.repo.branch('other')
+        self.location = self.create_tempdir()
+        self.repo.run_command(['git', 'clone', '--bare', self.repo.repo_dir,
+                               self.location])
+        git.execute_git_command(['git', 'config', 'uploadpack.allowFilter',
+                                 'true'], repo_dir=self.location)
+
+    def clone(self, **kwargs):
+        return git.GitRepo.clone(self.location,
+                                 repo_dir=self.create_tempdir(), **kwargs)
+
+    @staticmethod
+    def object_count(repo):
+        """Count the objects the clone has locally."""
+        stats = dict(line.split(': ') for line in repo.run_command(
+            ['git', 'count-objects', '-v']).splitlines())
+        return int(stats['count']) + int(stats['in-pack'])
+
+    @staticmethod
+    def commit_count(repo):
+        return int(repo.run_command(['git', 'rev-list', '--count', 'HEAD']))
+
+    def test_depth(self):
+        full = self.clone()
+        shallow = self.clone(depth=1)
+        self.assertEqual(self.commit_count(full), 4)
+        self.assertEqual(self.commit_count(shallow), 1)
+        self.assertLess(self.object_count(shallow), self.object_count(full))
+        self.assertEqual(shallow.head, full.head)
+        shallow.fetch(remote='origin', depth=2)
+        self.assertEqual(self.commit_count(shallow), 2)
+
+    def test_single_branch(self):
+        branches = [branch['branch'] for branch in
+                    self.clone(single_branch=True).list_branches()]
+        self.assertIn('remotes/origin/master', branches)
+        self.assertNotIn('remotes/origin/other', branches)
+
+    def test_filter(self):
+        full = self.clone()
+        partial = self.clone(filter_spec='blob:none')
+        self.assertLess(self.object_count(partial), self.object_count(full))
+        # the checkout fetched the blobs it needed
+        with open(os.path.join(partial.repo_dir, 'docs', '2.md')) as handle:
+            self.assertTrue(handle.read())
+
+    def test_sparse(self):
+        clone = self.clone(sparse=['docs/'])
+        self.assertEqual(sorted(os.listdir(clone.repo_dir)), ['.git', 'docs'])
+        self.assertEqual(len(clone.ls()), 7)
+        clone.sparse_checkout(['src/1.py'])
+        self.assertEqual(sorted(os.listdir(clone.repo_dir)), ['.git', 'src'])
+        self.assertEqual(os.listdir(os.path.join(clone.repo_dir, 'src')),
+                         ['1.py'])
+
+    def test_mirror_cache(self):
+        cache = git.MirrorCache(self.create_tempdir())
+        shallow = self.clone(mirror_cache=cache, depth=1,
+                             filter_spec='blob:none')
+        self.assertEqual(self.commit_count(shallow), 1)
+        self.assertEqual(shallow.run_command(['git', 'remote', 'get-url',
+                                              'origin']), self.location)
+
+
+class TestRunParallel(TestGitBase):
+
+    def setUp(self):
+        super(TestRunParallel, self).setUp()
+        self.clones = [git.GitRepo.clone(self.repo.repo_dir,
+                                         repo_dir=self.create_tempdir())
+                       for _ in range(3)]
+
+    def test_fetch(self):
+        self.repo.commit(message='second', stage=False)
+        results = git.run_parallel(self.clones, 'fetch', workers=2,
+                                   remote='origin')
+        self.assertEqual([result.repo for result in results], self.clones)
+        self.assertTrue(all(result.ok for result in results))
+        for clone in self.clones:
+            self.assertEqual(clone.list_refs()['refs/remotes/origin/master'],
+                             self.repo.head)
+
+    def test_read_operations(self):
+        results = git.run_parallel(self.clones, 'ls_remote')
+        self.assertEqual([result.result for result in results],
+                         [clone.ls_remote() for clone in self.clones])
+        results = git.run_parallel(self.clones, 'remote_resolve_reference',
+                                   ref='master')
+        self.assertEqual(set(result.result for result in results),
+                         {self.repo.head})
+
+    def test_clone(self):
+        target = self.create_tempdir()
+        results = git.run_parallel(
+            [self.repo.repo_dir,
+             {'repo_location': self.repo_b.repo_dir, 'repo_dir': target}],
+            'clone', depth=1)
+        self.assertTrue(results[0].result.temp)
+        self.assertEqual(results[0].result.head, self.repo.head)
+        self.assertEqual(results[1].result.repo_dir, target)
+        self.assertEqual(results[1].result.head, self.repo_b.head)
+
+    def test_errors(self):
+        self.clones[1].run_command(['git', 'remote', 'set-url', 'origin',
+                                    '/no/such/repo'])
+        results = git.run_parallel(self.clones, 'fetch', remote='origin')
+        self.assertEqual([result.ok for result in results],
+                         [True, False, True])
+        self.assertIsInstance(results[1].error,
+                              exceptions.SimplGitCommandError)
+        self.assertFalse(results[1].timed_out)
+        self.assertRaises(ValueError, git.run_parallel, self.clones, 'push')
+        self.assertRaises(ValueError, git.run_parallel, self.clones,
+                          'fetch', workers=0)
+
+    def test_timeout(self):
+        def slow(repo):
+            git.execute_git_command(['sleep', '0.1'])
+            return git.execute_git_command(['sleep', '10'])
+        results = git.run_parallel(self.clones, slow, timeout=0.5)
+        self.assertTrue(all(result.timed_out for result in results))
+        self.assertTrue(all(result.seconds < 5 for result in results))
+        # the deadline does not outlive the operation
+        self.assertEqual(git.execute_git_command(['echo', 'ok']), 'ok')
+        self.assertRaises(exceptions.SimplGitTimeout,
+                          git.execute_git_command, ['sleep', '10'],
+                          timeout=0.2)
+
+    def test_workers(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def count(repo):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            git.execute_git_command(['sleep', '0.2'])
+            with lock:
+                running[0] -= 1
+            return repo
+        results = git.run_parallel(self.clones * 3, count, workers=2)
+        self.assertEqual([result.result for result in results],
+                         self.clones * 3)
+        self.assertEqual(running[1], 2)
+
+
+class TestResolveReferences(TestGitBase):
+
+    def setUp(self):
+        super(TestResolveReferences, self).setUp()
+        for number in range(25):
+            self.repo.branch('branch%d' % number)
+            self.repo.tag('tag%d' % number, message='tag %d' % number)
+        # a tag and a branch with the same name: the tag wins
+        self.repo.commit(message='second', stage=False)
+        self.repo.branch('same')
+        self.repo.tag('same', message='tagged')
+        self.repo.commit(message='third', stage=False)
+        self.repo.branch('same')
+        self.clone = git.GitRepo.clone(self.repo.repo_dir,
+                                       repo_dir=self.create_tempdir())
+        self.refs = (['branch%d' % number for number in range(25)] +
+                     ['tag%d' % number for number in range(25)] +
+                     ['same', 'HEAD', 'master', 'refs/heads/master',
+                      'missing'])
+
+    def test_one_round_trip(self):
+        with mock.patch.object(git, 'execute_git_command',
+                               wraps=git.execute_git_command) as execute:
+            resolved = self.clone.resolve_references(self.refs)
+        self.assertEqual(execute.call_count, 1)
+        self.assertEqual(resolved, {
+            ref: (self.clone.remote_resolve_reference(ref)
+                  if ref != 'missing' else None)
+            for ref in self.refs})
+        self.assertIsNone(resolved['missing'])
+        self.assertNotEqual(resolved['same'], self.repo.head)
+
+    def test_ttl(self):
+        self.clone.resolve_references(['master'], ttl=60)
+        self.repo.commit(message='fourth', stage=False)
+        with mock.patch.object(git, 'execute_git_command') as execute:
+            self.assertNotEqual(
+                self.clone.resolve_references(['master'], ttl=60),
+                {'master': self.repo.head})
+            self.assertFalse(execute.called)
+        self.assertEqual(self.clone.resolve_references(['master']),
+                         {'master': self.repo.head})
+
+    def test_run_parallel(self):
+        results = git.run_parallel([self.clone], 'resolve_references',
+                                   refs=['tag1', 'HEAD'])
+        self.assertEqual(results[0].result['HEAD'], self.repo.head)
+
+
+class TestListingCache(TestGitBase):
+
+    """GitRepo(cache=True) memoizes listings until the repo changes."""
+
+    def setUp(self):
+        super(TestListingCache, self).setUp()
+        self.cached = git.GitRepo(self.repo.repo_dir, cache=True)
+        self.cached.tag('v1', message='first tag')
+        # the repo was just changed: cache results anyway
+        patcher = mock.patch.object(git, 'CACHE_RACY_SECONDS', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_cached(self, method, *args):
+        """Check `method` returns what git says without running git."""
+        expected = getattr(self.repo, method)(*args)
+        self.assertEqual(getattr(self.cached, method)(*args), expected)
+        with mock.patch.object(git, 'git_' + method) as uncached:
+            self.assertEqual(getattr(self.cached, method)(*args), expected)
+            self.assertFalse(uncached.called)
+
+    def test_cached(self):
+        for method in ('list_refs', 'list_branches', 'list_tags',
+                       'list_config', 'list_remotes'):
+            self.assert_cached(method)
+        self.assert_cached('list_tags', True)
+
+    def test_not_cached_by_default(self):
+        self.repo.list_branches()
+        with mock.patch.object(git, 'git_list_branches') as uncached:
+            self.repo.list_branches()
+            self.assertTrue(uncached.called)
+
+    def test_copies(self):
+        self.cached.list_branches().append('changed')
+        self.assertNotIn('changed', self.cached.list_branches())
+
+    def test_changed_by_repo(self):
+        self.assert_cached('list_branches')
+        self.cached.branch('feature')
+        self.assertIn('feature', [branch['branch'] for branch in
+                                  self.cached.list_branches()])
+        self.assert_cached('list_tags')
+        self.cached.tag('v2', message='second tag')
+        self.assertIn('v2', self.cached.list_tags())
+
+    def test_changed_elsewhere(self):
+        self.assert_cached('list_refs')
+        self.assert_cached('list_tags')
+        self.assert_cached('list_config')
+        self.repo.commit(message='second', stage=False)
+        self.repo.tag('v2', message='second tag')
+        self.repo.run_command(['git', 'config', 'simpl.test', 'yes'])
+        self.assertEqual(self.cached.list_refs(), self.repo.list_refs())
+        self.assertIn('v2', self.cached.list_tags())
+        self.assertEqual(self.cached.list_config()['simpl.test'], 'yes')
+        self.repo.run_command(['git', 'pack-refs', '--all'])
+        self.repo.run_command(['git', 'tag', '-d', 'v2'])
+        self.assertNotIn('v2', self.cached.list_tags())
+
+    def test_ref_rewritten_within_a_second(self):
+        """Quick updates are seen even if file times are in seconds."""
+        stat_stamp = git._stat_stamp
+
+        def coarse(path):
+            """Whole-second mtimes and no inodes."""
+            stamp = stat_stamp(path)
+            return stamp and (int(stamp[0]), None, stamp[2], None)
+        first = self.repo.head
+        self.repo.commit(message='second', stage=False)
+        second = self.repo.head
+        with mock.patch.object(git, 'CACHE_RACY_SECONDS', 2), \
+                mock.patch.object(git, '_stat_stamp', coarse):
+            start = time.time()
+            for sha in (first, second, first):
+                self.repo.run_command(['git', 'update-ref',
+                                       'refs/heads/quick', sha])
+                self.assertEqual(self.cached.list_refs()['refs/heads/quick'],
+                                 sha)
+            self.assertLess(time.time() - start, 1)
+
+    def test_not_cached_while_racy(self):
+        with mock.patch.object(git, 'CACHE_RACY_SECONDS', 2):
+            self.cached.list_tags()
+            with mock.patch.object(git, 'git_list_tags') as uncached:
+                self.cached.list_tags()
+                self.assertTrue(uncached.called)
+
+    def test_invalidate_cache(self):
+        self.assert_cached('list_tags')
+        self.cached.invalidate_cache()
+        with mock.patch.object(git, 'git_list_tags') as uncached:
+            self.cached.list_tags()
+            self.assertTrue(uncached.called)
+
+
 class TestGitVersion(unittest.TestCase):
 
     def test_check_git_version_no_git(self):
@@ -487,6 +1152,15 @@ class TestGitVersion(unittest.TestCase):
                     "is recommended for simpl/git.py",
                     str(warning.message))
 
+    def test_checked_on_first_command(self):
+        with mock.patch.dict(git._VERSION_CHECK, done=False):
+            with mock.patch.object(git, 'check_git_version') as check:
+                with mock.patch.object(git.shell, 'execute') as execute:
+                    git.git_init('/tmp/repo')
+                    git.git_init('/tmp/repo')
+        check.assert_called_once_with()
+        self.assertEqual(execute.call_count, 2)
+
 
 if __name__ == '__main__':
     unittest.main()
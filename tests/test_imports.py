@@ -0,0 +1,95 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Import cost budgets: importing simpl modules stays cheap."""
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+#: {module: cumulative import time budget in milliseconds}. Generous, so
+#: slow machines pass; the checks of what gets loaded are the strict part.
+BUDGETS = {
+    'simpl.git': 100,
+    'simpl.cli': 100,
+}
+
+
+def run_python(*args):
+    """Run a fresh interpreter from the repo root, return (code, stderr)."""
+    proc = subprocess.Popen((sys.executable,) + args, cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    _, err = proc.communicate()
+    return proc.returncode, err
+
+
+def loaded(statement, modules):
+    """Return which of `modules` are loaded after running `statement`."""
+    code, err = run_python('-c', (
+        "import sys\n%s\n"
+        "sys.stderr.write(' '.join(m for m in %r if m in sys.modules))"
+        % (statement, modules)))
+    if code:
+        raise AssertionError(err)
+    return err.split()
+
+
+class TestImports(unittest.TestCase):
+
+    def test_git_does_not_run_git(self):
+        # any attempt to start a process fails the import
+        code, err = run_python('-c', (
+            "import subprocess\n"
+            "subprocess.Popen = None\n"
+            "import simpl.git"))
+        self.assertEqual(code, 0, err)
+
+    def test_git_defers_asyncio(self):
+        self.assertEqual(loaded('import simpl.git',
+                                ['asyncio', 'simpl.aiogit']), [])
+
+    def test_cli_defers_server(self):
+        self.assertEqual(loaded('import simpl.cli',
+                                ['simpl.server', 'bottle']), [])
+
+    def test_mongodb_defers_optional_imports(self):
+        try:
+            import pymongo  # noqa pylint: disable=unused-variable
+        except ImportError:
+            self.skipTest("pymongo is not installed")
+        self.assertEqual(loaded('import simpl.db.mongodb',
+                                ['eventlet', 'mongo_proxy']), [])
+
+    @unittest.skipIf(sys.version_info < (3, 7), "needs -X importtime")
+    def test_budgets(self):
+        for module, budget in sorted(BUDGETS.items()):
+            code, err = run_python('-X', 'importtime', '-c',
+                                   'import %s' % module)
+            self.assertEqual(code, 0, err)
+            for line in err.splitlines():
+                parts = line.split('|')
+                if len(parts) == 3 and parts[2].strip() == module:
+                    elapsed = int(parts[1]) / 1000.0
+                    break
+            else:
+                self.fail("No import time for %s" % module)
+            self.assertLess(elapsed, budget,
+                            "importing %s took %.1fms" % (module, elapsed))
+
+
+if __name__ == '__main__':
+    unittest.main()
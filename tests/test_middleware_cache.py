@@ -0,0 +1,211 @@
+# pylint: disable=C0103,R0904,R0903
+
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for response cache middleware."""
+
+import unittest
+import wsgiref.util
+
+import mock
+
+from simpl.middleware import cache
+from simpl.middleware import context
+from simpl import threadlocal
+
+
+class CountingApp(object):
+
+    """WSGI app that counts calls and echoes the query string."""
+
+    def __init__(self, status='200 OK', headers=None):
+        self.calls = 0
+        self.status = status
+        self.headers = headers or []
+
+    def __call__(self, environ, start_response):
+        self.calls += 1
+        start_response(self.status,
+                       [('Content-Type', 'text/plain')] + self.headers)
+        return [environ.get('QUERY_STRING', '').encode('utf-8'),
+                b'#%d' % self.calls]
+
+
+class TestResponseCacheMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.app = CountingApp()
+        self.middleware = cache.ResponseCacheMiddleware(self.app)
+
+    def call(self, path='/widgets', query='', method='GET', **headers):
+        env = {'PATH_INFO': path, 'QUERY_STRING': query,
+               'REQUEST_METHOD': method}
+        env.update(headers)
+        wsgiref.util.setup_testing_defaults(env)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+        response['body'] = b''.join(self.middleware(env, start_response))
+        return response
+
+    def test_hit(self):
+        first = self.call(query='limit=2')
+        second = self.call(query='limit=2')
+        self.assertEqual(self.app.calls, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(self.middleware.hits, 1)
+
+    def test_query_order_and_path_normalized(self):
+        self.call(path='/widgets/', query='limit=2&offset=4')
+        self.call(path='//widgets', query='offset=4&limit=2')
+        self.assertEqual(self.app.calls, 1)
+
+    def test_different_query(self):
+        self.call(query='limit=2')
+        self.call(query='limit=3')
+        self.assertEqual(self.app.calls, 2)
+
+    def test_vary_headers(self):
+        self.call(HTTP_ACCEPT='application/json')
+        self.call(HTTP_ACCEPT='application/x-yaml')
+        self.call(HTTP_ACCEPT='application/json')
+        self.assertEqual(self.app.calls, 2)
+
+    def test_response_vary(self):
+        self.app.headers = [('Vary', 'X-Tenant, Accept')]
+        first = self.call(HTTP_X_TENANT='a')
+        self.call(HTTP_X_TENANT='b')
+        self.assertEqual(self.app.calls, 2)
+        self.assertEqual(self.call(HTTP_X_TENANT='a'), first)
+        self.assertEqual(self.app.calls, 2)
+        self.assertEqual(len(self.middleware), 2)
+        self.assertEqual(self.middleware.purge(), 2)
+
+    def test_response_vary_star(self):
+        self.app.headers = [('Vary', 'Accept, *')]
+        self.call()
+        self.call()
+        self.assertEqual(self.app.calls, 2)
+
+    def test_credentials_not_shared(self):
+        self.call()
+        self.call(HTTP_AUTHORIZATION='Bearer alice')
+        self.call(HTTP_AUTHORIZATION='Bearer bob')
+        self.call(HTTP_COOKIE='session=carol')
+        self.assertEqual(self.app.calls, 4)
+        self.call()
+        self.assertEqual(self.app.calls, 4)
+
+    def test_credentials_public(self):
+        self.app.headers = [('Cache-Control', 'public, max-age=60')]
+        self.call(HTTP_AUTHORIZATION='Bearer alice')
+        self.call(HTTP_AUTHORIZATION='Bearer bob')
+        self.assertEqual(self.app.calls, 1)
+
+    def test_post_not_cached(self):
+        self.call(method='POST')
+        self.call(method='POST')
+        self.assertEqual(self.app.calls, 2)
+        self.assertEqual(len(self.middleware), 0)
+
+    def test_error_not_cached(self):
+        self.app.status = '404 Not Found'
+        self.call()
+        self.call()
+        self.assertEqual(self.app.calls, 2)
+
+    def test_private_not_cached(self):
+        self.app.headers = [('Cache-Control', 'private')]
+        self.call()
+        self.call()
+        self.assertEqual(self.app.calls, 2)
+
+    def test_client_no_cache(self):
+        self.call()
+        self.call(HTTP_CACHE_CONTROL='no-cache')
+        self.assertEqual(self.app.calls, 2)
+
+    @mock.patch.object(cache.time, 'time')
+    def test_ttl(self, mock_time):
+        mock_time.return_value = 1000
+        self.call()
+        mock_time.return_value = 1000 + self.middleware.ttl
+        self.call()
+        self.assertEqual(self.app.calls, 2)
+
+    def test_lru_entries(self):
+        self.middleware.max_entries = 2
+        self.call(query='a')
+        self.call(query='b')
+        self.call(query='a')  # a is now most recently used
+        self.call(query='c')  # evicts b
+        self.call(query='a')
+        self.assertEqual(self.app.calls, 3)
+        self.call(query='b')
+        self.assertEqual(self.app.calls, 4)
+
+    def test_byte_budget(self):
+        self.middleware.max_bytes = 1
+        self.call()
+        self.assertEqual(len(self.middleware), 0)
+        self.assertEqual(self.middleware.size, 0)
+
+    def test_max_entry_bytes(self):
+        self.middleware.max_entry_bytes = 3
+        self.call(query='toolong')
+        self.call(query='toolong')
+        self.assertEqual(self.app.calls, 2)
+
+    def test_purge(self):
+        self.call(path='/widgets', query='a')
+        self.call(path='/widgets', query='b')
+        self.call(path='/gadgets')
+        self.assertEqual(self.middleware.purge('/widgets/'), 2)
+        self.assertEqual(len(self.middleware), 1)
+        self.assertEqual(self.middleware.purge(), 1)
+        self.assertEqual(self.middleware.size, 0)
+
+    def test_purge_prefix(self):
+        self.call(path='/widgets/1')
+        self.call(path='/widgets/2')
+        self.call(path='/gadgets/1')
+        self.assertEqual(self.middleware.purge('/widgets', prefix=True), 2)
+
+
+class TestCacheWithContext(unittest.TestCase):
+
+    def tearDown(self):
+        threadlocal.default().clear()
+
+    def test_fresh_transaction_id(self):
+        app = CountingApp()
+        chain = context.ContextMiddleware(cache.ResponseCacheMiddleware(app))
+        tids = []
+
+        def start_response(status, headers, exc_info=None):
+            tids.extend(v for k, v in headers if k == 'X-Transaction-Id')
+        for _ in range(2):
+            env = {'PATH_INFO': '/widgets', 'REQUEST_METHOD': 'GET'}
+            wsgiref.util.setup_testing_defaults(env)
+            list(chain(env, start_response))
+        self.assertEqual(app.calls, 1)
+        self.assertEqual(len(tids), 2)
+        self.assertNotEqual(tids[0], tids[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+# pylint: disable=C0103,R0904,R0903
+
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for compression middleware."""
+
+import gzip
+import io
+import json
+import unittest
+import wsgiref.util
+
+import bottle
+
+from simpl.middleware import compression
+from simpl.middleware import cors
+from simpl.middleware import errors
+
+BIG = b'{"data": [' + b', '.join([b'{"id": 1}'] * 500) + b']}'
+
+
+def make_app(chunks, content_type='application/json', status='200 OK'):
+    """Return a WSGI app that returns `chunks` as a list (like bottle)."""
+    def app(environ, start_response):
+        start_response(status, [('Content-Type', content_type)])
+        return list(chunks)
+    return app
+
+
+def make_streaming_app(chunks):
+    """Return a WSGI app that yields `chunks` one at a time."""
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        for chunk in chunks:
+            yield chunk
+    return app
+
+
+def gunzip(data):
+    return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+
+    def call(self, app, accept='gzip', **env):
+        env.setdefault('REQUEST_METHOD', 'GET')
+        if accept:
+            env['HTTP_ACCEPT_ENCODING'] = accept
+        wsgiref.util.setup_testing_defaults(env)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = dict(headers)
+        response['chunks'] = list(app(env, start_response))
+        response['body'] = b''.join(response['chunks'])
+        return response
+
+    def test_gzip(self):
+        middleware = compression.CompressionMiddleware(make_app([BIG]))
+        resp = self.call(middleware)
+        self.assertEqual(resp['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(resp['headers']['Vary'], 'Accept-Encoding')
+        self.assertEqual(resp['headers']['Content-Length'],
+                         str(len(resp['body'])))
+        self.assertEqual(gunzip(resp['body']), BIG)
+
+    def test_streamed_chunks(self):
+        chunks = [BIG[i:i + 100] for i in range(0, len(BIG), 100)]
+        middleware = compression.CompressionMiddleware(
+            make_streaming_app(chunks), min_size=200)
+        resp = self.call(middleware)
+        self.assertNotIn('Content-Length', resp['headers'])
+        self.assertGreater(len(resp['chunks']), 1)
+        self.assertEqual(gunzip(resp['body']), BIG)
+
+    def test_below_threshold(self):
+        middleware = compression.CompressionMiddleware(make_app([b'{}']))
+        resp = self.call(middleware)
+        self.assertNotIn('Content-Encoding', resp['headers'])
+        self.assertEqual(resp['body'], b'{}')
+
+    def test_not_accepted(self):
+        middleware = compression.CompressionMiddleware(make_app([BIG]))
+        self.assertEqual(self.call(middleware, accept=None)['body'], BIG)
+        self.assertEqual(
+            self.call(middleware, accept='gzip;q=0, identity')['body'], BIG)
+
+    def test_skip_types(self):
+        middleware = compression.CompressionMiddleware(
+            make_app([BIG], content_type='image/png'))
+        resp = self.call(middleware)
+        self.assertNotIn('Content-Encoding', resp['headers'])
+        self.assertEqual(resp['body'], BIG)
+
+    def test_choose_encoding(self):
+        middleware = compression.CompressionMiddleware(None)
+        middleware.encodings = ('br', 'gzip')
+        choose = middleware.choose_encoding
+        self.assertEqual(choose({'HTTP_ACCEPT_ENCODING': 'gzip, br'}), 'br')
+        self.assertEqual(
+            choose({'HTTP_ACCEPT_ENCODING': 'gzip, br;q=0.5'}), 'gzip')
+        self.assertEqual(choose({'HTTP_ACCEPT_ENCODING': '*'}), 'br')
+        self.assertIsNone(choose({'HTTP_ACCEPT_ENCODING': 'deflate'}))
+
+    @unittest.skipIf(compression.brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        middleware = compression.CompressionMiddleware(make_app([BIG]))
+        resp = self.call(middleware, accept='br')
+        self.assertEqual(resp['headers']['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(resp['body']), BIG)
+
+    def test_write_callable(self):
+        def app(environ, start_response):
+            write = start_response('200 OK', [('Content-Type', 'text/plain')])
+            write(BIG[:10])
+            return [BIG[10:]]
+        middleware = compression.CompressionMiddleware(app)
+        self.assertEqual(gunzip(self.call(middleware)['body']), BIG)
+
+    def test_with_cors(self):
+        chain = cors.CORSMiddleware(make_app([BIG]),
+                                    allowed_regexes=['.*'])
+        chain = compression.CompressionMiddleware(chain)
+        resp = self.call(chain, HTTP_ORIGIN='http://localhost')
+        self.assertEqual(resp['headers']['Access-Control-Allow-Origin'],
+                         'http://localhost')
+        self.assertEqual(gunzip(resp['body']), BIG)
+
+    def test_with_format_exception(self):
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            raise bottle.HTTPError(status=418, body='x' * 2000)
+        chain = errors.FormatExceptionMiddleware(app)
+        chain = compression.CompressionMiddleware(chain)
+        resp = self.call(chain)
+        self.assertTrue(resp['status'].startswith('418'))
+        self.assertEqual(resp['headers']['Content-Type'], 'application/json')
+        self.assertEqual(resp['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gunzip(resp['body']).decode())['code'],
+                         418)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# pylint: disable=C0103,R0904,R0903
+
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for request metrics middleware."""
+
+import unittest
+
+import bottle
+import mock
+import webtest
+
+from simpl import config
+from simpl import server
+from simpl.middleware import metrics
+
+
+def make_app():
+    app = bottle.Bottle()
+    app.catchall = False
+
+    @app.get('/widgets/<widget_id>')
+    def get_widget(widget_id):
+        if widget_id == 'missing':
+            bottle.abort(404, 'No such widget')
+        return {'id': widget_id}
+
+    @app.post('/widgets')
+    def create_widget():
+        raise ValueError('boom')
+
+    return app
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.middleware = metrics.MetricsMiddleware(make_app())
+        self.client = webtest.TestApp(self.middleware)
+
+    def test_counts_by_route(self):
+        self.client.get('/widgets/1')
+        self.client.get('/widgets/2')
+        self.client.get('/widgets/missing', status=404)
+        self.client.get('/nothing/here', status=404)
+        text = self.middleware.render()
+        self.assertIn('simpl_http_requests_total{method="GET",'
+                      'route="/widgets/<widget_id>",status="200"} 2', text)
+        self.assertIn('simpl_http_requests_total{method="GET",'
+                      'route="/widgets/<widget_id>",status="404"} 1', text)
+        self.assertIn('simpl_http_requests_total{method="GET",'
+                      'route="<unmatched>",status="404"} 1', text)
+        self.assertNotIn('/widgets/1', text)
+
+    def test_histogram(self):
+        with mock.patch.object(metrics, '_clock', side_effect=[0, 0.03]):
+            self.client.get('/widgets/1')
+        text = self.middleware.render()
+        labels = 'method="GET",route="/widgets/<widget_id>"'
+        self.assertIn('simpl_http_request_duration_seconds_bucket{le="0.025",'
+                      '%s} 0' % labels, text)
+        self.assertIn('simpl_http_request_duration_seconds_bucket{le="0.05",'
+                      '%s} 1' % labels, text)
+        self.assertIn('simpl_http_request_duration_seconds_bucket{le="+Inf",'
+                      '%s} 1' % labels, text)
+        self.assertIn('simpl_http_request_duration_seconds_sum{%s} 0.03' %
+                      labels, text)
+        self.assertIn('simpl_http_request_duration_seconds_count{%s} 1' %
+                      labels, text)
+
+    def test_exception(self):
+        self.assertRaises(ValueError, self.client.post, '/widgets')
+        self.assertIn('simpl_http_requests_total{method="POST",'
+                      'route="/widgets",status="500"} 1',
+                      self.middleware.render())
+        self.assertEqual(self.middleware.in_flight, 0)
+
+    def test_in_flight(self):
+        seen = []
+        app = make_app()
+
+        @app.get('/gauge')
+        def gauge():  # pylint: disable=unused-variable
+            seen.append(self.middleware.in_flight)
+            return 'ok'
+        self.middleware.app = app
+        self.client.get('/gauge')
+        self.assertEqual(seen, [1])
+        self.assertIn('simpl_http_requests_in_flight 0',
+                      self.middleware.render())
+
+    def test_escaping(self):
+        self.assertEqual(metrics._escape('a"b\\c\nd'), 'a\\"b\\\\c\\nd')
+
+
+class TestServerMetrics(unittest.TestCase):
+
+    def test_build_application(self):
+        conf = config.Config(options=server.OPTIONS).parse(
+            argv=['simpl', '--metrics', '--quiet'])
+        conf['app'] = make_app()
+        app = server.build_application(conf)
+        self.assertIsInstance(app, metrics.MetricsMiddleware)
+        client = webtest.TestApp(app)
+        client.get('/widgets/1')
+        resp = client.get('/_simpl/metrics')
+        self.assertEqual(resp.content_type, 'text/plain')
+        self.assertIn('route="/widgets/<widget_id>",status="200"} 1',
+                      resp.text)
+
+    def test_disabled_by_default(self):
+        conf = config.Config(options=server.OPTIONS).parse(
+            argv=['simpl', '--quiet'])
+        bottle_app = make_app()
+        conf['app'] = bottle_app
+        self.assertIs(server.build_application(conf), bottle_app)
+
+
+if __name__ == '__main__':
+    unittest.main()
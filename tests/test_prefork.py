@@ -0,0 +1,285 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Test :mod:`simpl.prefork` and `simpl server --workers`."""
+
+import os
+import select
+import signal
+import socket
+import time
+import unittest
+
+import bottle
+import mock
+import requests
+
+from simpl import config
+from simpl import prefork
+from simpl import server
+from tests.test_server import get_free_port
+
+
+def start_master(serve, workers=2):
+    """Fork a master running an Arbiter. Returns (pid, port, pid pipe).
+
+    Each worker writes its pid to the pipe when it starts.
+    """
+    port = get_free_port()
+    pipe_out, pipe_in = os.pipe()
+    pid = os.fork()
+    if pid:
+        os.close(pipe_in)
+        return pid, port, pipe_out
+    os.close(pipe_out)
+
+    def worker(sock):
+        os.write(pipe_in, ('%d\n' % os.getpid()).encode())
+        serve(sock)
+
+    status = 1
+    try:
+        arbiter = prefork.Arbiter(
+            worker, workers, check_interval=0.05, min_uptime=0,
+            graceful_timeout=2,
+            listen=lambda: prefork.bind_socket('127.0.0.1', port))
+        arbiter.run()
+        status = 0
+    finally:
+        os._exit(status)
+
+
+def read_pids(pipe, count, timeout=10):
+    """Read `count` worker pids from the pipe."""
+    pids = []
+    data = b''
+    deadline = time.time() + timeout
+    while len(pids) < count:
+        ready, _, _ = select.select([pipe], [], [], deadline - time.time())
+        if not ready:
+            raise AssertionError("Only %d of %d workers started" %
+                                 (len(pids), count))
+        data += os.read(pipe, 1024)
+        lines = data.split(b'\n')
+        data = lines.pop()
+        pids.extend(int(line) for line in lines)
+    return pids
+
+
+def serve_pid(sock):
+    """Reply to each connection with our pid."""
+    while True:
+        conn, _ = sock.accept()
+        conn.sendall(str(os.getpid()).encode())
+        conn.close()
+
+
+def ask_pid(port):
+    """Connect and return the pid of the worker that answered."""
+    conn = socket.create_connection(('127.0.0.1', port), timeout=5)
+    try:
+        return int(conn.recv(64))
+    finally:
+        conn.close()
+
+
+def wait_gone(pids, timeout=10):
+    """Wait for processes (that are not our children) to go away."""
+    deadline = time.time() + timeout
+    for pid in pids:
+        while time.time() < deadline:
+            try:
+                os.kill(pid, 0)
+            except OSError:
+                break
+            time.sleep(0.05)
+        else:
+            raise AssertionError("Process %s is still running" % pid)
+
+
+def wait_exit(pid, timeout=10):
+    """Wait for a child process and return its exit status."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return status
+        time.sleep(0.05)
+    os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+    raise AssertionError("Process %s did not exit" % pid)
+
+
+class TestArbiter(unittest.TestCase):
+
+    def setUp(self):
+        self.master, self.port, self.pipe = start_master(serve_pid)
+        self.addCleanup(os.close, self.pipe)
+        self.started = []
+
+    def tearDown(self):
+        for pid in [self.master] + self.started:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        try:
+            os.waitpid(self.master, 0)
+        except OSError:
+            pass
+
+    def read_pids(self, count):
+        pids = read_pids(self.pipe, count)
+        self.started.extend(pids)
+        return pids
+
+    def test_lifecycle(self):
+        workers = set(self.read_pids(2))
+        self.assertEqual(len(workers), 2)
+        self.assertNotIn(self.master, workers)
+        self.assertIn(ask_pid(self.port), workers)
+
+        # A dead worker is replaced
+        dead = workers.pop()
+        os.kill(dead, signal.SIGKILL)
+        workers.update(self.read_pids(1))
+        self.assertNotIn(dead, workers)
+        self.assertEqual(len(workers), 2)
+
+        # SIGHUP replaces all workers
+        os.kill(self.master, signal.SIGHUP)
+        reloaded = set(self.read_pids(2))
+        self.assertFalse(reloaded & workers)
+        wait_gone(workers)
+        self.assertIn(ask_pid(self.port), reloaded)
+
+        # SIGTERM stops the workers and the master cleanly
+        os.kill(self.master, signal.SIGTERM)
+        self.assertEqual(wait_exit(self.master), 0)
+        wait_gone(reloaded, timeout=0.5)
+
+
+class TestServerWorkers(unittest.TestCase):
+
+    def make_conf(self, *argv):
+        return config.Config(options=server.OPTIONS).parse(
+            argv=['simpl', '--quiet'] + list(argv))
+
+    def test_workers_option(self):
+        self.assertEqual(self.make_conf().workers, 1)
+        self.assertEqual(self.make_conf('--workers', '3').workers, 3)
+
+    @mock.patch.object(server, 'run_prefork')
+    def test_run_dispatch(self, mock_prefork):
+        conf = self.make_conf('--workers', '2')
+        server.run(conf, build_app=False)
+        mock_prefork.assert_called_once_with(conf, build_app=False)
+
+    def test_unsupported_adapter(self):
+        conf = self.make_conf('--workers', '2', '--server', 'wsgiref')
+        self.assertRaises(ValueError, server.run, conf)
+
+    def test_xtornado_workers(self):
+        port = get_free_port()
+        app = bottle.Bottle()
+        app.route('/pid', callback=lambda: str(os.getpid()))
+        conf = self.make_conf('--workers', '2', '--server', 'xtornado',
+                              '--host', '127.0.0.1', '--port', str(port))
+        conf['app'] = app
+        pid = os.fork()
+        if not pid:
+            try:
+                server.run(conf, build_app=False)
+            finally:
+                os._exit(0)
+        try:
+            session = requests.Session()
+            session.mount('http://', requests.adapters.HTTPAdapter(
+                max_retries=requests.packages.urllib3.util.Retry(
+                    total=8, backoff_factor=0.1)))
+            pids = set()
+            for _ in range(20):
+                resp = session.get('http://127.0.0.1:%s/pid' % port)
+                pids.add(int(resp.text))
+            self.assertNotIn(pid, pids)
+        finally:
+            os.kill(pid, signal.SIGTERM)
+            self.assertEqual(wait_exit(pid), 0)
+
+
+@unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'), "needs SO_REUSEPORT")
+class TestReusePort(unittest.TestCase):
+
+    def make_conf(self, *argv):
+        return config.Config(options=server.OPTIONS).parse(
+            argv=['simpl', '--quiet', '--workers', '2'] + list(argv))
+
+    def test_get_socket(self):
+        port = get_free_port()
+        socks = [server.XEventletServer(host='127.0.0.1', port=port,
+                                        reuse_port='true').get_socket()
+                 for _ in range(2)]
+        for sock in socks:
+            self.assertEqual(sock.getsockopt(socket.SOL_SOCKET,
+                                             socket.SO_REUSEPORT), 1)
+            sock.close()
+
+    @mock.patch.object(prefork, 'Arbiter')
+    def test_workers_bind(self, mock_arbiter):
+        server.run(self.make_conf('--server', 'xeventlet', '--reuse-port'))
+        self.assertIsNone(mock_arbiter.call_args[1]['listen'])
+
+    @mock.patch.object(prefork, 'Arbiter')
+    def test_master_binds_by_default(self, mock_arbiter):
+        server.run(self.make_conf('--server', 'xeventlet'))
+        self.assertIsNotNone(mock_arbiter.call_args[1]['listen'])
+
+    def test_unsupported_adapter(self):
+        conf = self.make_conf('--server', 'xtornado', '-o', 'reuse_port=1')
+        self.assertRaises(ValueError, server.run, conf)
+
+    def test_xeventlet_workers(self):
+        port = get_free_port()
+        conf = self.make_conf('--server', 'xeventlet', '--reuse-port',
+                              '--host', '127.0.0.1', '--port', str(port))
+        pid = os.fork()
+        if not pid:
+            try:
+                import eventlet
+                eventlet.monkey_patch()
+                app = bottle.Bottle()
+                app.route('/pid', callback=lambda: str(os.getpid()))
+                conf['app'] = app
+                server.run(conf, build_app=False)
+            finally:
+                os._exit(0)
+        try:
+            session = requests.Session()
+            session.mount('http://', requests.adapters.HTTPAdapter(
+                max_retries=requests.packages.urllib3.util.Retry(
+                    total=8, backoff_factor=0.1)))
+            pids = set()
+            for _ in range(50):
+                pids.add(session.get('http://127.0.0.1:%s/pid' % port,
+                                     headers={'Connection': 'close'}).text)
+                if len(pids) == 2:
+                    break
+            self.assertEqual(len(pids), 2)
+        finally:
+            os.kill(pid, signal.SIGTERM)
+            self.assertEqual(wait_exit(pid), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,6 +14,8 @@
 
 """Test :mod:`simpl.rest`."""
 
+import json
+import threading
 import unittest
 
 import bottle
@@ -94,6 +96,255 @@ class TestBodyDecorator(unittest.TestCase):
         route()
         mock_handler.assert_called_once_with(100)
 
+    @mock.patch.object(rest.bottle, 'request')
+    def test_max_bytes(self, mock_request):
+        """Test bodies over max_bytes are rejected before being read."""
+        mock_request.content_length = 11
+        mock_handler = mock.Mock()
+        route = rest.body(max_bytes=10)(mock_handler)
+        with self.assertRaises(bottle.HTTPError) as context:
+            route()
+        self.assertEqual(context.exception.status_code, 413)
+        mock_handler.assert_not_called()
+
+    def test_max_bytes_chunked(self):
+        """Test chunked bodies are cut off once over max_bytes."""
+        app = bottle.Bottle()
+
+        @app.post('/')
+        @rest.body(max_bytes=100)
+        def post(data):  # pylint: disable=W0612
+            return {'length': len(data)}
+
+        def chunked(raw):
+            parts = [raw[i:i + 10] for i in range(0, len(raw), 10)] + [b'']
+            return b''.join(('%x\r\n' % len(part)).encode('ascii') + part +
+                            b'\r\n' for part in parts)
+
+        def post_chunked(raw):
+            req = webtest.TestRequest.blank(
+                '/', method='POST', body=chunked(raw),
+                content_type='application/json')
+            del req.environ['CONTENT_LENGTH']
+            req.environ['HTTP_TRANSFER_ENCODING'] = 'chunked'
+            return webtest.TestApp(app).do_request(req, expect_errors=True)
+
+        self.assertEqual(post_chunked(b'[1, 2, 3]').json, {'length': 3})
+        res = post_chunked(json.dumps(list(range(1000))).encode('utf-8'))
+        self.assertEqual(res.status_int, 413)
+
+
+class TestStreamingBody(unittest.TestCase):
+
+    """Tests for :func:`simpl.rest.body` with `stream=True`."""
+
+    def setUp(self):
+        self.received = []
+        app = bottle.Bottle()
+        app.default_error_handler = rest.httperror_handler
+
+        @app.post('/bulk')
+        @rest.body(stream=True, max_bytes=1000, schema=dict)
+        def bulk(items):  # pylint: disable=W0612
+            for item in items:
+                self.received.append(item)
+            return {'count': len(self.received)}
+
+        @app.post('/required')
+        @rest.body(stream=True, required=True)
+        def required(items):  # pylint: disable=W0612
+            return {'count': len(list(items))}
+
+        self.app = webtest.TestApp(app)
+
+    def test_array(self):
+        res = self.app.post('/bulk', '[{"a": 1}, {"b": 2}]',
+                            content_type='application/json')
+        self.assertEqual(res.json, {'count': 2})
+        self.assertEqual(self.received, [{'a': 1}, {'b': 2}])
+
+    def test_ndjson(self):
+        res = self.app.post('/bulk', '{"a": 1}\n\n{"b": 2}\n',
+                            content_type='application/x-ndjson')
+        self.assertEqual(res.json, {'count': 2})
+
+    def test_invalid_item(self):
+        res = self.app.post('/bulk', '[{"a": 1}, {"b": ]',
+                            content_type='application/json',
+                            expect_errors=True)
+        self.assertEqual(res.status_int, 400)
+        self.assertIn('item 1', res.json['message'])
+
+    def test_schema_per_item(self):
+        res = self.app.post('/bulk', '[{"a": 1}, 3]',
+                            content_type='application/json',
+                            expect_errors=True)
+        self.assertEqual(res.status_int, 400)
+        self.assertIn('Item 1', res.json['message'])
+
+    def test_too_large(self):
+        res = self.app.post('/bulk', '[%s]' % ', '.join(['{}'] * 500),
+                            content_type='application/json',
+                            expect_errors=True)
+        self.assertEqual(res.status_int, 413)
+        self.assertEqual(self.received, [])
+
+    def test_unsupported_type(self):
+        res = self.app.post('/bulk', 'a,b', content_type='text/csv',
+                            expect_errors=True)
+        self.assertEqual(res.status_int, 415)
+
+    def test_required(self):
+        res = self.app.post('/required', '[]',
+                            content_type='application/json',
+                            expect_errors=True)
+        self.assertEqual(res.status_int, 400)
+
+
+class TestIncrementalParsers(unittest.TestCase):
+
+    """Tests for :func:`simpl.rest.iter_json_array` and `iter_ndjson`."""
+
+    data = [1, -1.5e3, "a,]b", {"x": [1, {"y": "]"}]}, None, True, [], {},
+            u"\u00e9\u2603"]
+
+    def test_array_any_chunk_size(self):
+        raw = json.dumps(self.data).encode('utf-8')
+        for size in range(1, 20):
+            chunks = [raw[i:i + size] for i in range(0, len(raw), size)]
+            self.assertEqual(list(rest.iter_json_array(chunks)), self.data)
+
+    def test_empty(self):
+        self.assertEqual(list(rest.iter_json_array([b' [ ] '])), [])
+        self.assertEqual(list(rest.iter_json_array([])), [])
+
+    def test_invalid_arrays(self):
+        for raw in (b'{}', b'[1 2]', b'[1,', b'[1,]', b'[1x]', b'[\xff]',
+                    b'[1]x', b'[] ]', b'[1'):
+            with self.assertRaises(bottle.HTTPError):
+                list(rest.iter_json_array([raw]))
+
+    def test_trailing_whitespace(self):
+        self.assertEqual(list(rest.iter_json_array([b'[1] ', b'\n'])), [1])
+
+    def test_invalid_item_fails_fast(self):
+        def chunks():
+            yield b'[1, {"a": x, "b": [2]}, '
+            self.fail("read past the invalid item")
+        with self.assertRaises(bottle.HTTPError) as context:
+            list(rest.iter_json_array(chunks()))
+        self.assertIn('item 1', context.exception.body)
+
+    def test_ndjson(self):
+        raw = b'{"a": 1}\n\n[2]\r\n3'
+        self.assertEqual(list(rest.iter_ndjson([raw[:3], raw[3:]])),
+                         [{'a': 1}, [2], 3])
+
+    def test_ndjson_line_number(self):
+        with self.assertRaises(bottle.HTTPError) as context:
+            list(rest.iter_ndjson([b'1\n\n{\n']))
+        self.assertIn('line 3', context.exception.body)
+
+
+class TestNDJSON(unittest.TestCase):
+
+    """Tests for :func:`simpl.rest.ndjson_body` and `ndjson_response`."""
+
+    def setUp(self):
+        app = bottle.Bottle()
+        app.default_error_handler = rest.httperror_handler
+
+        @app.post('/strict')
+        @rest.ndjson_body(schema=dict)
+        def strict(reader):  # pylint: disable=W0612
+            return {'items': list(reader)}
+
+        @app.post('/lenient')
+        @rest.ndjson_body(schema=dict, strict=False, max_errors=2)
+        def lenient(reader):  # pylint: disable=W0612
+            items = list(reader)
+            return {'count': reader.count, 'errors': reader.errors,
+                    'items': items}
+
+        @app.get('/export')
+        def export():  # pylint: disable=W0612
+            return rest.ndjson_response(({'id': i} for i in range(5)),
+                                        flush_lines=2)
+
+        self.app = webtest.TestApp(app)
+
+    def post(self, path, body, **kwargs):
+        return self.app.post(path, body, content_type='application/x-ndjson',
+                             **kwargs)
+
+    def test_strict(self):
+        res = self.post('/strict', '{"a": 1}\n{"b": 2}\n')
+        self.assertEqual(res.json, {'items': [{'a': 1}, {'b': 2}]})
+
+    def test_strict_error(self):
+        res = self.post('/strict', '{"a": 1}\n{"b": \n', expect_errors=True)
+        self.assertEqual(res.status_int, 400)
+        self.assertIn('line 2', res.json['message'])
+
+    def test_lenient_errors(self):
+        res = self.post('/lenient', '{"a": 1}\n\nnope\n[1]\n{"b": 2}')
+        self.assertEqual(res.json['count'], 2)
+        self.assertEqual([e['line'] for e in res.json['errors']], [3, 4])
+
+    def test_max_errors(self):
+        res = self.post('/lenient', 'x\ny\nz\n', expect_errors=True)
+        self.assertEqual(res.status_int, 400)
+        self.assertIn('Too many invalid lines', res.json['message'])
+
+    def test_wrong_type(self):
+        res = self.app.post('/strict', '[]', content_type='application/json',
+                            expect_errors=True)
+        self.assertEqual(res.status_int, 415)
+
+    def test_response(self):
+        res = self.app.get('/export')
+        self.assertEqual(res.content_type, 'application/x-ndjson')
+        lines = res.body.decode('utf-8').splitlines()
+        self.assertEqual([json.loads(l) for l in lines],
+                         [{'id': i} for i in range(5)])
+
+    def test_response_batches(self):
+        chunks = list(rest.ndjson_response(
+            iter([{'a': 1}] * 5), flush_lines=2,
+            response=bottle.BaseResponse()))
+        self.assertEqual(chunks, [b'{"a":1}\n{"a":1}\n'] * 2 +
+                         [b'{"a":1}\n'])
+
+    def check_slow_producer(self, flush_seconds):
+        release = threading.Event()
+        produced = []
+
+        def items():
+            produced.append(0)
+            yield {'id': 0}
+            release.wait(5)
+            produced.append(1)
+            yield {'id': 1}
+        chunks = rest.ndjson_response(items(), flush_seconds=flush_seconds,
+                                      response=bottle.BaseResponse())
+        self.assertEqual(next(chunks), b'{"id":0}\n')
+        self.assertEqual(produced, [0])
+        release.set()
+        self.assertEqual(list(chunks), [b'{"id":1}\n'])
+
+    def test_response_slow_producer(self):
+        self.check_slow_producer(0.05)
+
+    def test_response_unbuffered(self):
+        self.check_slow_producer(0)
+
+    def test_response_error(self):
+        def items():
+            yield {'id': 0}
+            raise ValueError('cursor lost')
+        chunks = rest.ndjson_response(items(), response=bottle.BaseResponse())
+        self.assertRaises(ValueError, list, chunks)
+
 
 class TestRangeResponse(unittest.TestCase):
 
@@ -189,6 +440,8 @@ class TestRangeResponse(unittest.TestCase):
         )
         self.assertEqual(206, bottle.response.status_code)
         six.assertCountEqual(self, [
+            ('Link', '</widgets?limit=2&offset=3>; rel="next"; '
+                     'title="Next page"'),
             ('Link', '</widgets?limit=2>; rel="first"; '
                      'title="First page"'),
             ('Link', '</widgets?offset=2>; rel="last"; '
@@ -243,6 +496,70 @@ class TestRangeResponse(unittest.TestCase):
             bottle.response.headerlist
         )
 
+    def test_pagination_no_count_short_page(self):
+        rest.write_pagination_headers(
+            {'data': ['A'], 'collection-count': None},
+            0, 1, bottle.response, '/fibbles', 'fibble'
+        )
+        rest.write_pagination_headers(
+            {'data': ['A', 'B', 'C']},
+            0, 2, bottle.response, '/fibbles', 'fibble'
+        )
+        self.assertEqual(206, bottle.response.status_code)
+
+    def test_pagination_last_page_has_no_next(self):
+        rest.write_pagination_headers(
+            {'collection-count': 5, 'data': ['E']},
+            4, 2, bottle.response, '/widgets', 'widget'
+        )
+        links = [v for k, v in bottle.response.headerlist if k == 'Link']
+        self.assertFalse(any('rel="next"' in l for l in links))
+
+    def test_pagination_no_limit_with_offset(self):
+        rest.write_pagination_headers(
+            {'collection-count': 5, 'data': ['D', 'E']},
+            3, None, bottle.response, '/widgets', 'widget'
+        )
+        self.assertEqual(206, bottle.response.status_code)
+        self.assertIn(('Content-Range', 'widget 3-4/5'),
+                      bottle.response.headerlist)
+        self.assertNotIn('Link', dict(bottle.response.headerlist))
+
+    def test_pagination_preserves_query(self):
+        rest.write_pagination_headers(
+            {'collection-count': 8, 'data': ['C', 'D']},
+            2, 2, bottle.response, '/widgets', 'widget',
+            query=[('limit', '2'), ('status', 'A B'), ('sort', '-name'),
+                   ('offset', '2')]
+        )
+        self.assertIn(
+            ('Link', '</widgets?limit=2&offset=4&status=A+B&sort=-name>; '
+                     'rel="next"; title="Next page"'),
+            bottle.response.headerlist)
+        self.assertIn(
+            ('Link', '</widgets?offset=6&status=A+B&sort=-name>; '
+                     'rel="last"; title="Last page"'),
+            bottle.response.headerlist)
+
+    def test_pagination_body_links(self):
+        data = {'collection-count': 8, 'data': ['D', 'E']}
+        rest.write_pagination_headers(
+            data, 3, 2, bottle.response, '/widgets', 'widget',
+            query=[('q', 'x')], body_links=True)
+        self.assertEqual(data['link'], {
+            'next': '/widgets?limit=2&offset=5&q=x',
+            'previous': '/widgets?limit=2&offset=1&q=x',
+            'first': '/widgets?limit=2&q=x',
+            'last': '/widgets?offset=6&q=x',
+        })
+
+    def test_paginator_cached(self):
+        self.assertIs(rest.get_paginator('/widgets', 'widget'),
+                      rest.get_paginator('/widgets', 'widget'))
+        response = bottle.BaseResponse()
+        rest.get_paginator().write({'data': []}, 0, 1, response, '/a/b/')
+        self.assertEqual(response.headers['Content-Range'], 'b 0-0/0')
+
     def test_paginated_decoration(self):
         """Test decorated function is called."""
         mock_handler = mock.Mock(return_value={})
@@ -259,6 +576,39 @@ class TestRangeResponse(unittest.TestCase):
         self.assertIsNone(decorated(limit='invalid'))
         mock_handler.assert_not_called()
 
+    def test_paginated_route(self):
+        app = bottle.Bottle()
+
+        @app.get('/widgets')
+        @rest.paginated(body_links=True)
+        def widgets(offset=None, limit=None):  # pylint: disable=W0612
+            return {'collection-count': 10, 'data': list(range(limit))}
+
+        res = webtest.TestApp(app).get('/widgets?limit=3&sort=name')
+        self.assertEqual(res.status_int, 206)
+        self.assertEqual(res.headers['Content-Range'], 'widgets 0-2/10')
+        self.assertEqual(res.json['link']['next'],
+                         '/widgets?limit=3&offset=3&sort=name')
+
+    def test_paginated_route_params(self):
+        app = bottle.Bottle()
+
+        @app.get('/tenants/<tenant_id>/widgets')
+        @rest.paginated(body_links=True)
+        def widgets(tenant_id, limit=None, **_):  # pylint: disable=W0612
+            return {'collection-count': 10, 'data': [tenant_id] * limit}
+
+        test_app = webtest.TestApp(app)
+        for tenant_id in ('1', '2'):
+            res = test_app.get('/tenants/%s/widgets?limit=3' % tenant_id)
+            self.assertEqual(res.headers['Content-Range'], 'widgets 0-2/10')
+            self.assertEqual(res.json['link']['next'],
+                             '/tenants/%s/widgets?limit=3&offset=3' %
+                             tenant_id)
+        self.assertIn(('/tenants/<tenant_id>/widgets', None),
+                      rest._PAGINATORS)
+        self.assertNotIn(('/tenants/1/widgets', None), rest._PAGINATORS)
+
 
 class TestProcessParams(unittest.TestCase):
 
@@ -0,0 +1,170 @@
+# Copyright (c) 2011-2015 Rackspace US, Inc.
+# All Rights Reserved.
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for :mod:`simpl.routing`."""
+
+import itertools
+import random
+import unittest
+
+import bottle
+import webtest
+
+from simpl import config
+from simpl import routing
+from simpl import server
+
+RULES = [
+    ('GET', '/'),
+    ('GET', '/widgets'),
+    ('GET', '/widgets/'),
+    ('GET', '/widgets/<widget_id>'),
+    ('GET', '/widgets/new'),
+    ('GET', '/widgets/<widget_id>/parts/<part:int>'),
+    ('GET', '/widgets/<widget_id>/parts/<name>'),
+    ('GET', '/files/<name>.<ext>'),
+    ('GET', '/files/<name>.json'),
+    ('GET', '/prices/<amount:float>'),
+    ('GET', '/hex/<value:re:[0-9a-f]+>'),
+    ('GET', '/<tenant>/widgets'),
+    ('GET', '/v<version:int>/<:re:[a-z]+>/info'),
+    ('POST', '/widgets'),
+    ('PUT', '/widgets/<widget_id>'),
+    ('DELETE', '/widgets/<widget_id>'),
+    ('ANY', '/any/<thing>'),
+    ('HEAD', '/head-only/<x>'),
+]
+PATHS = [
+    '', '/', '/widgets', '/widgets/', '/widgets/1', '/widgets/new',
+    '/widgets/1/parts/2', '/widgets/1/parts/-2', '/widgets/1/parts/x',
+    '/widgets/1/parts', '/files/a.b', '/files/a.json', '/files/a.b.json',
+    '/files/.json', '/prices/1.5', '/prices/1.5.5', '/prices/x',
+    '/hex/ff0', '/hex/xyz', '/acme/widgets', '/widgets/widgets',
+    '/v2/abc/info', '/v2/ABC/info', '/vx/abc/info', '/any/1', '/any/',
+    '/head-only/1', '/nothing', '/widgets/1/2', '//widgets', '/widgets//',
+]
+METHODS = ['GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'PATCH']
+
+
+def make_app(rules=RULES):
+    app = bottle.Bottle()
+    for method, rule in rules:
+        app.route(rule, method=method, callback=lambda **kwargs: kwargs)
+    return app
+
+
+def outcome(match, method, path):
+    """Return what a match function makes of a request."""
+    environ = {'REQUEST_METHOD': method, 'PATH_INFO': path}
+    try:
+        route, args = match(environ)
+    except bottle.HTTPError as exc:
+        return exc.status_code, exc.headers.get('Allow')
+    return route.method, route.rule, args
+
+
+class TestDispatchTable(unittest.TestCase):
+
+    def check_same(self, app, paths, methods=METHODS):
+        table = routing.DispatchTable(app.router)
+        for method, path in itertools.product(methods, paths):
+            self.assertEqual(outcome(table.fast_match, method, path),
+                             outcome(app.router.match, method, path),
+                             '%s %s' % (method, path))
+        return table
+
+    def test_same_as_bottle(self):
+        table = self.check_same(make_app(), PATHS)
+        self.assertEqual(table.fallback, set())
+
+    def test_random_paths(self):
+        rand = random.Random(42)
+        parts = ['widgets', 'parts', 'files', 'new', '1', '-3', '2.5',
+                 'a.json', 'ff', 'v1', 'info', 'x.y', '']
+        paths = ['/' + '/'.join(rand.choice(parts)
+                                for _ in range(rand.randint(0, 5)))
+                 for _ in range(500)]
+        self.check_same(make_app(), paths, methods=['GET', 'HEAD', 'PUT'])
+
+    def test_first_added_wins(self):
+        app = make_app([('GET', '/<a>/<b>'), ('GET', '/x/<b>'),
+                        ('GET', '/<a>/y')])
+        table = self.check_same(app, ['/x/y', '/x/z', '/z/y'])
+        self.assertEqual(outcome(table.fast_match, 'GET', '/x/y')[1],
+                         '/<a>/<b>')
+
+    def test_fallback(self):
+        app = make_app([('GET', '/a/<x>'), ('GET', '/static/<p:path>'),
+                        ('GET', '/b/<x:re:.+>'), ('POST', '/a/<x>')])
+        table = self.check_same(app, ['/a/1', '/static/a/b', '/b/1/2',
+                                      '/c'])
+        self.assertEqual(table.fallback, {'GET'})
+        self.assertIn('POST', table.tries)
+
+    def test_segment_safe(self):
+        self.assertTrue(routing._segment_safe('[0-9a-f]+'))
+        self.assertTrue(routing._segment_safe(r'\w{2,4}-\d+'))
+        self.assertFalse(routing._segment_safe('.+'))
+        self.assertFalse(routing._segment_safe('[^.]+'))
+        self.assertFalse(routing._segment_safe('[!-~]+'))
+        self.assertFalse(routing._segment_safe('a|b'))
+
+    def test_routes_added_later(self):
+        app = make_app()
+        routing.accelerate(app)
+        app.route('/later/<x:int>', callback=lambda x: {'x': x})
+        self.assertEqual(webtest.TestApp(app).get('/later/3').json,
+                         {'x': 3})
+
+    def test_through_bottle(self):
+        app = make_app()
+        routing.accelerate(app)
+        client = webtest.TestApp(app)
+        self.assertEqual(client.get('/widgets/1/parts/2').json,
+                         {'widget_id': '1', 'part': 2})
+        self.assertEqual(client.post('/widgets/1', status=405).headers[
+            'Allow'], 'DELETE,GET,PUT')
+        client.get('/nothing', status=404)
+        client.get('/prices/1.2.3', status=400)
+
+    def test_debug_report(self):
+        app = make_app()
+        table = routing.accelerate(app, debug=True)
+        client = webtest.TestApp(app)
+        client.get('/widgets/1')
+        client.get('/widgets/2')
+        client.get('/nothing', status=404)
+        self.assertEqual(table.stats[('GET', '/widgets/<widget_id>')][0], 2)
+        self.assertEqual(table.stats[('GET', routing.UNMATCHED)][0], 1)
+        report = table.report()
+        self.assertIn('/widgets/<widget_id>', report)
+        table.uninstall()
+        client.get('/widgets/3')
+        self.assertEqual(table.stats[('GET', '/widgets/<widget_id>')][0], 2)
+
+
+class TestServerFastRoutes(unittest.TestCase):
+
+    def test_build_application(self):
+        conf = config.Config(options=server.OPTIONS).parse(
+            argv=['simpl', '--fast-routes', '--quiet'])
+        conf['app'] = make_app()
+        client = webtest.TestApp(server.build_application(conf))
+        self.assertIn('version', client.get('/_simpl').json)
+        self.assertIsInstance(conf.app.router.match.__self__,
+                              routing.DispatchTable)
+
+
+if __name__ == '__main__':
+    unittest.main()
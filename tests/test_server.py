@@ -14,18 +14,23 @@
 
 """Test :mod:`simpl.server`."""
 
+import json
 import multiprocessing
 import os
 import signal
 import socket
+import sys
+import threading
 import time
 import unittest
 
 import bottle
 import mock
 import requests
+import six
 
 from simpl import cli as simpl_cli
+from simpl import config
 from simpl import server
 
 
@@ -37,6 +42,9 @@ class TestServer(unittest.TestCase):
     def test_xeventlet_registered(self):
         self.assertIs(bottle.server_names['xeventlet'], server.XEventletServer)
 
+    def test_xasyncio_registered(self):
+        self.assertIs(bottle.server_names['xasyncio'], server.XAsyncioServer)
+
     def test_xtornado(self):
         resp = run_server('xtornado')
         self.assertTrue(resp.ok)
@@ -47,6 +55,12 @@ class TestServer(unittest.TestCase):
         self.assertTrue(resp.ok)
         self.assertEqual(resp.content, b'<b>Hello xeventlet</b>!')
 
+    @unittest.skipIf(sys.version_info < (3, 5), "requires Python 3.5+")
+    def test_xasyncio(self):
+        resp = run_server('xasyncio')
+        self.assertTrue(resp.ok)
+        self.assertEqual(resp.content, b'<b>Hello xasyncio</b>!')
+
     def test_simpl_server(self):
         argv = ['server', '--quiet', '--port', str(get_free_port())]
         proc = multiprocessing.Process(
@@ -57,6 +71,280 @@ class TestServer(unittest.TestCase):
         self.assertTrue(proc.is_alive())
         proc.terminate()
 
+    def test_get_config(self):
+        with mock.patch.object(server, '_CONFIG', None):
+            conf = server.get_config()
+            self.assertIs(server.get_config(), conf)
+        self.assertEqual(conf.prog, 'simpl_server')
+
+    def test_config_built_on_use(self):
+        with mock.patch.object(server, '_CONFIG', None):
+            from simpl.server import CONFIG
+            self.assertIsNone(server._CONFIG)
+            self.assertEqual(CONFIG.prog, 'simpl_server')
+            conf = server.get_config()
+            CONFIG['app'] = 'my.app:app'
+            self.assertEqual(conf['app'], 'my.app:app')
+            self.assertEqual(server.CONFIG.app, 'my.app:app')
+            self.assertIn('app', server.CONFIG)
+
+
+class TestGracefulShutdown(unittest.TestCase):
+
+    def test_xtornado(self):
+        self.check_drains('xtornado')
+
+    def test_xeventlet(self):
+        self.check_drains('xeventlet')
+
+    def test_xtornado_threads(self):
+        self.check_drains('xtornado', threads=2)
+
+    @unittest.skipIf(sys.version_info < (3, 5), "requires Python 3.5+")
+    def test_xasyncio(self):
+        self.check_drains('xasyncio')
+
+    def check_drains(self, adapter, **options):
+        """SIGTERM during a slow request: it completes, then hooks run."""
+        port = get_free_port()
+        hook_out, hook_in = os.pipe()
+        pid = os.fork()
+        if not pid:
+            status = 1
+            try:
+                os.close(hook_out)
+                if adapter == 'xeventlet':
+                    import eventlet
+                    eventlet.monkey_patch()
+                app = bottle.Bottle()
+
+                @app.route('/slow')
+                def slow():  # pylint: disable=unused-variable
+                    time.sleep(0.5)
+                    return 'done'
+
+                server.SHUTDOWN_HOOKS[:] = []
+                server.on_shutdown(lambda: os.write(hook_in, b'closed'))
+                bottle.run(app=app, server=adapter, host='127.0.0.1',
+                           port=port, quiet=True, graceful_timeout=5,
+                           **options)
+                status = 0
+            finally:
+                os._exit(status)
+        os.close(hook_in)
+        try:
+            session = requests.Session()
+            session.mount("http://", requests.adapters.HTTPAdapter(
+                max_retries=requests.packages.urllib3.util.Retry(
+                    total=8, backoff_factor=0.1)))
+            session.get('http://127.0.0.1:%s/hello' % port)  # wait for it
+            result = {}
+
+            def request():
+                result['response'] = session.get(
+                    'http://127.0.0.1:%s/slow' % port)
+            thread = threading.Thread(target=request)
+            thread.start()
+            time.sleep(0.2)
+            os.kill(pid, signal.SIGTERM)
+            thread.join(10)
+            self.assertEqual(result['response'].text, 'done')
+            deadline = time.time() + 10
+            while time.time() < deadline:
+                done, status = os.waitpid(pid, os.WNOHANG)
+                if done:
+                    break
+                time.sleep(0.05)
+            else:
+                self.fail("%s did not exit after SIGTERM" % adapter)
+            self.assertEqual(status, 0)
+            self.assertEqual(os.read(hook_out, 64), b'closed')
+        finally:
+            os.close(hook_out)
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+
+    def test_xeventlet_idle_keepalive(self):
+        """SIGTERM closes idle keep-alive connections right away."""
+        pid, url = fork_server(slow_app(), 'xeventlet', graceful_timeout=10)
+        self.addCleanup(reap, pid)
+        client = keepalive_client(url)
+        start = time.time()
+        os.kill(pid, signal.SIGTERM)
+        self.assertEqual(client.recv(64), b'')  # closed by the server
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertLess(time.time() - start, 3)
+
+    def test_shutdown_hooks(self):
+        calls = []
+        self.addCleanup(setattr, server, 'SHUTDOWN_HOOKS',
+                        list(server.SHUTDOWN_HOOKS))
+        server.SHUTDOWN_HOOKS[:] = []
+        self.assertIs(server.on_shutdown(mock.Mock(side_effect=ValueError)),
+                      server.SHUTDOWN_HOOKS[0])
+        server.on_shutdown(lambda: calls.append(1))
+        server.run_shutdown_hooks()
+        self.assertEqual(calls, [1])
+
+
+def slow_app():
+    """Return an app with a /slow (0.5s) and a /fast route."""
+    app = bottle.Bottle()
+
+    @app.route('/slow')
+    def slow():  # pylint: disable=unused-variable
+        time.sleep(0.5)
+        return 'slow'
+
+    @app.route('/fast')
+    def fast():  # pylint: disable=unused-variable
+        return 'fast'
+    return app
+
+
+def fork_server(app, adapter, **options):
+    """Serve `app` in a child process. Returns (pid, base url)."""
+    port = get_free_port()
+    pid = os.fork()
+    if not pid:
+        try:
+            if adapter == 'xeventlet':
+                import eventlet
+                eventlet.monkey_patch()
+            bottle.run(app=app, server=adapter, host='127.0.0.1', port=port,
+                       quiet=True, **options)
+        finally:
+            os._exit(0)
+    url = 'http://127.0.0.1:%s' % port
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(
+        max_retries=requests.packages.urllib3.util.Retry(
+            total=8, backoff_factor=0.1)))
+    session.get(url + '/fast')  # wait for it to be up
+    return pid, url
+
+
+def keepalive_client(url):
+    """Return a socket that made one keep-alive request to url."""
+    host, port = url.split('//')[1].split(':')
+    client = socket.create_connection((host, int(port)))
+    client.settimeout(10)
+    client.sendall(b'GET /fast HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    reply = b''
+    while not reply.endswith(b'fast'):
+        data = client.recv(4096)
+        if not data:
+            raise AssertionError("Connection closed after %r" % reply)
+        reply += data
+    return client
+
+
+def reap(pid):
+    """Kill and wait for a server process (if still around)."""
+    try:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    except OSError:
+        pass
+
+
+class TestTornadoThreadPool(unittest.TestCase):
+
+    def start(self, **options):
+        pid, url = fork_server(slow_app(), 'xtornado', **options)
+        self.addCleanup(os.waitpid, pid, 0)
+        self.addCleanup(os.kill, pid, signal.SIGKILL)
+        return url
+
+    def get_in_background(self, url, results):
+        thread = threading.Thread(
+            target=lambda: results.append(requests.get(url)))
+        thread.start()
+        return thread
+
+    def test_slow_request_does_not_block(self):
+        url = self.start(threads=2)
+        results = []
+        thread = self.get_in_background(url + '/slow', results)
+        time.sleep(0.1)
+        start = time.time()
+        self.assertEqual(requests.get(url + '/fast').text, 'fast')
+        self.assertLess(time.time() - start, 0.3)
+        thread.join()
+        self.assertEqual(results[0].text, 'slow')
+
+    def test_queue_full(self):
+        url = self.start(threads=1, max_queue=1, retry_after=2)
+        results = []
+        threads = [self.get_in_background(url + '/slow', results)]
+        time.sleep(0.1)  # one running...
+        threads.append(self.get_in_background(url + '/slow', results))
+        time.sleep(0.1)  # ...one queued
+        resp = requests.get(url + '/fast')
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.headers['Retry-After'], '2')
+        self.assertEqual(resp.json()['code'], 503)
+        for thread in threads:
+            thread.join()
+        self.assertEqual([r.text for r in results], ['slow', 'slow'])
+
+
+class TestTuningOptions(unittest.TestCase):
+
+    @mock.patch.object(bottle, 'run')
+    def test_cli_options(self, mock_run):
+        conf = config.Config(options=server.OPTIONS).parse(argv=[
+            'simpl', '--max-greenthreads', '50', '--keepalive-timeout', '2.5',
+            '--backlog', '64', '-o', 'backlog=128'])
+        conf['app'] = bottle.Bottle()
+        server.run(conf, build_app=False)
+        kwargs = mock_run.call_args[1]
+        self.assertEqual(kwargs['max_greenthreads'], 50)
+        self.assertEqual(kwargs['keepalive_timeout'], 2.5)
+        self.assertEqual(kwargs['backlog'], '128')  # -o wins
+        self.assertNotIn('socket_timeout', kwargs)
+
+    @mock.patch.object(server, '_install_stop_handler')
+    @mock.patch('eventlet.wsgi.server')
+    @mock.patch('eventlet.patcher.is_monkey_patched', return_value=True)
+    def test_xeventlet_translation(self, _, mock_server, __):
+        adapter = server.XEventletServer(
+            max_greenthreads='50', keepalive_timeout='0',
+            socket_timeout='30', shared_socket=mock.Mock())
+        adapter.run(mock.Mock())
+        kwargs = mock_server.call_args[1]
+        self.assertEqual(kwargs['custom_pool'].size, 50)
+        self.assertIs(kwargs['keepalive'], False)
+        self.assertEqual(kwargs['socket_timeout'], 30.0)
+
+    @mock.patch.object(server, '_install_stop_handler')
+    @mock.patch('eventlet.wsgi.server')
+    @mock.patch('eventlet.patcher.is_monkey_patched', return_value=True)
+    def test_xeventlet_keepalive_timeout(self, _, mock_server, __):
+        adapter = server.XEventletServer(keepalive_timeout='2.5',
+                                         shared_socket=mock.Mock())
+        adapter.run(mock.Mock())
+        kwargs = mock_server.call_args[1]
+        self.assertIs(kwargs['keepalive'], True)
+        self.assertEqual(kwargs['protocol'].keepalive_timeout, 2.5)
+
+    def test_xeventlet_idle_connection_closed(self):
+        pid, url = fork_server(slow_app(), 'xeventlet', keepalive_timeout=0.5)
+        self.addCleanup(reap, pid)
+        client = keepalive_client(url)
+        start = time.time()
+        self.assertEqual(client.recv(64), b'')  # closed by the server
+        self.assertGreater(time.time() - start, 0.4)
+        self.assertLess(time.time() - start, 3)
+
+    @mock.patch('eventlet.listen')
+    def test_xeventlet_backlog(self, mock_listen):
+        server.XEventletServer(backlog='64').get_socket()
+        self.assertEqual(mock_listen.call_args[1]['backlog'], 64)
+
 
 class TestEventletLogger(unittest.TestCase):
 
@@ -88,6 +376,88 @@ class TestEventletLogger(unittest.TestCase):
         log.info.assert_called_once_with(entry)
         access_log.write.assert_called_once_with(entry + "\n")
 
+    def test_call_entry_not_logged(self):
+        """With log_requests off, calls only go to the access log."""
+        log = mock.Mock()
+        access_log = mock.Mock()
+        instance = server.EventletLogFilter(log, access_log=access_log,
+                                            log_requests=False)
+        entry = '127.0.0.1 - [07/Jul/2015] "GET / HTTP/1.1" 200'
+        instance.write(entry + "\n")
+        log.info.assert_not_called()
+        access_log.write.assert_called_once_with(entry + "\n")
+
+
+class TestBufferedAccessLog(unittest.TestCase):
+
+    LINE = ('127.0.0.1 - - [07/Jul/2015 16:16:31] "GET /version HTTP/1.1" '
+            '200 151 0.002310\n')
+
+    def make(self, **kwargs):
+        stream = six.StringIO()
+        access_log = server.BufferedAccessLog(stream, **kwargs)
+        self.addCleanup(access_log.close)
+        return access_log, stream
+
+    def test_text(self):
+        access_log, stream = self.make()
+        access_log.write(self.LINE)
+        self.assertEqual(stream.getvalue(), '')  # not written yet
+        access_log.close()
+        self.assertEqual(stream.getvalue(), self.LINE)
+
+    def test_flush_on_size(self):
+        access_log, stream = self.make(flush_lines=2, flush_interval=60)
+        access_log.write(self.LINE)
+        access_log.write(self.LINE)
+        deadline = time.time() + 5
+        while access_log.written < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(stream.getvalue(), self.LINE * 2)
+
+    def test_json(self):
+        access_log, stream = self.make(fmt='json')
+        access_log.write(self.LINE)
+        access_log.write('something else\n')
+        access_log.close()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(json.loads(lines[0]), {
+            'client_ip': '127.0.0.1', 'time': '07/Jul/2015 16:16:31',
+            'method': 'GET', 'path': '/version', 'protocol': 'HTTP/1.1',
+            'status': 200, 'bytes': 151, 'duration': 0.00231})
+        self.assertEqual(json.loads(lines[1]), {'message': 'something else'})
+
+    def test_drops_when_full(self):
+        access_log, stream = self.make(max_queue=2, flush_lines=10,
+                                       flush_interval=60)
+        for _ in range(5):
+            access_log.write(self.LINE)
+        self.assertEqual(access_log.dropped, 3)
+        access_log.close()
+        self.assertEqual(stream.getvalue(), self.LINE * 2)
+
+    @mock.patch.object(server, 'LOG')
+    def test_writer_does_not_log(self, mock_log):
+        access_log, _ = self.make(max_queue=1, flush_interval=60)
+        access_log.stream = mock.Mock()
+        error = access_log.stream.write.side_effect = IOError('disk full')
+        access_log.write(self.LINE)
+        access_log.write(self.LINE)  # dropped
+        access_log._wake.set()
+        deadline = time.time() + 5
+        while access_log._error is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(mock_log.mock_calls, [])  # not from the thread
+        access_log.write(self.LINE)
+        mock_log.error.assert_called_once_with(
+            "Error writing access log: %s", error)
+        mock_log.warning.assert_called_once_with(
+            "Access log queue full: dropped %d line(s)", 1)
+
+    def test_bad_format(self):
+        self.assertRaises(ValueError, server.BufferedAccessLog,
+                          six.StringIO(), fmt='xml')
+
 
 def get_free_port(host="localhost"):
     """Get a free port on the machine."""